@@ -9,6 +9,12 @@ from azure.search.documents import SearchClient
 from azure.storage.filedatalake import DataLakeServiceClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.identity import (DefaultAzureCredential, get_bearer_token_provider)
+import sys
+from pathlib import Path
+
+# The embedding cache is shared with the other ingestion scripts from scripts/
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "scripts"))
+from embedding_cache import EmbeddingCache  # noqa: E402
 
 
 key_vault_name = 'kv_to-be-replaced'
@@ -50,6 +56,10 @@ def get_embeddings(text: str, openai_api_base, openai_api_version):
     return embedding
 
 
+# Re-runs only embed chunks whose text changed since the last run
+embedding_cache = EmbeddingCache("text-embedding-ada-002")
+
+
 # Function: Clean Spaces with Regex -
 def clean_spaces_with_regex(text):
     # Use a regular expression to replace multiple spaces with a single space
@@ -123,16 +133,20 @@ def prepare_search_doc(content, document_id):
         chunk_num += 1
         chunk_id = document_id + '_' + str(chunk_num).zfill(2)
 
-        try:
-            v_contentVector = get_embeddings(str(chunk), openai_api_base, openai_api_version)
-        except Exception as e:
-            print(f"Error occurred: {e}. Retrying after 30 seconds...")
-            time.sleep(30)
+        v_contentVector = embedding_cache.get(str(chunk))
+        if v_contentVector is None:
             try:
                 v_contentVector = get_embeddings(str(chunk), openai_api_base, openai_api_version)
             except Exception as e:
-                print(f"Retry failed: {e}. Setting v_contentVector to an empty list.")
-                v_contentVector = []
+                print(f"Error occurred: {e}. Retrying after 30 seconds...")
+                time.sleep(30)
+                try:
+                    v_contentVector = get_embeddings(str(chunk), openai_api_base, openai_api_version)
+                except Exception as e:
+                    print(f"Retry failed: {e}. Setting v_contentVector to an empty list.")
+                    v_contentVector = []
+            if v_contentVector:
+                embedding_cache.put(str(chunk), v_contentVector)
 
         result = {
             "id": chunk_id,
@@ -178,3 +192,4 @@ if docs != []:
     results = search_client.upload_documents(documents=docs)
 
 print(f'{str(counter)} files processed.')
+print(f'Embedding cache: {embedding_cache.stats()}')
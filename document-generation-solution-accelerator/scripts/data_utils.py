@@ -13,6 +13,7 @@ from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from functools import partial
 from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 import fitz
 import markdown
@@ -24,6 +25,7 @@ from azure.core.credentials import AzureKeyCredential
 from azure.storage.blob import ContainerClient
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from embedding_cache import EmbeddingCache
 from langchain.text_splitter import (MarkdownTextSplitter,
                                      PythonCodeTextSplitter,
                                      RecursiveCharacterTextSplitter,
@@ -867,6 +869,24 @@ def get_embedding(
         )
 
 
+_EMBEDDING_CACHES: Dict[str, EmbeddingCache] = {}
+
+
+def get_embedding_cache(embedding_model_endpoint=None) -> EmbeddingCache:
+    """Return the local embedding cache for the deployment get_embedding() uses on this endpoint."""
+    endpoint = (
+        embedding_model_endpoint
+        if embedding_model_endpoint
+        else os.environ.get("EMBEDDING_MODEL_ENDPOINT", "")
+    )
+    parsed = urlparse(endpoint)
+    # The endpoint may name the deployment in its path, so keep it in the namespace
+    namespace = f"{parsed.netloc}{parsed.path}-embedding" if parsed.netloc else f"{endpoint}-embedding"
+    if namespace not in _EMBEDDING_CACHES:
+        _EMBEDDING_CACHES[namespace] = EmbeddingCache(namespace)
+    return _EMBEDDING_CACHES[namespace]
+
+
 def chunk_content_helper(
     content: str,
     file_format: str,
@@ -980,13 +1000,18 @@ def chunk_content(
         for chunk, chunk_size, doc in chunked_context:
             if chunk_size >= min_chunk_size:
                 if add_embeddings:
+                    embedding_cache = get_embedding_cache(embedding_endpoint)
+                    doc.contentVector = embedding_cache.get(chunk)
                     for i in range(RETRY_COUNT):
+                        if doc.contentVector is not None:
+                            break
                         try:
                             doc.contentVector = get_embedding(
                                 chunk,
                                 azure_credential=azure_credential,
                                 embedding_model_endpoint=embedding_endpoint,
                             )
+                            embedding_cache.put(chunk, doc.contentVector)
                             break
                         except Exception as e:
                             print(
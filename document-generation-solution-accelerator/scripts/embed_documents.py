@@ -4,7 +4,7 @@ from asyncio import sleep
 
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
-from data_utils import get_embedding
+from data_utils import get_embedding, get_embedding_cache
 
 RETRY_COUNT = 5
 
@@ -53,13 +53,20 @@ if __name__ == "__main__":
                 "No embedding endpoint provided in config file. Embeddings will not be generated."
             )
 
-        # Embed documents
+        # Embed documents, reusing vectors for content embedded by earlier runs
         print("Generating embeddings...")
+        embedding_cache = get_embedding_cache(embedding_endpoint)
         with open(args.input_data_path) as input_file, open(
             args.output_file_path, "w"
         ) as output_file:
             for line in input_file:
                 document = json.loads(line)
+                cached = embedding_cache.get(document["content"])
+                if cached is not None:
+                    document["contentVector"] = cached
+                    output_file.write(json.dumps(document) + "\n")
+                    continue
+
                 # Sleep/Retry in case embedding model is rate limited.
                 for _ in range(RETRY_COUNT):
                     try:
@@ -67,6 +74,7 @@ if __name__ == "__main__":
                             document["content"], embedding_endpoint, embedding_key
                         )
                         document["contentVector"] = embedding
+                        embedding_cache.put(document["content"], embedding)
                         break
                     except Exception:
                         print("Error generating embedding. Retrying...")
@@ -75,3 +83,4 @@ if __name__ == "__main__":
                 output_file.write(json.dumps(document) + "\n")
 
         print("Embeddings generated and saved to {}.".format(args.output_file_path))
+        print("Embedding cache: {}".format(embedding_cache.stats()))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of embeddings stored in a compact memory-mapped file.
+
+Vectors are keyed by (deployment, dimensions, sha256 of the text), so re-running
+an ingestion script only embeds chunks whose text changed. Each namespace
+(deployment + dimensions + dtype) is one append-only file of fixed-width
+records: a 32-byte digest followed by the vector as little-endian float32 or
+float16. The file is memory-mapped for reads and appended to with one write
+per record, so several ingestion processes can share a cache directory.
+
+This is the only copy of the module. The index scripts in
+infra/scripts/index_scripts/ and workout-data-promptflow/populate_search_index.py
+add this directory to sys.path to import it.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+
+_MAGIC = b"EMBC1"
+_HEADER = struct.Struct("<5scI")  # magic, dtype code ('f' or 'e'), dimensions
+_DIGEST_SIZE = 32
+_DTYPES = {"float32": b"f", "float16": b"e"}
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Embedding store for one deployment, keyed by the sha256 of the embedded text.
+
+    Args:
+        deployment: Model or deployment name the vectors come from
+        dimensions: Requested output dimensions (None for the model default)
+        cache_dir: Directory holding the cache files (EMBEDDING_CACHE_DIR)
+        dtype: "float32" or "float16" (EMBEDDING_CACHE_DTYPE); float16 halves the size
+        enabled: Set False (or EMBEDDING_CACHE_DISABLED=true) to bypass the cache
+    """
+
+    def __init__(self, deployment, dimensions=None, cache_dir=None, dtype=None, enabled=None):
+        if enabled is None:
+            enabled = os.getenv("EMBEDDING_CACHE_DISABLED", "false").lower() != "true"
+        self.enabled = enabled
+        self.deployment = deployment
+        self.dimensions = dimensions
+        self.dtype = dtype or os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+        if self.dtype not in _DTYPES:
+            raise ValueError(f"Unsupported embedding cache dtype: {self.dtype}")
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{deployment}-{dimensions or 'default'}-{self.dtype}")
+        self.path = Path(cache_dir or DEFAULT_CACHE_DIR) / f"{slug}.vec"
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = {}
+        self._vector_dims = None
+        self._record = None
+        self._scanned = 0
+        self._mmap = None
+        self._mapped_size = 0
+
+    def _configure(self, vector_dims):
+        self._vector_dims = vector_dims
+        self._record = struct.Struct(f"<{vector_dims}{_DTYPES[self.dtype].decode()}")
+
+    @property
+    def _record_size(self):
+        return _DIGEST_SIZE + self._record.size
+
+    def _sync(self):
+        """Index records appended since the last scan, by this or another process."""
+        if not self.path.exists():
+            return
+        size = self.path.stat().st_size
+        if size <= self._mapped_size:
+            return
+
+        with open(self.path, "rb") as file:
+            if self._vector_dims is None:
+                magic, dtype_code, vector_dims = _HEADER.unpack(file.read(_HEADER.size))
+                if magic != _MAGIC or dtype_code != _DTYPES[self.dtype]:
+                    raise ValueError(f"{self.path} is not a {self.dtype} embedding cache")
+                self._configure(vector_dims)
+                self._scanned = _HEADER.size
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+
+        # A trailing partial record (interrupted write) is ignored until completed
+        record_size = self._record_size
+        while self._scanned + record_size <= size:
+            digest = self._mmap[self._scanned:self._scanned + _DIGEST_SIZE]
+            self._index.setdefault(digest, self._scanned + _DIGEST_SIZE)
+            self._scanned += record_size
+
+    def get_many(self, texts):
+        """Return cached vectors in input order, None where the text is not cached."""
+        if not self.enabled:
+            self.misses += len(texts)
+            return [None] * len(texts)
+
+        digests = [text_digest(text) for text in texts]
+        with self._lock:
+            if any(digest not in self._index for digest in digests):
+                self._sync()
+            results = []
+            for digest in digests:
+                offset = self._index.get(digest)
+                if offset is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    vector = self._record.unpack_from(self._mmap, offset)
+                    results.append(list(vector))
+            return results
+
+    def get(self, text):
+        return self.get_many([text])[0]
+
+    def put_many(self, texts, vectors):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sync()
+            if self._vector_dims is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    with open(self.path, "xb") as file:
+                        file.write(_HEADER.pack(_MAGIC, _DTYPES[self.dtype], len(vectors[0])))
+                except FileExistsError:
+                    pass  # created by another process since the last sync
+                self._sync()
+
+            records = []
+            for text, vector in zip(texts, vectors):
+                digest = text_digest(text)
+                if digest in self._index or not vector or len(vector) != self._vector_dims:
+                    continue
+                records.append(digest + self._record.pack(*vector))
+            if not records:
+                return
+
+            # One O_APPEND write per record keeps concurrent writers from interleaving
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+            try:
+                for record in records:
+                    os.write(fd, record)
+            finally:
+                os.close(fd)
+            self._sync()
+
+    def put(self, text, vector):
+        self.put_many([text], [vector])
+
+    def embed(self, texts, embed_fn):
+        """
+        Return vectors for texts, calling embed_fn only for the ones not cached.
+
+        Args:
+            texts: Texts to embed
+            embed_fn: Callable taking a list of texts and returning their vectors in order
+        """
+        vectors = self.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = embed_fn([texts[i] for i in missing])
+            self.put_many([texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+        return vectors
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size_bytes": self._mapped_size
+        }
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
@@ -11,8 +11,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from azure.core.credentials import AzureKeyCredential
-from azure.identity.aio import (DefaultAzureCredential,
-                                get_bearer_token_provider)
 from azure.search.documents import SearchClient
 from openai import AsyncAzureOpenAI
 from quart import (Blueprint, Quart, jsonify, make_response, render_template,
@@ -20,14 +18,18 @@ from quart import (Blueprint, Quart, jsonify, make_response, render_template,
 from quart_cors import cors
 
 from backend.auth.auth_utils import get_authenticated_user_details
-from backend.history.cosmosdbservice import CosmosConversationClient
+from backend.client_registry import client_registry
+from backend.history.cosmosdbservice import (CosmosConversationClient,
+                                             decode_cursor, encode_cursor)
+from backend.history.delete_jobs import delete_jobs
 from backend.security.ms_defender_utils import get_msdefender_user_json
 from backend.settings import (
     MINIMUM_SUPPORTED_AZURE_OPENAI_PREVIEW_API_VERSION, app_settings)
-from backend.utils import (ChatType, format_as_ndjson,
+from backend.utils import (ChatType, TemplateSectionParser, format_as_ndjson,
                            format_non_streaming_response,
-                           format_stream_response)
+                           format_content_chunk, format_stream_response)
 from backend.promptflow_handler import promptflow_handler
+from backend.response_cache import response_cache
 from event_utils import track_event_if_configured
 from azure.monitor.opentelemetry import configure_azure_monitor
 from opentelemetry import trace
@@ -67,6 +69,34 @@ def create_app():
     app.register_blueprint(bp)
     app.config["TEMPLATES_AUTO_RELOAD"] = True
     app.config['PROVIDE_AUTOMATIC_OPTIONS'] = True
+
+    @app.before_serving
+    async def init_shared_clients():
+        client_registry.configure(
+            max_connections=app_settings.azure_openai.max_connections,
+            max_keepalive_connections=app_settings.azure_openai.max_keepalive_connections,
+            keepalive_expiry=app_settings.azure_openai.keepalive_expiry,
+        )
+        await client_registry.startup()
+        if app_settings.chat_history:
+            # Open the conversation client once and pay for account discovery
+            # and TLS setup before the first history request
+            try:
+                cosmos_conversation_client = init_cosmosdb_client()
+                if not await cosmos_conversation_client.warm_up():
+                    logging.warning(
+                        f"CosmosDB warm-up failed: {cosmos_conversation_client.warm_up_error}"
+                    )
+            except Exception:
+                logging.exception("Could not open the CosmosDB conversation client")
+
+    @app.after_serving
+    async def close_shared_clients():
+        await delete_jobs.aclose()
+        await client_registry.aclose()
+        await promptflow_handler.aclose()
+        await response_cache.aclose()
+
     return app
 
 
@@ -113,13 +143,20 @@ frontend_settings = {
 }
 
 
+# Conversations per /history/list page and the response header carrying the next page's cursor
+HISTORY_PAGE_SIZE = 25
+HISTORY_CURSOR_HEADER = "X-History-Cursor"
+
 # Enable Microsoft Defender for Cloud Integration
 MS_DEFENDER_ENABLED = os.environ.get("MS_DEFENDER_ENABLED", "true").lower() == "true"
 
 
 # Initialize Azure OpenAI Client
 def init_openai_client():
-    azure_openai_client = None
+    azure_openai_client = client_registry.get("azure_openai")
+    if azure_openai_client is not None:
+        return azure_openai_client
+
     track_event_if_configured("OpenAIClientInitializationStart", {"status": "success"})
     try:
         # API version check
@@ -161,18 +198,18 @@ def init_openai_client():
                 api_key=app_settings.azure_openai.key,
                 azure_endpoint=endpoint,
                 default_headers={"x-ms-useragent": USER_AGENT},
+                http_client=client_registry.http_client,
             )
         else:
             # Use Azure AD authentication for production
             track_event_if_configured("UsingAzureADAuth", {"status": "success"})
-            ad_token_provider = get_bearer_token_provider(
-                DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-            )
+            ad_token_provider = client_registry.token_provider()
             azure_openai_client = AsyncAzureOpenAI(
                 api_version=app_settings.azure_openai.preview_api_version,
                 azure_ad_token_provider=ad_token_provider,
                 default_headers={"x-ms-useragent": USER_AGENT},
                 azure_endpoint=endpoint,
+                http_client=client_registry.http_client,
             )
 
         # Deployment
@@ -183,7 +220,7 @@ def init_openai_client():
             })
             raise ValueError("AZURE_OPENAI_MODEL is required")
 
-        return azure_openai_client
+        return client_registry.register("azure_openai", azure_openai_client)
     except Exception as e:
         logging.exception("Exception in Azure OpenAI initialization", e)
         span = trace.get_current_span()
@@ -196,7 +233,10 @@ def init_openai_client():
 
 # Initialize Azure Foundry SDK client
 async def init_ai_foundry_client():
-    ai_foundry_client = None
+    ai_foundry_client = client_registry.get("ai_foundry")
+    if ai_foundry_client is not None:
+        return ai_foundry_client
+
     try:
         track_event_if_configured("AIFoundryClientInitializationStart", {"status": "success"})
         # API version check
@@ -217,15 +257,23 @@ async def init_ai_foundry_client():
                 "AZURE_AI_AGENT_ENDPOINT is required"
             )
 
-        ai_project_client = AIProjectClient(
-            endpoint=app_settings.azure_ai.agent_endpoint,
-            credential=DefaultAzureCredential()
-        )
-        track_event_if_configured("AIFoundryAgentEndpointUsed", {
-            "endpoint": app_settings.azure_ai.agent_endpoint
-        })
-        ai_foundry_client = await ai_project_client.inference.get_azure_openai_client(
-            api_version=app_settings.azure_openai.preview_api_version,
+        async def create_ai_foundry_client():
+            ai_project_client = client_registry.register(
+                "ai_project",
+                AIProjectClient(
+                    endpoint=app_settings.azure_ai.agent_endpoint,
+                    credential=client_registry.credential
+                ),
+            )
+            track_event_if_configured("AIFoundryAgentEndpointUsed", {
+                "endpoint": app_settings.azure_ai.agent_endpoint
+            })
+            return await ai_project_client.inference.get_azure_openai_client(
+                api_version=app_settings.azure_openai.preview_api_version,
+            )
+
+        ai_foundry_client = await client_registry.get_or_create(
+            "ai_foundry", create_ai_foundry_client
         )
         return ai_foundry_client
     except Exception as e:
@@ -257,7 +305,10 @@ def init_ai_search_client():
 
 
 def init_cosmosdb_client():
-    cosmos_conversation_client = None
+    cosmos_conversation_client = client_registry.get("cosmos_conversation")
+    if cosmos_conversation_client:
+        return cosmos_conversation_client
+
     if app_settings.chat_history:
         try:
             cosmos_endpoint = (
@@ -265,16 +316,23 @@ def init_cosmosdb_client():
             )
 
             if not app_settings.chat_history.account_key:
-                credential = DefaultAzureCredential()
+                credential = client_registry.credential
             else:
                 credential = app_settings.chat_history.account_key
 
-            cosmos_conversation_client = CosmosConversationClient(
-                cosmosdb_endpoint=cosmos_endpoint,
-                credential=credential,
-                database_name=app_settings.chat_history.database,
-                container_name=app_settings.chat_history.conversations_container,
-                enable_message_feedback=app_settings.chat_history.enable_feedback,
+            # One client per worker, closed by the registry in after_serving
+            cosmos_conversation_client = client_registry.register(
+                "cosmos_conversation",
+                CosmosConversationClient(
+                    cosmosdb_endpoint=cosmos_endpoint,
+                    credential=credential,
+                    database_name=app_settings.chat_history.database,
+                    container_name=app_settings.chat_history.conversations_container,
+                    enable_message_feedback=app_settings.chat_history.enable_feedback,
+                    max_connections=app_settings.chat_history.max_connections,
+                    delete_concurrency=app_settings.chat_history.delete_concurrency,
+                    composite_indexes=app_settings.chat_history.composite_indexes,
+                ),
             )
         except Exception as e:
             logging.exception("Exception in CosmosDB initialization", e)
@@ -472,6 +530,67 @@ async def stream_chat_request(request_body, request_headers):
     return generate()
 
 
+async def stream_template_sections(template_stream, history_metadata, user_message, promptflow_insights, first_chunk=None):
+    parser = TemplateSectionParser()
+    response_id = str(uuid.uuid4())
+    model = app_settings.azure_openai.model
+    section_count = 0
+
+    async def completion_chunks():
+        if first_chunk is not None:
+            yield first_chunk
+        async for completionChunk in template_stream:
+            yield completionChunk
+
+    async for completionChunk in completion_chunks():
+        if not completionChunk.choices:
+            continue
+        delta = completionChunk.choices[0].delta
+        if not delta or not delta.content:
+            continue
+        for section in parser.feed(delta.content):
+            prefix = '{"template": [' if section_count == 0 else ", "
+            section_count += 1
+            yield format_content_chunk(
+                prefix + json.dumps(section), history_metadata, response_id, model, "template-request"
+            )
+
+    if section_count:
+        yield format_content_chunk("]}", history_metadata, response_id, model, "template-request")
+    else:
+        # No template in the reply (e.g. the model asked the user to use the Browse tab)
+        yield format_content_chunk(parser.raw, history_metadata, response_id, model, "template-request")
+
+    track_event_if_configured("DualLLMTemplateGenerated", {
+        "promptflow_insights_length": len(promptflow_insights),
+        "template_sections": section_count,
+        "user_message": user_message[:100]
+    })
+    logging.info(f"✅ Dual-LLM template generation streamed - {section_count} sections")
+
+
+async def relay_promptflow_stream(first_chunk, pf_stream, history_metadata):
+    response_id = str(uuid.uuid4())
+    model = app_settings.azure_openai.model
+    chunk_count = 0
+
+    if first_chunk:
+        chunk_count += 1
+        yield format_content_chunk(
+            first_chunk, history_metadata, response_id, model, "promptflow-request"
+        )
+    if pf_stream is not None:
+        async for chunk in pf_stream:
+            chunk_count += 1
+            yield format_content_chunk(
+                chunk, history_metadata, response_id, model, "promptflow-request"
+            )
+
+    track_event_if_configured("PromptFlowStreamCompleted", {
+        "chunk_count": chunk_count
+    })
+
+
 async def conversation_internal(request_body, request_headers):
     try:
         chat_type = (
@@ -509,13 +628,52 @@ async def conversation_internal(request_body, request_headers):
                 search_type = pf_request.get("search_type", "hybrid")
                 
                 logging.info(f"PromptFlow params - use_search: {use_search}, search_type: {search_type}")
+
+                cache_key = response_cache.make_key(query, use_search, search_type, chat_type)
+
+                async def call_promptflow():
+                    # Call PromptFlow without blocking the event loop
+                    return await promptflow_handler.acall_promptflow(
+                        query=query,
+                        use_search=use_search,
+                        search_type=search_type
+                    )
                 
-                # Call PromptFlow (synchronous call)
-                promptflow_result = promptflow_handler.call_promptflow(
-                    query=query,
-                    use_search=use_search,
-                    search_type=search_type
-                )
+                # Browse requests with streaming enabled relay flow tokens as they arrive
+                if chat_type == ChatType.BROWSE and app_settings.azure_openai.stream:
+                    cached_result = await response_cache.get(cache_key, call_promptflow)
+                    if cached_result is not None:
+                        # A cached answer is relayed as a single chunk
+                        first_chunk = promptflow_handler.format_response_for_chat(
+                            cached_result, user_message
+                        )["choices"][0]["message"]["content"]
+                        pf_stream = None
+                    else:
+                        # Identical questions asked while this one streams follow the same flow stream
+                        pf_stream = response_cache.stream(
+                            cache_key,
+                            lambda: promptflow_handler.astream_promptflow(
+                                query=query,
+                                use_search=use_search,
+                                search_type=search_type
+                            ),
+                            # The complete answer is cached in the shape of a non-streamed flow result
+                            lambda chunks: promptflow_handler.streamed_result("".join(chunks))
+                        )
+                        # Wait for the first chunk so connection errors still fall back to Azure OpenAI
+                        first_chunk = await anext(pf_stream, "")
+                    response = await make_response(format_as_ndjson(
+                        relay_promptflow_stream(
+                            first_chunk, pf_stream, request_body.get("history_metadata", {})
+                        )
+                    ))
+                    response.timeout = None
+                    response.mimetype = "application/json-lines"
+                    logging.info("Streaming PromptFlow response")
+                    return response
+                
+                # Identical questions share one flow call and reuse its result until the cache entry expires
+                promptflow_result = await response_cache.get_or_call(cache_key, call_promptflow)
                 
                 # Check if this is a template request - use dual-LLM approach
                 print(f"[DEBUG] About to check template condition: chat_type={chat_type}, ChatType.TEMPLATE={ChatType.TEMPLATE}")
@@ -537,18 +695,8 @@ async def conversation_internal(request_body, request_headers):
                     
                     logging.info(f"Extracted PromptFlow insights: {len(promptflow_insights)} characters")
                     
-                    # Step 2: Generate template structure using Azure OpenAI
-                    try:
-                        from openai import AzureOpenAI
-                        
-                        openai_client = AzureOpenAI(
-                            api_key=app_settings.azure_openai.key,
-                            api_version=app_settings.azure_openai.preview_api_version,
-                            azure_endpoint=app_settings.azure_openai.endpoint
-                        )
-                        
-                        # Construct template generation request
-                        template_request = f"""
+                    # Step 2: Stream the template structure from the shared async client
+                    template_request = f"""
 User Request: {user_message}
 
 Based on this workout data analysis:
@@ -556,82 +704,61 @@ Based on this workout data analysis:
 
 Create a structured document template that incorporates the specific data insights into the section descriptions.
 """
-                        
-                        logging.info("Calling Azure OpenAI for template structure generation")
-                        
-                        template_response = openai_client.chat.completions.create(
+
+                    logging.info("Streaming template structure from Azure OpenAI")
+                    try:
+                        if app_settings.base_settings.use_ai_foundry_sdk:
+                            template_client = await init_ai_foundry_client()
+                        else:
+                            template_client = init_openai_client()
+                        template_stream = aiter(await template_client.chat.completions.create(
                             model=app_settings.azure_openai.model,
                             messages=[
                                 {"role": "system", "content": app_settings.azure_openai.template_system_message},
                                 {"role": "user", "content": template_request}
                             ],
                             temperature=0.7,
-                            max_tokens=1500
-                        )
-                        
-                        template_content = template_response.choices[0].message.content
-                        
-                        # Parse template JSON (handle markdown code blocks)
-                        json_content = template_content
-                        if "```json" in json_content:
-                            json_content = json_content.split("```json")[1].split("```")[0].strip()
-                        elif "```" in json_content:
-                            json_content = json_content.split("```")[1].split("```")[0].strip()
-                        
-                        template_json = json.loads(json_content)
-                        logging.info(f"✅ JSON extracted from markdown wrapper - template has {len(template_json.get('template', []))} sections")
-                        
-                        # Format as expected by frontend (messages array format)
-                        # Use the parsed JSON structure instead of raw markdown content
-                        formatted_result = {
-                            "id": "template-response",
-                            "object": "chat.completion",
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "messages": [
-                                        {
-                                            "id": "template-response",
-                                            "role": "assistant",
-                                            "content": json.dumps(template_json),
-                                            "date": "",
-                                            "feedback": None,
-                                            "context": {}
-                                        }
-                                    ],
-                                    "finish_reason": "stop"
-                                }
-                            ],
-                            "usage": {
-                                "prompt_tokens": len(user_message.split()),
-                                "completion_tokens": len(template_content.split()),
-                                "total_tokens": len(user_message.split()) + len(template_content.split())
-                            }
-                        }
-                        
-                        track_event_if_configured("DualLLMTemplateGenerated", {
-                            "promptflow_insights_length": len(promptflow_insights),
-                            "template_sections": len(template_json.get("template", [])),
-                            "user_message": user_message[:100]
-                        })
-                        
-                        logging.info(f"✅ Dual-LLM template generation successful - {len(template_json.get('template', []))} sections")
-                        print(f"[DEBUG] Template response format: {json.dumps(formatted_result, indent=2)}")
-                        
+                            max_tokens=1500,
+                            stream=True
+                        ))
+                        # Wait for the first chunk so errors before the stream starts still fall back
+                        first_template_chunk = await anext(template_stream, None)
                     except Exception as template_error:
                         logging.error(f"Template generation failed: {template_error}")
-                        # Fallback to regular PromptFlow response if template generation fails
-                        formatted_result = promptflow_handler.format_response_for_chat(
-                            promptflow_result, user_message
-                        )
                         track_event_if_configured("TemplateGenerationFallback", {
                             "error": str(template_error)
                         })
-                else:
-                    # Regular browse mode - format response for chat interface
-                    formatted_result = promptflow_handler.format_response_for_chat(
-                        promptflow_result, user_message
-                    )
+                        # Fallback to regular PromptFlow response if template generation fails
+                        fallback_content = promptflow_handler.format_response_for_chat(
+                            promptflow_result, user_message
+                        )["choices"][0]["message"]["content"]
+                        response = await make_response(format_as_ndjson(
+                            relay_promptflow_stream(
+                                fallback_content, None, request_body.get("history_metadata", {})
+                            )
+                        ))
+                        response.mimetype = "application/json-lines"
+                        return response
+
+                    # Sections are sent as NDJSON chunks whose contents concatenate to
+                    # {"template": [...]}, so the frontend can render each section on arrival
+                    response = await make_response(format_as_ndjson(
+                        stream_template_sections(
+                            template_stream,
+                            request_body.get("history_metadata", {}),
+                            user_message,
+                            promptflow_insights,
+                            first_template_chunk
+                        )
+                    ))
+                    response.timeout = None
+                    response.mimetype = "application/json-lines"
+                    return response
+                
+                # Regular browse mode - format response for chat interface
+                formatted_result = promptflow_handler.format_response_for_chat(
+                    promptflow_result, user_message
+                )
                 
                 track_event_if_configured("PromptFlowResponseFormatted", {
                     "result_length": len(str(formatted_result)),
@@ -640,96 +767,10 @@ Create a structured document template that incorporates the specific data insigh
                 
                 logging.info("PromptFlow request completed successfully")
                 
-                # Template responses use direct JSON (not streaming) per original Microsoft implementation
-                if chat_type == ChatType.TEMPLATE:
-                    logging.info("Returning template response as direct JSON for frontend compatibility")
-                    
-                    # Extract template JSON from formatted result
-                    template_content = formatted_result['choices'][0]['messages'][0]['content']
-                    template_json = json.loads(template_content)
-                    
-                    # Diagnostic logging for response format
-                    logging.info(f"Template JSON structure: {list(template_json.keys())}")
-                    logging.info(f"Template sections count: {len(template_json.get('template', []))}")
-                    
-                    # Frontend expects full ChatCompletion-style response structure
-                    import time
-                    response_with_full_structure = {
-                        "id": "template-response",
-                        "model": "template-generator", 
-                        "created": int(time.time()),
-                        "object": "chat.completion",
-                        "choices": [
-                            {
-                                "messages": [
-                                    {
-                                        "content": json.dumps(template_json),  # JSON string for frontend parsing
-                                        "role": "assistant"
-                                    }
-                                ]
-                            }
-                        ],
-                        "history_metadata": {},
-                        "apim-request-id": "template-request"
-                    }
-                    
-                    logging.info("✅ Template response with full ChatCompletion structure for frontend compatibility")
-                    logging.info(f"Response structure: {list(response_with_full_structure.keys())}")
-                    content_field = response_with_full_structure['choices'][0]['messages'][0]['content']
-                    logging.info(f"Content field type: {type(content_field)}")
-                    logging.info(f"Content is JSON string: {isinstance(content_field, str)}")
-                    logging.info(f"Content preview: {str(content_field)[:200]}...")
-                    
-                    # Verify JSON can be parsed
-                    try:
-                        parsed_content = json.loads(content_field)
-                        logging.info(f"✅ Content successfully parses as JSON with {len(parsed_content.get('template', []))} sections")
-                    except json.JSONDecodeError as e:
-                        logging.error(f"❌ Content is not valid JSON: {e}")
-                    
-                    # Return full ChatCompletion-style response to match frontend expectations
-                    return jsonify(response_with_full_structure)
-                
-                # Check if streaming is enabled for browse requests
-                elif app_settings.azure_openai.stream:
-                    logging.info("Preparing streaming response for PromptFlow")
-                    # Convert to the EXACT format the frontend expects (with messages array!)
-                    async def generate_stream():
-                        print(f"[DEBUG] *** INSIDE GENERATE_STREAM FUNCTION ***")
-                        # Send the response in the format the frontend Chat.tsx expects
-                        content = formatted_result["choices"][0]["messages"][0]["content"]
-                        print(f"[DEBUG] Content length: {len(content)}")
-                        print(f"[DEBUG] Content starts with: {content[:100]}...")
-                        chunk = {
-                            "id": "promptflow-response",
-                            "choices": [{
-                                "index": 0,
-                                "messages": [{  # <-- This is what was missing! Frontend expects "messages" not "delta"
-                                    "id": "promptflow-response",
-                                    "role": "assistant",
-                                    "content": content,
-                                    "date": "",
-                                    "feedback": None,
-                                    "context": {}
-                                }],
-                                "finish_reason": "stop"
-                            }]
-                        }
-                        print(f"[DEBUG] *** ABOUT TO YIELD CHUNK ***")
-                        print(f"[DEBUG] Chunk content preview: {chunk['choices'][0]['messages'][0]['content'][:100]}...")
-                        yield chunk
-                        print(f"[DEBUG] *** YIELDED CHUNK SUCCESSFULLY ***")
-                    
-                    response = await make_response(format_as_ndjson(generate_stream()))
-                    response.timeout = None
-                    response.mimetype = "application/json-lines"
-                    logging.info("Streaming response prepared")
-                    return response
-                else:
-                    logging.info("Returning non-streaming response")
-                    print(f"[DEBUG] Non-streaming response structure: {json.dumps(formatted_result, indent=2)[:1000]}...")
-                    print(f"[DEBUG] Content preview: {formatted_result['choices'][0]['messages'][0]['content'][:200]}...")
-                    return jsonify(formatted_result)
+                logging.info("Returning non-streaming response")
+                print(f"[DEBUG] Non-streaming response structure: {json.dumps(formatted_result, indent=2)[:1000]}...")
+                print(f"[DEBUG] Content preview: {formatted_result['choices'][0]['messages'][0]['content'][:200]}...")
+                return jsonify(formatted_result)
                 
             except Exception as pf_ex:
                 logging.error(f"PromptFlow error: {str(pf_ex)}")
@@ -808,6 +849,9 @@ def debug_promptflow():
             "promptflow_endpoint": promptflow_handler.endpoint if promptflow_handler.endpoint else "Not configured",
             "promptflow_has_api_key": bool(promptflow_handler.api_key),
             "timeout": promptflow_handler.timeout,
+            "max_concurrency": promptflow_handler.max_concurrency,
+            "http2": promptflow_handler.use_http2,
+            "in_flight": promptflow_handler.in_flight,
             "env_vars": {
                 "USE_PROMPTFLOW": os.getenv("USE_PROMPTFLOW"),
                 "use_promptflow": os.getenv("use_promptflow"),
@@ -824,12 +868,18 @@ def debug_promptflow():
 @bp.route("/health", methods=["GET"])
 def health_check():
     """Simple health check endpoint."""
+    cosmos_conversation_client = client_registry.get("cosmos_conversation")
     return jsonify({
         "status": "healthy",
         "service": "Document Generation with PromptFlow",
         "promptflow_integration": promptflow_handler.is_available(),
         "chat_history": bool(app_settings.chat_history),
-        "auth_enabled": app_settings.base_settings.auth_enabled
+        "auth_enabled": app_settings.base_settings.auth_enabled,
+        "openai_clients": client_registry.stats(),
+        "cosmos_conversation_client": (
+            cosmos_conversation_client.stats() if cosmos_conversation_client else None
+        ),
+        "response_cache": response_cache.as_dict()
     }), 200
 
 
@@ -930,8 +980,6 @@ async def add_conversation():
             track_event_if_configured("NoUserMessage", {"status_code": 400, "detail": "No user message found"})
             raise Exception("No user message found")
 
-        await cosmos_conversation_client.cosmosdb_client.close()
-
         # Submit request to Chat Completions for response
         request_body = await request.get_json()
         history_metadata["conversation_id"] = conversation_id
@@ -977,27 +1025,29 @@ async def update_conversation():
         # then write it to the conversation history in cosmos
         messages = request_json["messages"]
         if len(messages) > 0 and messages[-1]["role"] == "assistant":
+            new_messages = []
             if len(messages) > 1 and messages[-2].get("role", None) == "tool":
                 # write the tool message first
-                await cosmos_conversation_client.create_message(
-                    uuid=str(uuid.uuid4()),
-                    conversation_id=conversation_id,
-                    user_id=user_id,
-                    input_message=messages[-2],
-                )
-            # write the assistant message
-            await cosmos_conversation_client.create_message(
-                uuid=messages[-1]["id"],
+                new_messages.append((str(uuid.uuid4()), messages[-2]))
+            new_messages.append((messages[-1]["id"], messages[-1]))
+
+            # tool and assistant messages are written in a single batch
+            created_messages = await cosmos_conversation_client.create_messages(
                 conversation_id=conversation_id,
                 user_id=user_id,
-                input_message=messages[-1],
+                messages=new_messages,
             )
+            if created_messages == "Conversation not found":
+                track_event_if_configured("ConversationNotFound", {"conversation_id": conversation_id})
+                raise Exception(
+                    "Conversation not found for the given conversation ID: "
+                    + conversation_id
+                    + "."
+                )
         else:
             track_event_if_configured("NoAssistantMessage", {"status_code": 400, "detail": "No bot message found"})
             raise Exception("No bot messages found")
 
-        # Submit request to Chat Completions for response
-        await cosmos_conversation_client.cosmosdb_client.close()
         track_event_if_configured("ConversationHistoryUpdated", {"conversation_id": conversation_id})
         response = {"success": True}
         return jsonify(response), 200
@@ -1101,16 +1151,17 @@ async def delete_conversation():
             raise Exception("CosmosDB is not configured or not working")
 
         # delete the conversation messages from cosmos first
-        await cosmos_conversation_client.delete_messages(conversation_id, user_id)
+        deleted_messages = await cosmos_conversation_client.delete_messages(
+            conversation_id, user_id
+        )
 
         # Now delete the conversation
         await cosmos_conversation_client.delete_conversation(user_id, conversation_id)
 
-        await cosmos_conversation_client.cosmosdb_client.close()
-
         track_event_if_configured("ConversationDeleted", {
             "user_id": user_id,
             "conversation_id": conversation_id,
+            "deleted_messages": deleted_messages,
             "status": "success"
         })
 
@@ -1119,6 +1170,7 @@ async def delete_conversation():
                 {
                     "message": "Successfully deleted conversation and messages",
                     "conversation_id": conversation_id,
+                    "deleted_messages": deleted_messages,
                 }
             ),
             200,
@@ -1134,7 +1186,11 @@ async def delete_conversation():
 
 @bp.route("/history/list", methods=["GET"])
 async def list_conversations():
-    offset = request.args.get("offset", 0)
+    cursor = request.args.get("cursor")
+    try:
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "offset must be an integer"}), 400
     authenticated_user = get_authenticated_user_details(request_headers=request.headers)
     user_id = authenticated_user["user_principal_id"]
 
@@ -1148,8 +1204,21 @@ async def list_conversations():
         raise Exception("CosmosDB is not configured or not working")
 
     # get the conversations from cosmos
-    conversations = await cosmos_conversation_client.get_conversations(user_id, offset=offset, limit=25)
-    await cosmos_conversation_client.cosmosdb_client.close()
+    next_token = None
+    if cursor or offset == 0:
+        # The first page and cursor requests resume from a continuation token,
+        # so deep pages cost the same as the first one
+        try:
+            continuation_token = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        conversations, next_token = await cosmos_conversation_client.get_conversations_page(
+            user_id, page_size=HISTORY_PAGE_SIZE, continuation_token=continuation_token
+        )
+    else:
+        conversations = await cosmos_conversation_client.get_conversations(
+            user_id, offset=offset, limit=HISTORY_PAGE_SIZE
+        )
     if not isinstance(conversations, list):
         track_event_if_configured("NoConversationsFound", {
             "user_id": user_id,
@@ -1163,7 +1232,11 @@ async def list_conversations():
         "conversation_count": len(conversations),
         "status": "success"
     })
-    return jsonify(conversations), 200
+    # The body stays a plain array; the cursor for the next page, if any, is a header
+    response = jsonify(conversations)
+    if next_token:
+        response.headers[HISTORY_CURSOR_HEADER] = encode_cursor(next_token)
+    return response, 200
 
 
 @bp.route("/history/read", methods=["POST"])
@@ -1237,7 +1310,6 @@ async def get_conversation():
         "message_count": len(messages),
         "status": "success"
     })
-    await cosmos_conversation_client.cosmosdb_client.close()
     return jsonify({"conversation_id": conversation_id, "messages": messages}), 200
 
 
@@ -1303,7 +1375,6 @@ async def rename_conversation():
         conversation
     )
 
-    await cosmos_conversation_client.cosmosdb_client.close()
     track_event_if_configured("ConversationRenamed", {
         "user_id": user_id,
         "conversation_id": conversation_id,
@@ -1329,36 +1400,45 @@ async def delete_all_conversations():
             })
             raise Exception("CosmosDB is not configured or not working")
 
-        conversations = await cosmos_conversation_client.get_conversations(
-            user_id, offset=0, limit=None
-        )
-        if not conversations:
+        total = await cosmos_conversation_client.count_history(user_id)
+        if not total:
             track_event_if_configured("NoConversationsToDelete", {
                 "user_id": user_id,
                 "status": "No conversations found"
             })
             return jsonify({"error": f"No conversations for {user_id} were found"}), 404
 
-        # delete each conversation
-        for conversation in conversations:
-            # delete the conversation messages from cosmos first
-            await cosmos_conversation_client.delete_messages(
-                conversation["id"], user_id
+        # Large histories are deleted in the background; the client polls the job
+        if total > app_settings.chat_history.delete_inline_limit:
+            job = await delete_jobs.start(cosmos_conversation_client, user_id, total)
+            track_event_if_configured("DeleteAllJobStarted", {
+                "user_id": user_id,
+                "job_id": job.id,
+                "total": total
+            })
+            return (
+                jsonify(
+                    {
+                        "message": f"Deleting {total} conversations and messages in the background",
+                        "job_id": job.id,
+                        "status_url": f"/history/delete_all/{job.id}",
+                        **job.as_dict(),
+                    }
+                ),
+                202,
             )
 
-            # Now delete the conversation
-            await cosmos_conversation_client.delete_conversation(
-                user_id, conversation["id"]
-            )
-        await cosmos_conversation_client.cosmosdb_client.close()
+        deleted = await cosmos_conversation_client.delete_history(user_id)
         track_event_if_configured("AllConversationsDeleted", {
             "user_id": user_id,
-            "deleted_count": len(conversations)
+            "deleted_count": deleted["conversations"],
+            "deleted_messages": deleted["messages"]
         })
         return (
             jsonify(
                 {
-                    "message": f"Successfully deleted conversation and messages for user {user_id}"
+                    "message": f"Successfully deleted conversation and messages for user {user_id}",
+                    "deleted": deleted,
                 }
             ),
             200,
@@ -1373,6 +1453,29 @@ async def delete_all_conversations():
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route("/history/delete_all/<job_id>", methods=["GET"])
+async def delete_all_status(job_id):
+    authenticated_user = get_authenticated_user_details(request_headers=request.headers)
+    user_id = authenticated_user["user_principal_id"]
+
+    try:
+        cosmos_conversation_client = init_cosmosdb_client()
+        if not cosmos_conversation_client:
+            raise Exception("CosmosDB is not configured or not working")
+
+        status = await delete_jobs.status(cosmos_conversation_client, user_id, job_id)
+        if status is None:
+            return jsonify({"error": f"Delete job {job_id} was not found"}), 404
+        return jsonify(status), 200
+    except Exception as e:
+        logging.exception("Exception in /history/delete_all status")
+        span = trace.get_current_span()
+        if span is not None:
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR, str(e)))
+        return jsonify({"error": str(e)}), 500
+
+
 @bp.route("/history/clear", methods=["POST"])
 async def clear_messages():
     # get the user id from the request headers
@@ -1393,13 +1496,16 @@ async def clear_messages():
             raise Exception("CosmosDB is not configured or not working")
 
         # delete the conversation messages from cosmos
-        await cosmos_conversation_client.delete_messages(conversation_id, user_id)
+        deleted_messages = await cosmos_conversation_client.delete_messages(
+            conversation_id, user_id
+        )
 
         return (
             jsonify(
                 {
                     "message": "Successfully deleted messages in conversation",
                     "conversation_id": conversation_id,
+                    "deleted_messages": deleted_messages,
                 }
             ),
             200,
@@ -1429,7 +1535,6 @@ async def ensure_cosmos():
             return jsonify({"error": "CosmosDB is not configured or not working"}), 500
 
         track_event_if_configured("CosmosEnsureSuccess", {"status": "working"})
-        await cosmos_conversation_client.cosmosdb_client.close()
         return jsonify({"message": "CosmosDB is configured and working"}), 200
     except Exception as e:
         logging.exception("Exception in /history/ensure")
@@ -1575,7 +1680,7 @@ async def get_section_content(request_body, request_headers):
             section_query = f"Generate detailed content for a {section_title} section. Requirements: {section_description}"
             
             # Call PromptFlow for workout data analysis
-            promptflow_result = promptflow_handler.call_promptflow(section_query)
+            promptflow_result = await promptflow_handler.acall_promptflow(section_query)
             
             if promptflow_result:
                 # Extract insights from PromptFlow response
@@ -0,0 +1,217 @@
+"""Process-wide registry of shared service clients.
+
+Route handlers used to build a new Azure OpenAI client (and, on the Azure AD
+path, a new credential and token provider) for every request. The registry is
+created once per worker, opened in ``before_serving`` and closed in
+``after_serving``, so every route shares one keep-alive connection pool and
+one cached bearer token provider.
+"""
+
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from azure.identity.aio import DefaultAzureCredential, get_bearer_token_provider
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+@dataclass
+class PoolStats:
+    """Connection pool usage counters for the shared HTTP client."""
+
+    max_connections: int
+    max_keepalive_connections: int
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    total_requests: int = 0
+    saturated_requests: int = 0
+    failed_requests: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["saturation"] = (
+            round(self.in_flight / self.max_connections, 3)
+            if self.max_connections
+            else 0.0
+        )
+        return stats
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that releases the pool slot once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class _PoolStatsTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper that records in-flight requests against the pool limit.
+
+    A request holds a pooled connection from the moment it is sent until its
+    response body is closed, which for streamed chat completions is the end
+    of the stream, so the slot is released from the response stream.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: PoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    def _release(self) -> None:
+        self._stats.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats.total_requests += 1
+        if stats.in_flight >= stats.max_connections:
+            stats.saturated_requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            stats.failed_requests += 1
+            self._release()
+            raise
+
+        response.stream = _ReleasingStream(response.stream, self._release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class ClientRegistry:
+    """Owns the HTTP pool, credential and SDK clients shared by all routes."""
+
+    def __init__(self):
+        self.max_connections = 100
+        self.max_keepalive_connections = 20
+        self.keepalive_expiry = 30.0
+        self.pool_stats: Optional[PoolStats] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._credential: Optional[DefaultAzureCredential] = None
+        self._token_providers: Dict[str, Callable[[], Awaitable[str]]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    def configure(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+    ):
+        """Set pool limits. Only takes effect before the HTTP client is built."""
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            self.pool_stats = PoolStats(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            )
+            transport = _PoolStatsTransport(
+                httpx.AsyncHTTPTransport(limits=limits), self.pool_stats
+            )
+            self._http_client = httpx.AsyncClient(transport=transport)
+        return self._http_client
+
+    @property
+    def credential(self) -> DefaultAzureCredential:
+        if self._credential is None:
+            self._credential = DefaultAzureCredential()
+        return self._credential
+
+    def token_provider(self, scope: str = COGNITIVE_SERVICES_SCOPE):
+        """Return the bearer token provider for ``scope``.
+
+        The provider wraps a bearer token policy that caches the access token
+        and only refreshes it shortly before expiry, so reusing one instance
+        avoids a token acquisition on every request.
+        """
+        if scope not in self._token_providers:
+            self._token_providers[scope] = get_bearer_token_provider(
+                self.credential, scope
+            )
+        return self._token_providers[scope]
+
+    def get(self, name: str) -> Any:
+        return self._clients.get(name)
+
+    def register(self, name: str, client: Any) -> Any:
+        """Store ``client`` under ``name`` unless one is already registered."""
+        return self._clients.setdefault(name, client)
+
+    async def get_or_create(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        """Return the client named ``name``, building it once with ``factory``."""
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                client = self.register(name, await factory())
+        return client
+
+    async def startup(self):
+        # Build the pool eagerly so the first request does not pay for it.
+        self.http_client
+
+    async def aclose(self):
+        for name, client in list(self._clients.items()):
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logging.exception(f"Error closing client {name}")
+        self._clients.clear()
+
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._credential is not None:
+            await self._credential.close()
+            self._credential = None
+        self._token_providers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": sorted(self._clients),
+            "pool": self.pool_stats.as_dict() if self.pool_stats else None,
+        }
+
+
+# Global instance
+client_registry = ClientRegistry()
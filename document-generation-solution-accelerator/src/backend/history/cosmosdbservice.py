@@ -1,9 +1,86 @@
+import asyncio
+import base64
+import binascii
+import json
+import time
 import uuid
 from datetime import datetime
 
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
 from azure.cosmos import exceptions
 from azure.cosmos.aio import CosmosClient
 
+# A transactional batch holds at most 100 operations
+DELETE_BATCH_SIZE = 100
+# Fields the conversation list needs; message bodies and other fields stay on the server
+CONVERSATION_LIST_FIELDS = "c.id, c.title, c.createdAt, c.updatedAt"
+
+# Indexing policy applied by setup_conversations_container.py. The composite
+# indexes match the ORDER BY forms of the list and message queries below, and
+# message bodies are left out of the index since nothing filters on them.
+CONVERSATIONS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": "/content/*"}, {"path": '/"_etag"/?'}],
+    "compositeIndexes": [
+        [{"path": "/type", "order": "ascending"}, {"path": "/updatedAt", "order": "descending"}],
+        [{"path": "/type", "order": "ascending"}, {"path": "/updatedAt", "order": "ascending"}],
+        [
+            {"path": "/conversationId", "order": "ascending"},
+            {"path": "/type", "order": "ascending"},
+            {"path": "/createdAt", "order": "ascending"},
+        ],
+    ],
+}
+
+
+def conversation_list_query(sort_order, composite_indexes=False):
+    """Query listing a user's conversations by ``updatedAt``.
+
+    With ``composite_indexes`` the equality-filtered ``type`` is added to the
+    ORDER BY so Cosmos can serve the sort from a composite index instead of
+    reading every item of the partition in ``updatedAt`` order. Cosmos rejects
+    that form on containers without the matching composite index.
+    """
+    if sort_order not in ("ASC", "DESC"):
+        raise ValueError(f"Invalid sort order: {sort_order}")
+    order_by = f"c.type ASC, c.updatedAt {sort_order}" if composite_indexes else f"c.updatedAt {sort_order}"
+    return (
+        f"SELECT {CONVERSATION_LIST_FIELDS} FROM c "
+        f"WHERE c.userId = @userId AND c.type='conversation' ORDER BY {order_by}"
+    )
+
+
+def messages_query(composite_indexes=False):
+    """Query loading a conversation's messages in the order they were written."""
+    order_by = (
+        "c.conversationId ASC, c.type ASC, c.createdAt ASC" if composite_indexes else "c.createdAt ASC"
+    )
+    return (
+        "SELECT * FROM c WHERE c.conversationId = @conversationId AND c.type='message' "
+        f"AND c.userId = @userId ORDER BY {order_by}"
+    )
+
+
+def encode_cursor(continuation_token):
+    """Wrap a Cosmos continuation token in an opaque, URL-safe cursor."""
+    payload = json.dumps({"v": 1, "token": continuation_token}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the continuation token inside a cursor. Raises ValueError if the cursor is invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(payload, dict) or payload.get("v") != 1 or not isinstance(payload.get("token"), str):
+        raise ValueError("Invalid cursor")
+    return payload["token"]
+
 
 class CosmosConversationClient:
     def __init__(
@@ -13,15 +90,30 @@ class CosmosConversationClient:
         database_name: str,
         container_name: str,
         enable_message_feedback: bool = False,
+        max_connections: int = 100,
+        delete_concurrency: int = 4,
+        composite_indexes: bool = False,
     ):
         self.cosmosdb_endpoint = cosmosdb_endpoint
         self.credential = credential
         self.database_name = database_name
         self.container_name = container_name
         self.enable_message_feedback = enable_message_feedback
+        self.delete_concurrency = delete_concurrency
+        self.composite_indexes = composite_indexes
+        self.opened_at = time.time()
+        self.warm_up_ms = None
+        self.warm_up_error = None
+
+        # The client is long-lived, so it owns its connection pool and can
+        # report how much of it is in use
+        self._connector = aiohttp.TCPConnector(limit=max_connections)
+        self._session = aiohttp.ClientSession(connector=self._connector)
         try:
             self.cosmosdb_client = CosmosClient(
-                self.cosmosdb_endpoint, credential=credential
+                self.cosmosdb_endpoint,
+                credential=credential,
+                transport=AioHttpTransport(session=self._session, session_owner=False),
             )
         except exceptions.CosmosHttpResponseError as e:
             if e.status_code == 401:
@@ -65,6 +157,40 @@ class CosmosConversationClient:
 
         return True, "CosmosDB client initialized successfully"
 
+    async def warm_up(self):
+        """Read the container once so account discovery and TLS setup happen before the first request."""
+        started = time.perf_counter()
+        try:
+            await self.container_client.read()
+        except Exception as e:
+            self.warm_up_error = str(e)
+            return False
+        self.warm_up_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.warm_up_error = None
+        return True
+
+    async def close(self):
+        await self.cosmosdb_client.close()
+        await self._session.close()
+
+    def stats(self):
+        connector = self._connector
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return {
+            "database": self.database_name,
+            "container": self.container_name,
+            "uptime_seconds": round(time.time() - self.opened_at, 1),
+            "warmed_up": self.warm_up_ms is not None,
+            "warm_up_ms": self.warm_up_ms,
+            "warm_up_error": self.warm_up_error,
+            "pool": {
+                "max_connections": connector.limit,
+                "in_use": len(getattr(connector, "_acquired", ())),
+                "idle": idle,
+                "closed": connector.closed,
+            },
+        }
+
     async def create_conversation(self, user_id, title=""):
         conversation = {
             "id": str(uuid.uuid4()),
@@ -89,34 +215,140 @@ class CosmosConversationClient:
             return False
 
     async def delete_conversation(self, user_id, conversation_id):
-        conversation = await self.container_client.read_item(
-            item=conversation_id, partition_key=user_id
-        )
-        if conversation:
-            resp = await self.container_client.delete_item(
+        # A point delete by id and partition key; there is no need to read the item first
+        try:
+            return await self.container_client.delete_item(
                 item=conversation_id, partition_key=user_id
             )
-            return resp
-        else:
+        except exceptions.CosmosResourceNotFoundError:
             return True
 
-    async def delete_messages(self, conversation_id, user_id):
-        # get a list of all the messages in the conversation
-        messages = await self.get_messages(user_id, conversation_id)
-        response_list = []
-        if messages:
-            for message in messages:
-                resp = await self.container_client.delete_item(
-                    item=message["id"], partition_key=user_id
-                )
-                response_list.append(resp)
-            return response_list
+    async def _query_ids(self, query, parameters, user_id):
+        item_ids = []
+        async for item_id in self.container_client.query_items(
+            query=query, parameters=parameters, partition_key=user_id
+        ):
+            item_ids.append(item_id)
+        return item_ids
+
+    async def _delete_batch(self, user_id, item_ids):
+        try:
+            await self.container_client.execute_item_batch(
+                batch_operations=[("delete", (item_id,)) for item_id in item_ids],
+                partition_key=user_id,
+            )
+        except exceptions.CosmosBatchOperationError as e:
+            if e.status_code != 404:
+                raise
+            # Another request deleted one of the items first and the batch was
+            # rolled back, so delete the rest one by one
+            for item_id in item_ids:
+                try:
+                    await self.container_client.delete_item(
+                        item=item_id, partition_key=user_id
+                    )
+                except exceptions.CosmosResourceNotFoundError:
+                    pass
+        return len(item_ids)
+
+    async def delete_items(self, user_id, item_ids, progress=None):
+        """Delete items of one user's partition in transactional batches.
+
+        Up to ``delete_concurrency`` batches of DELETE_BATCH_SIZE deletes are
+        in flight at once. ``progress`` is awaited with the number of items
+        removed after each batch. Returns the number of items deleted.
+        """
+        semaphore = asyncio.Semaphore(self.delete_concurrency)
+
+        async def delete_chunk(chunk):
+            async with semaphore:
+                deleted = await self._delete_batch(user_id, chunk)
+            if progress is not None:
+                await progress(deleted)
+            return deleted
+
+        chunks = [
+            item_ids[start : start + DELETE_BATCH_SIZE]
+            for start in range(0, len(item_ids), DELETE_BATCH_SIZE)
+        ]
+        return sum(await asyncio.gather(*(delete_chunk(chunk) for chunk in chunks)))
+
+    async def delete_messages(self, conversation_id, user_id, progress=None):
+        """Delete every message of a conversation. Returns the number deleted."""
+        parameters = [
+            {"name": "@conversationId", "value": conversation_id},
+            {"name": "@userId", "value": user_id},
+        ]
+        query = "SELECT VALUE c.id FROM c WHERE c.conversationId = @conversationId AND c.type='message' AND c.userId = @userId"
+        message_ids = await self._query_ids(query, parameters, user_id)
+        return await self.delete_items(user_id, message_ids, progress)
+
+    async def count_history(self, user_id):
+        """Number of conversations and messages stored for a user."""
+        parameters = [{"name": "@userId", "value": user_id}]
+        query = "SELECT VALUE COUNT(1) FROM c WHERE c.userId = @userId AND c.type IN ('conversation', 'message')"
+        counts = await self._query_ids(query, parameters, user_id)
+        return counts[0] if counts else 0
+
+    async def delete_history(self, user_id, progress=None):
+        """Delete all of a user's conversations and messages.
+
+        Messages go first so an interrupted run never leaves messages whose
+        conversation is gone; running it again finishes the job.
+
+        Returns:
+            Dict with the number of conversations and messages deleted
+        """
+        parameters = [{"name": "@userId", "value": user_id}]
+        deleted = {}
+        for item_type in ("message", "conversation"):
+            query = f"SELECT VALUE c.id FROM c WHERE c.userId = @userId AND c.type = '{item_type}'"
+            item_ids = await self._query_ids(query, parameters, user_id)
+            deleted[f"{item_type}s"] = await self.delete_items(user_id, item_ids, progress)
+        return deleted
+
+    async def get_conversations_page(
+        self, user_id, page_size, continuation_token=None, sort_order="DESC"
+    ):
+        """Return one page of the user's conversations and the token for the next page.
+
+        Unlike OFFSET/LIMIT, resuming from a continuation token does not
+        re-read (and pay for) the conversations of earlier pages. Only the
+        list fields are projected.
+
+        max_item_count is only an upper bound, so Cosmos may return a short
+        page that still has a continuation token. Pages are read until
+        page_size conversations are collected or the results run out. Every
+        page but the last one is therefore full, which keeps the caller's
+        offset in step with the cursor.
+
+        Returns:
+            Tuple of (conversations, continuation token or None on the last page)
+        """
+        parameters = [{"name": "@userId", "value": user_id}]
+        query = conversation_list_query(sort_order, self.composite_indexes)
+        conversations = []
+        while True:
+            # Ask only for what is missing, so the token never skips items
+            pager = self.container_client.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=user_id,
+                max_item_count=page_size - len(conversations),
+            ).by_page(continuation_token)
+            continuation_token = None
+            async for page in pager:
+                conversations.extend([item async for item in page])
+                continuation_token = pager.continuation_token
+                break
+            if not continuation_token or len(conversations) >= page_size:
+                return conversations, continuation_token
 
     async def get_conversations(self, user_id, limit, sort_order="DESC", offset=0):
         parameters = [{"name": "@userId", "value": user_id}]
-        query = f"SELECT * FROM c where c.userId = @userId and c.type='conversation' order by c.updatedAt {sort_order}"
+        query = conversation_list_query(sort_order, self.composite_indexes)
         if limit is not None:
-            query += f" offset {offset} limit {limit}"
+            query += f" offset {int(offset)} limit {int(limit)}"
 
         conversations = []
         async for item in self.container_client.query_items(
@@ -127,24 +359,21 @@ class CosmosConversationClient:
         return conversations
 
     async def get_conversation(self, user_id, conversation_id):
-        parameters = [
-            {"name": "@conversationId", "value": conversation_id},
-            {"name": "@userId", "value": user_id},
-        ]
-        query = "SELECT * FROM c where c.id = @conversationId and c.type='conversation' and c.userId = @userId"
-        conversations = []
-        async for item in self.container_client.query_items(
-            query=query, parameters=parameters
-        ):
-            conversations.append(item)
+        # The id and the partition key (userId) are both known, so a point read
+        # (1 RU for a 1 KB item) replaces a query
+        try:
+            conversation = await self.container_client.read_item(
+                item=conversation_id, partition_key=user_id
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            return None
 
-        # if no conversations are found, return None
-        if len(conversations) == 0:
+        # if the id belongs to another kind of item, there is no such conversation
+        if conversation.get("type") != "conversation":
             return None
-        else:
-            return conversations[0]
+        return conversation
 
-    async def create_message(self, uuid, conversation_id, user_id, input_message: dict):
+    def _message_document(self, uuid, conversation_id, user_id, input_message: dict):
         message = {
             "id": uuid,
             "type": "message",
@@ -158,28 +387,71 @@ class CosmosConversationClient:
 
         if self.enable_message_feedback:
             message["feedback"] = ""
+        return message
 
-        resp = await self.container_client.upsert_item(message)
-        if resp:
-            # update the parent conversations's updatedAt field with the current message's createdAt datetime value
-            conversation = await self.get_conversation(user_id, conversation_id)
-            if not conversation:
+    async def create_messages(self, conversation_id, user_id, messages):
+        """Write messages and bump the conversation's updatedAt in one round trip.
+
+        ``messages`` is a list of ``(id, input_message)`` pairs. The messages and
+        the conversation share the user's partition, so the upserts and a patch
+        of ``updatedAt`` run as one transactional batch: either all of them are
+        applied or none is. This replaces the upsert, query and second upsert
+        that create_message used to make per message.
+
+        Returns the created message documents, or "Conversation not found" when
+        the conversation does not exist (nothing is written in that case).
+        """
+        documents = [
+            self._message_document(message_id, conversation_id, user_id, input_message)
+            for message_id, input_message in messages
+        ]
+        if not documents:
+            return []
+
+        operations = [("upsert", (document,)) for document in documents]
+        operations.append(
+            (
+                "patch",
+                (
+                    conversation_id,
+                    [{"op": "set", "path": "/updatedAt", "value": documents[-1]["createdAt"]}],
+                ),
+                {"filter_predicate": "FROM c WHERE c.type = 'conversation'"},
+            )
+        )
+        try:
+            results = await self.container_client.execute_item_batch(
+                batch_operations=operations, partition_key=user_id
+            )
+        except exceptions.CosmosBatchOperationError as e:
+            # 404: no such item, 412: the item is not a conversation
+            if e.error_index == len(documents) and e.status_code in (404, 412):
                 return "Conversation not found"
-            conversation["updatedAt"] = message["createdAt"]
-            await self.upsert_conversation(conversation)
-            return resp
-        else:
-            return False
+            raise
 
-    async def update_message_feedback(self, user_id, message_id, feedback):
-        message = await self.container_client.read_item(
-            item=message_id, partition_key=user_id
+        return [result.get("resourceBody") for result in results[: len(documents)]]
+
+    async def create_message(self, uuid, conversation_id, user_id, input_message: dict):
+        created = await self.create_messages(
+            conversation_id, user_id, [(uuid, input_message)]
         )
-        if message:
-            message["feedback"] = feedback
-            resp = await self.container_client.upsert_item(message)
-            return resp
-        else:
+        if created == "Conversation not found":
+            return created
+        return created[0] if created and created[0] else False
+
+    async def update_message_feedback(self, user_id, message_id, feedback):
+        # Patch the field in place instead of reading and upserting the whole message
+        try:
+            return await self.container_client.patch_item(
+                item=message_id,
+                partition_key=user_id,
+                patch_operations=[{"op": "set", "path": "/feedback", "value": feedback}],
+                filter_predicate="FROM c WHERE c.type = 'message'",
+            )
+        except (
+            exceptions.CosmosResourceNotFoundError,
+            exceptions.CosmosAccessConditionFailedError,
+        ):
             return False
 
     async def get_messages(self, user_id, conversation_id):
@@ -187,7 +459,7 @@ class CosmosConversationClient:
             {"name": "@conversationId", "value": conversation_id},
             {"name": "@userId", "value": user_id},
         ]
-        query = "SELECT * FROM c WHERE c.conversationId = @conversationId AND c.type='message' AND c.userId = @userId ORDER BY c.timestamp ASC"
+        query = messages_query(self.composite_indexes)
         messages = []
         async for item in self.container_client.query_items(
             query=query, parameters=parameters
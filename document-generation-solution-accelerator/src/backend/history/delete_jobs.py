@@ -0,0 +1,133 @@
+"""Background deletion of large chat histories.
+
+Deleting thousands of messages can outlast the request timeout, so
+``/history/delete_all`` hands large histories to a job running on the
+worker's event loop. The job's status is stored as a ``delete_job`` document
+in the user's partition, so any worker can answer the status endpoint. A job
+whose status has not been written for ``STALE_AFTER_SECONDS`` is reported as
+interrupted (for example its worker was recycled); deleting again resumes it.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from azure.cosmos import exceptions
+
+JOB_TYPE = "delete_job"
+# Minimum seconds between progress writes to the status document
+HEARTBEAT_SECONDS = 2.0
+# A running job without a progress write for this long is reported as interrupted
+STALE_AFTER_SECONDS = 60.0
+# Status documents expire after a day on containers with TTL enabled
+JOB_TTL_SECONDS = 24 * 60 * 60
+
+
+@dataclass
+class DeleteJob:
+    """Progress of one bulk delete."""
+
+    id: str
+    user_id: str
+    total: int
+    deleted: int = 0
+    status: str = "running"
+    started_at: float = 0.0
+    updated_at: float = 0.0
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        status = asdict(self)
+        del status["user_id"]
+        status["progress"] = round(self.deleted / self.total, 3) if self.total else 1.0
+        return status
+
+    def as_document(self) -> Dict[str, Any]:
+        document = {key: value for key, value in asdict(self).items() if key != "user_id"}
+        document.update({"type": JOB_TYPE, "userId": self.user_id, "ttl": JOB_TTL_SECONDS})
+        return document
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "DeleteJob":
+        fields = {name: document.get(name) for name in cls.__dataclass_fields__ if name != "user_id"}
+        return cls(user_id=document["userId"], **fields)
+
+
+class DeleteJobManager:
+    """Runs bulk deletes in the background and reports their progress."""
+
+    def __init__(self):
+        self._jobs: Dict[str, DeleteJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def _save(self, conversation_client, job: DeleteJob) -> None:
+        job.updated_at = time.time()
+        try:
+            await conversation_client.container_client.upsert_item(job.as_document())
+        except Exception:
+            logging.exception(f"Could not save the status of delete job {job.id}")
+
+    async def start(self, conversation_client, user_id: str, total: int) -> DeleteJob:
+        now = time.time()
+        job = DeleteJob(id=f"delete-job-{uuid.uuid4()}", user_id=user_id, total=total, started_at=now)
+        await self._save(conversation_client, job)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.ensure_future(self._run(conversation_client, job))
+        return job
+
+    async def _run(self, conversation_client, job: DeleteJob) -> None:
+        async def progress(deleted):
+            job.deleted += deleted
+            if time.time() - job.updated_at >= HEARTBEAT_SECONDS:
+                await self._save(conversation_client, job)
+
+        try:
+            await conversation_client.delete_history(job.user_id, progress)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "interrupted"
+            raise
+        except Exception as e:
+            logging.exception(f"Delete job {job.id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            await self._save(conversation_client, job)
+            self._tasks.pop(job.id, None)
+            self._jobs.pop(job.id, None)
+
+    async def status(self, conversation_client, user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job's progress, or None if the user has no such job."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.as_dict() if job.user_id == user_id else None
+
+        try:
+            document = await conversation_client.container_client.read_item(
+                item=job_id, partition_key=user_id
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        if document.get("type") != JOB_TYPE:
+            return None
+
+        job = DeleteJob.from_document(document)
+        if job.status == "running" and time.time() - (job.updated_at or 0) > STALE_AFTER_SECONDS:
+            job.status = "interrupted"
+        return job.as_dict()
+
+    async def aclose(self) -> None:
+        """Cancel running jobs when the worker stops; their status is saved as interrupted."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global instance
+delete_jobs = DeleteJobManager()
@@ -1,10 +1,13 @@
 """PromptFlow integration handler for workout data analysis."""
 
+import asyncio
+import importlib.util
 import json
 import logging
 import os
+import httpx
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Optional
 
 
 class PromptFlowHandler:
@@ -19,11 +22,23 @@ class PromptFlowHandler:
         self.query_field = os.getenv('PROMPTFLOW_QUERY_FIELD', 'query')
         self.use_search_field = os.getenv('PROMPTFLOW_USE_SEARCH_FIELD', 'use_search')
         self.search_type_field = os.getenv('PROMPTFLOW_SEARCH_TYPE_FIELD', 'search_type')
+        self.stream_field = os.getenv('PROMPTFLOW_STREAM_FIELD', 'stream')
         
         # Response field mappings
         self.enhanced_result_field = os.getenv('PROMPTFLOW_ENHANCED_RESULT_FIELD', 'enhanced_result')
         self.sql_result_field = os.getenv('PROMPTFLOW_SQL_RESULT_FIELD', 'sql_result')
         self.search_result_field = os.getenv('PROMPTFLOW_SEARCH_RESULT_FIELD', 'search_result')
+        # Text the flow streams in place of an analysis when the LLM call fails
+        self.stream_error_marker = os.getenv('PROMPTFLOW_STREAM_ERROR_MARKER', 'Error in LLM enhancement:')
+
+        # Async client settings - one pooled client is shared by every request
+        self.max_concurrency = int(os.getenv('PROMPTFLOW_MAX_CONCURRENCY', '256'))
+        self.max_keepalive_connections = int(os.getenv('PROMPTFLOW_MAX_KEEPALIVE_CONNECTIONS', '64'))
+        self.connect_timeout = float(os.getenv('PROMPTFLOW_CONNECT_TIMEOUT', '10'))
+        self.use_http2 = os.getenv('PROMPTFLOW_HTTP2', 'false').lower() == 'true'
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
     
     def is_available(self) -> bool:
         """Check if PromptFlow is configured and available."""
@@ -43,21 +58,8 @@ class PromptFlowHandler:
         if not self.is_available():
             raise Exception("PromptFlow is not configured. Missing PROMPTFLOW_ENDPOINT or PROMPTFLOW_API_KEY")
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        # Add authentication headers only for Azure deployment
-        if self.api_key and self.api_key != 'dummy_local_key':
-            headers["Authorization"] = f"Bearer {self.api_key}"
-            headers["api-key"] = self.api_key
-        
-        # Prepare request data for AI Foundry PromptFlow endpoint
-        request_data = {
-            self.query_field: query,
-            self.use_search_field: use_search,
-            self.search_type_field: search_type
-        }
+        headers = self._build_headers()
+        request_data = self._build_request_data(query, use_search, search_type)
         
         logging.info(f"Calling PromptFlow endpoint: {self.endpoint}")
         logging.debug(f"Request data: {json.dumps(request_data, indent=2)}")
@@ -84,7 +86,207 @@ class PromptFlowHandler:
             error_msg = f"PromptFlow connection error: {str(e)}"
             logging.error(error_msg)
             raise Exception(error_msg)
+
+    async def acall_promptflow(self, query: str, use_search: bool = True, search_type: str = "hybrid",
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Call the PromptFlow endpoint without blocking the event loop.
+
+        Uses the shared pooled client, waits for a concurrency slot and
+        enforces a deadline that covers both the wait and the call. If the
+        caller is cancelled (for example the browser disconnects and Quart
+        cancels the request task) the in-flight HTTP request is aborted.
+        """
+
+        if not self.is_available():
+            raise Exception("PromptFlow is not configured. Missing PROMPTFLOW_ENDPOINT or PROMPTFLOW_API_KEY")
+
+        deadline = timeout if timeout is not None else self.timeout
+        headers = self._build_headers()
+        request_data = self._build_request_data(query, use_search, search_type)
+
+        logging.info(f"Calling PromptFlow endpoint (async): {self.endpoint}")
+        logging.debug(f"Request data: {json.dumps(request_data, indent=2)}")
+
+        try:
+            async with asyncio.timeout(deadline):
+                async with self._get_semaphore():
+                    self.in_flight += 1
+                    try:
+                        response = await self._get_async_client().post(
+                            self.endpoint,
+                            headers=headers,
+                            json=request_data
+                        )
+                    finally:
+                        self.in_flight -= 1
+        except TimeoutError:
+            error_msg = f"PromptFlow call exceeded deadline of {deadline}s"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+        except asyncio.CancelledError:
+            logging.info("PromptFlow call cancelled by client disconnect")
+            raise
+        except httpx.HTTPError as e:
+            error_msg = f"PromptFlow connection error: {str(e)}"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+
+        if response.status_code == 200:
+            result = response.json()
+            logging.info("PromptFlow call successful")
+            logging.debug(f"Response: {json.dumps(result, indent=2)}")
+            return result
+        else:
+            error_msg = f"PromptFlow endpoint error: {response.status_code} - {response.text}"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+
+    async def astream_promptflow(self, query: str, use_search: bool = True, search_type: str = "hybrid",
+                                 timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream the enhanced answer from the PromptFlow endpoint as text chunks.
+
+        Sets the flow's stream input and asks for server-sent events, then
+        yields each enhanced_result delta as it arrives. The deadline applies
+        to getting a response; after that the pooled client's read timeout
+        limits the gap between chunks. If the endpoint answers with plain
+        JSON instead of an event stream, the whole answer is yielded once.
+        """
+
+        if not self.is_available():
+            raise Exception("PromptFlow is not configured. Missing PROMPTFLOW_ENDPOINT or PROMPTFLOW_API_KEY")
+
+        deadline = timeout if timeout is not None else self.timeout
+        headers = self._build_headers()
+        headers["Accept"] = "text/event-stream"
+        request_data = self._build_request_data(query, use_search, search_type)
+        request_data[self.stream_field] = True
+
+        logging.info(f"Calling PromptFlow endpoint (streaming): {self.endpoint}")
+
+        client = self._get_async_client()
+        semaphore = self._get_semaphore()
+        try:
+            async with asyncio.timeout(deadline):
+                await semaphore.acquire()
+                self.in_flight += 1
+                try:
+                    response = await client.send(
+                        client.build_request("POST", self.endpoint, headers=headers, json=request_data),
+                        stream=True
+                    )
+                except BaseException:
+                    self.in_flight -= 1
+                    semaphore.release()
+                    raise
+        except TimeoutError:
+            error_msg = f"PromptFlow call exceeded deadline of {deadline}s"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+        except httpx.HTTPError as e:
+            error_msg = f"PromptFlow connection error: {str(e)}"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                error_msg = f"PromptFlow endpoint error: {response.status_code} - {response.text}"
+                logging.error(error_msg)
+                raise Exception(error_msg)
+
+            if "text/event-stream" in response.headers.get("content-type", ""):
+                async for event in self._iter_sse_events(response):
+                    chunk = event.get(self.enhanced_result_field)
+                    if isinstance(chunk, str) and chunk:
+                        yield chunk
+            else:
+                # Endpoint did not stream - relay the complete answer as a single chunk
+                await response.aread()
+                formatted = self.format_response_for_chat(response.json(), query)
+                yield formatted["choices"][0]["message"]["content"]
+            logging.info("PromptFlow streaming call completed")
+        finally:
+            await response.aclose()
+            self.in_flight -= 1
+            semaphore.release()
+
+    @staticmethod
+    async def _iter_sse_events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+        """Parse a server-sent event stream into JSON payloads."""
+        data_lines = []
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                data_lines.append(line[5:].strip())
+            elif not line and data_lines:
+                payload = "\n".join(data_lines)
+                data_lines = []
+                try:
+                    event = json.loads(payload)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping malformed PromptFlow event: {payload[:100]}")
+                    continue
+                if isinstance(event, dict):
+                    yield event
+        if data_lines:
+            try:
+                event = json.loads("\n".join(data_lines))
+                if isinstance(event, dict):
+                    yield event
+            except json.JSONDecodeError:
+                logging.warning("Skipping malformed trailing PromptFlow event")
+
+    async def aclose(self):
+        """Close the shared async client. Called when the app stops serving."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self._semaphore = None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            http2 = self.use_http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logging.warning("PROMPTFLOW_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1")
+                http2 = False
+            self._async_client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_keepalive_connections
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+        return self._async_client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _build_headers(self) -> Dict[str, str]:
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        # Add authentication headers only for Azure deployment
+        if self.api_key and self.api_key != 'dummy_local_key':
+            headers["Authorization"] = f"Bearer {self.api_key}"
+            headers["api-key"] = self.api_key
+        return headers
+
+    def _build_request_data(self, query: str, use_search: bool, search_type: str) -> Dict[str, Any]:
+        # Prepare request data for AI Foundry PromptFlow endpoint
+        return {
+            self.query_field: query,
+            self.use_search_field: use_search,
+            self.search_type_field: search_type
+        }
     
+    def streamed_result(self, text: str) -> Dict[str, Any]:
+        """A complete streamed answer in the shape of a non-streamed flow result."""
+        status = "error" if self.stream_error_marker in text else "success"
+        return {self.enhanced_result_field: json.dumps({"status": status, "enhanced_analysis": text})}
+
     def format_response_for_chat(self, promptflow_result: Dict[str, Any], user_message: str) -> Dict[str, Any]:
         """Format PromptFlow response for the chat interface."""
         
@@ -0,0 +1,446 @@
+"""Response cache for PromptFlow answers.
+
+Identical questions asked while the workout data is unchanged get the same
+answer, yet each one used to run the whole flow. Flow results are cached per
+worker in an LRU keyed by the normalized question, the search options, the
+chat type and a data version, with an optional shared tier (SQLite by
+default) so workers reuse each other's answers.
+
+The data version is the RESPONSE_CACHE_DATA_VERSION setting. Nothing changes
+it automatically: operators bump it (and restart the app) after every load of
+workout data, otherwise answers cached before the load are served until their
+TTL runs out.
+
+Only successful results are cached. The flow answers HTTP 200 even when a
+node failed (a rejected or throttled query, a failed LLM call) and reports
+it in the output's "status"; such answers are not kept for later askers.
+
+Entries are fresh for ``ttl`` seconds. For ``stale_ttl`` seconds after that
+they are still served while a single background call refreshes them.
+Concurrent misses for the same key wait on one flow call instead of each
+starting their own; streamed misses share one flow stream the same way.
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Shared-tier rows past their serving window are pruned every this many writes
+PRUNE_EVERY = 100
+
+
+@dataclass
+class CacheStats:
+    """Lookup counters for the response cache."""
+
+    hits: int = 0
+    stale_hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    not_cached: int = 0
+    refreshes: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.hits + self.stale_hits + self.misses
+        stats["hit_rate"] = (
+            round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0
+        )
+        return stats
+
+
+def is_successful_result(value: Any) -> bool:
+    """Whether every flow output that reports a status reports "success"."""
+    if not value:
+        return False
+    if not isinstance(value, dict):
+        return True
+    for output in value.values():
+        if isinstance(output, str):
+            try:
+                output = json.loads(output)
+            except ValueError:
+                continue
+        if isinstance(output, dict) and output.get("status", "success") != "success":
+            return False
+    return True
+
+
+class PendingStream:
+    """A flow stream in progress, relayed to every request that missed on its key.
+
+    Chunks are kept as they arrive so a request that joins late replays them
+    before following the live stream.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SharedCacheStore(abc.ABC):
+    """Interface of the shared cache tier.
+
+    Values are JSON-serialisable flow results. ``get`` returns the value and
+    the time it was stored, or None when the key is unknown or expired.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, stored_at: float, expires_at: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def aclose(self) -> None:
+        ...
+
+
+class SqliteCacheStore(SharedCacheStore):
+    """Shared tier in a local SQLite file, usable by every worker on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def _get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, stored_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _set(self, key: str, value: Any, stored_at: float, expires_at: float) -> None:
+        payload = json.dumps(value, separators=(",", ":"), default=str)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, stored_at, expires_at),
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+                )
+            self._connection.commit()
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, stored_at: float, expires_at: float) -> None:
+        await asyncio.to_thread(self._set, key, value, stored_at, expires_at)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ResponseCache:
+    """Two-tier cache of PromptFlow results with stale-while-revalidate and coalescing."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        data_version: Optional[str] = None,
+        shared: Optional[SharedCacheStore] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.enabled = (
+            enabled
+            if enabled is not None
+            else os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+        self.stale_ttl = (
+            stale_ttl
+            if stale_ttl is not None
+            else float(os.getenv("RESPONSE_CACHE_STALE_TTL", "300"))
+        )
+        self.data_version = data_version or os.getenv("RESPONSE_CACHE_DATA_VERSION", "1")
+        self._shared = shared
+        self._shared_path = os.getenv("RESPONSE_CACHE_SHARED_PATH")
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._streams: Dict[str, PendingStream] = {}
+        self.stats = CacheStats()
+
+    @property
+    def shared(self) -> Optional[SharedCacheStore]:
+        if self._shared is None and self._shared_path:
+            try:
+                self._shared = SqliteCacheStore(self._shared_path)
+            except sqlite3.Error:
+                logging.exception(f"Could not open shared response cache {self._shared_path}")
+                self._shared_path = None
+        return self._shared
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Case-fold, collapse whitespace and drop trailing punctuation."""
+        return " ".join((query or "").casefold().split()).rstrip("?!. ")
+
+    def make_key(self, query: str, use_search: bool, search_type: str, chat_type: Any) -> str:
+        return json.dumps(
+            [
+                self.normalize_query(query),
+                bool(use_search),
+                str(search_type),
+                str(chat_type),
+                self.data_version,
+            ],
+            separators=(",", ":"),
+        )
+
+    def _store_local(self, key: str, value: Any, stored_at: float) -> None:
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        if self.shared is not None:
+            try:
+                entry = await self.shared.get(key)
+            except Exception:
+                logging.exception("Shared response cache read failed")
+                entry = None
+            if entry is not None:
+                self.stats.shared_hits += 1
+                self._store_local(key, *entry)
+        return entry
+
+    async def put(self, key: str, value: Any) -> None:
+        """Store a successful ``value`` in both tiers. Shared-tier failures are logged, not raised."""
+        if not self.enabled:
+            return
+        if not is_successful_result(value):
+            self.stats.not_cached += 1
+            return
+        stored_at = time.time()
+        self._store_local(key, value, stored_at)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, value, stored_at, stored_at + self.ttl + self.stale_ttl)
+            except Exception:
+                logging.exception("Shared response cache write failed")
+
+    async def get(self, key: str, call: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Return the cached value for ``key`` or None.
+
+        A stale value is still returned; when ``call`` is given it is used to
+        refresh the entry in the background.
+        """
+        if not self.enabled:
+            return None
+        entry = await self._lookup(key)
+        if entry is None:
+            return None
+
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age <= self.ttl:
+            self.stats.hits += 1
+            return value
+        if age <= self.ttl + self.stale_ttl:
+            self.stats.stale_hits += 1
+            if call is not None and key not in self._pending:
+                self.stats.refreshes += 1
+                self._start(key, call)
+            return value
+        return None
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, calling ``call`` once for all concurrent misses."""
+        if not self.enabled:
+            return await call()
+
+        value = await self.get(key, call)
+        if value is not None:
+            return value
+
+        self.stats.misses += 1
+        task = self._pending.get(key)
+        if task is None:
+            task = self._start(key, call)
+        else:
+            self.stats.coalesced += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Abort the flow call once nobody is waiting for it any more
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _start(self, key: str, call: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def fill():
+            value = await call()
+            await self.put(key, value)
+            return value
+
+        task = asyncio.ensure_future(fill())
+        self._pending[key] = task
+
+        def done(finished: asyncio.Task):
+            if self._pending.get(key) is finished:
+                del self._pending[key]
+            if not finished.cancelled() and finished.exception() is not None:
+                self.stats.errors += 1
+
+        task.add_done_callback(done)
+        return task
+
+    async def stream(
+        self,
+        key: str,
+        open_stream: Callable[[], AsyncIterator[str]],
+        to_value: Callable[[List[str]], Any],
+    ) -> AsyncIterator[str]:
+        """Yield the chunks of one flow stream shared by all concurrent misses for ``key``.
+
+        The first miss starts ``open_stream()``; later ones replay the chunks
+        received so far and then follow it. Only a stream that ends normally
+        is cached, as ``to_value(chunks)`` and subject to the same success
+        check as ``put``. Callers look the key up with ``get`` first; this only
+        handles the miss.
+        """
+        if not self.enabled:
+            async for chunk in open_stream():
+                yield chunk
+            return
+
+        self.stats.misses += 1
+        pending = self._streams.get(key)
+        if pending is None:
+            pending = self._start_stream(key, open_stream, to_value)
+        else:
+            self.stats.coalesced += 1
+
+        pending.followers += 1
+        try:
+            async for chunk in pending.follow():
+                yield chunk
+        finally:
+            pending.followers -= 1
+            # Abort the flow stream once nobody is reading it any more
+            if not pending.followers and not pending.done:
+                pending.task.cancel()
+
+    def _start_stream(
+        self,
+        key: str,
+        open_stream: Callable[[], AsyncIterator[str]],
+        to_value: Callable[[List[str]], Any],
+    ) -> PendingStream:
+        pending = PendingStream()
+
+        async def pump():
+            try:
+                async for chunk in open_stream():
+                    pending.chunks.append(chunk)
+                    pending.publish()
+                if pending.chunks:
+                    await self.put(key, to_value(pending.chunks))
+            except asyncio.CancelledError:
+                pending.error = ConnectionError("Flow stream was cancelled")
+                raise
+            except Exception as e:
+                pending.error = e
+                self.stats.errors += 1
+            finally:
+                pending.done = True
+                pending.publish()
+                if self._streams.get(key) is pending:
+                    del self._streams[key]
+
+        self._streams[key] = pending
+        pending.task = asyncio.ensure_future(pump())
+        return pending
+
+    async def aclose(self) -> None:
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+        for pending in list(self._streams.values()):
+            pending.task.cancel()
+        self._streams.clear()
+        if self._shared is not None:
+            await self._shared.aclose()
+            self._shared = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "data_version": self.data_version,
+            "shared": type(self._shared).__name__ if self._shared else self._shared_path,
+            "in_flight": len(self._pending) + len(self._streams),
+            **self.stats.as_dict(),
+        }
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -2,6 +2,7 @@ import dataclasses
 import json
 import logging
 import os
+import time
 from enum import Enum
 from typing import List
 
@@ -173,6 +174,87 @@ def format_stream_response(chatCompletionChunk, history_metadata, apim_request_i
     return {}
 
 
+def format_content_chunk(content, history_metadata, response_id, model, apim_request_id):
+    return {
+        "id": response_id,
+        "model": model,
+        "created": int(time.time()),
+        "object": "chat.completion.chunk",
+        "choices": [{"messages": [{"role": "assistant", "content": content}]}],
+        "history_metadata": history_metadata,
+        "apim-request-id": apim_request_id,
+    }
+
+
+class TemplateSectionParser:
+    """
+    Incrementally extract template sections from a streamed JSON completion.
+
+    The model answers with {"template": [{"section_title": ..., "section_description": ...}, ...]},
+    possibly wrapped in a markdown code block. feed() returns each section as soon as its
+    closing brace arrives, so sections can be sent to the client before the document ends.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self._section_depth = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current = []
+
+    def feed(self, text: str) -> List[dict]:
+        self.raw += text
+        sections = []
+        for ch in text:
+            if self._section_depth is None:
+                # Sections sit inside the root object, or at the top level of a bare array
+                if ch == "{":
+                    self._section_depth = 2
+                elif ch == "[":
+                    self._section_depth = 1
+                else:
+                    continue
+
+            capturing = self._depth >= self._section_depth
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+                capturing = self._depth >= self._section_depth
+            elif ch == "}":
+                if self._depth == self._section_depth:
+                    self._current.append(ch)
+                    section = self._parse_section("".join(self._current))
+                    if section is not None:
+                        sections.append(section)
+                    self._current = []
+                    capturing = False
+                self._depth -= 1
+
+            if capturing:
+                self._current.append(ch)
+        return sections
+
+    @staticmethod
+    def _parse_section(section_json: str):
+        try:
+            section = json.loads(section_json)
+        except json.JSONDecodeError:
+            logging.warning(f"Skipping malformed template section: {section_json[:100]}")
+            return None
+        if isinstance(section, dict) and "section_title" in section:
+            return section
+        return None
+
+
 def comma_separated_string_to_list(s: str) -> List[str]:
     """
     Split comma-separated values into a list.
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of conversation lookups: SQL queries vs point operations.
+
+Runs against the local Cosmos DB emulator and compares, per call, the RU charge
+and latency of the lookups CosmosConversationClient used to make with the
+point operations it makes now:
+
+- get_conversation: query on id + userId  vs  read_item(id, partition_key)
+- update_message_feedback: read_item + upsert_item  vs  patch_item
+- delete_conversation: read_item + delete_item  vs  delete_item
+
+Usage:
+    python benchmark_history_reads.py [--iterations 50] [--conversations 200] [--messages 20]
+
+The emulator endpoint and key default to the emulator's well-known values and
+can be overridden with COSMOS_EMULATOR_ENDPOINT and COSMOS_EMULATOR_KEY.
+"""
+
+import argparse
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import urllib3
+from azure.cosmos import CosmosClient, PartitionKey
+
+EMULATOR_ENDPOINT = os.getenv("COSMOS_EMULATOR_ENDPOINT", "https://localhost:8081")
+# Published key of the local emulator, not a secret
+EMULATOR_KEY = os.getenv(
+    "COSMOS_EMULATOR_KEY",
+    "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw==",
+)
+DATABASE_NAME = "history_benchmark"
+
+
+def _charge(container):
+    return float(container.client_connection.last_response_headers.get("x-ms-request-charge", 0))
+
+
+def measure(container, operation):
+    """Run ``operation`` once; return (RU charge summed over its calls, latency in ms)."""
+    charges = []
+    started = time.perf_counter()
+    operation(lambda: charges.append(_charge(container)))
+    return sum(charges), (time.perf_counter() - started) * 1000
+
+
+def seed(container, user_id, conversations, messages):
+    print(f"Seeding {conversations} conversations with {messages} messages each...")
+    conversation_ids = []
+    message_ids = []
+    for _ in range(conversations):
+        conversation_id = str(uuid.uuid4())
+        now = datetime.utcnow().isoformat()
+        container.upsert_item({
+            "id": conversation_id, "type": "conversation", "userId": user_id,
+            "createdAt": now, "updatedAt": now, "title": "Benchmark conversation",
+        })
+        conversation_ids.append(conversation_id)
+        for _ in range(messages):
+            message_id = str(uuid.uuid4())
+            container.upsert_item({
+                "id": message_id, "type": "message", "userId": user_id,
+                "conversationId": conversation_id, "createdAt": now, "updatedAt": now,
+                "role": "assistant", "content": "You did 120 pushups last week. " * 20,
+                "feedback": "",
+            })
+            message_ids.append(message_id)
+    return conversation_ids, message_ids
+
+
+def run_benchmark(iterations, conversations, messages):
+    urllib3.disable_warnings()
+    client = CosmosClient(EMULATOR_ENDPOINT, EMULATOR_KEY, connection_verify=False)
+    database = client.create_database_if_not_exists(DATABASE_NAME)
+    container_name = f"conversations_{uuid.uuid4().hex[:8]}"
+    container = database.create_container(id=container_name, partition_key=PartitionKey(path="/userId"))
+    user_id = "benchmark-user"
+
+    try:
+        conversation_ids, message_ids = seed(container, user_id, conversations, messages)
+        results = {}
+
+        def query_conversation(conversation_id):
+            def operation(record):
+                items = list(container.query_items(
+                    query="SELECT * FROM c where c.id = @conversationId and c.type='conversation' and c.userId = @userId",
+                    parameters=[{"name": "@conversationId", "value": conversation_id},
+                                {"name": "@userId", "value": user_id}],
+                    enable_cross_partition_query=True,
+                ))
+                record()
+                return items
+            return operation
+
+        def read_conversation(conversation_id):
+            def operation(record):
+                container.read_item(conversation_id, partition_key=user_id)
+                record()
+            return operation
+
+        def read_upsert_feedback(message_id):
+            def operation(record):
+                message = container.read_item(message_id, partition_key=user_id)
+                record()
+                message["feedback"] = "positive"
+                container.upsert_item(message)
+                record()
+            return operation
+
+        def patch_feedback(message_id):
+            def operation(record):
+                container.patch_item(
+                    message_id, partition_key=user_id,
+                    patch_operations=[{"op": "set", "path": "/feedback", "value": "negative"}],
+                    filter_predicate="FROM c WHERE c.type = 'message'",
+                )
+                record()
+            return operation
+
+        def read_delete(conversation_id):
+            def operation(record):
+                container.read_item(conversation_id, partition_key=user_id)
+                record()
+                container.delete_item(conversation_id, partition_key=user_id)
+                record()
+            return operation
+
+        def point_delete(conversation_id):
+            def operation(record):
+                container.delete_item(conversation_id, partition_key=user_id)
+                record()
+            return operation
+
+        # Warm up connections and caches before timing
+        read_conversation(conversation_ids[0])(lambda: None)
+
+        lookups = conversation_ids[:iterations]
+        feedback_targets = message_ids[:iterations]
+        deletes = conversation_ids[-2 * iterations:]
+        cases = [
+            ("get_conversation", "query", query_conversation, lookups),
+            ("get_conversation", "point read", read_conversation, lookups),
+            ("update_message_feedback", "read + upsert", read_upsert_feedback, feedback_targets),
+            ("update_message_feedback", "patch", patch_feedback, feedback_targets),
+            ("delete_conversation", "read + delete", read_delete, deletes[:iterations]),
+            ("delete_conversation", "point delete", point_delete, deletes[iterations:]),
+        ]
+        for name, variant, build, targets in cases:
+            samples = [measure(container, build(target)) for target in targets]
+            results[(name, variant)] = (
+                statistics.mean(charge for charge, _ in samples),
+                statistics.median(latency for _, latency in samples),
+                max(latency for _, latency in samples),
+            )
+
+        print(f"\n{'Call':<26}{'Variant':<16}{'RU/call':>10}{'p50 ms':>10}{'max ms':>10}")
+        for (name, variant), (charge, p50, worst) in results.items():
+            print(f"{name:<26}{variant:<16}{charge:>10.2f}{p50:>10.2f}{worst:>10.2f}")
+        return results
+    finally:
+        database.delete_container(container_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare query and point-operation costs on the Cosmos DB emulator")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls measured per variant")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversations seeded for the benchmark user")
+    parser.add_argument("--messages", type=int, default=20, help="Messages seeded per conversation")
+    args = parser.parse_args()
+    if args.conversations < 3 * args.iterations:
+        parser.error("--conversations must be at least 3 x --iterations (lookups and two delete variants)")
+    run_benchmark(args.iterations, args.conversations, args.messages)
@@ -49,9 +49,19 @@ export const fetchChatHistoryInit = (): Conversation[] | null => {
   return chatHistorySampleData
 }
 
+// Cursor returned with each history page, keyed by the offset of the page it continues from
+const historyCursors = new Map<number, string>();
+
 export const historyList = async (offset = 0): Promise<Conversation[] | null> => {
   try {
-    const res = await fetch(`/history/list?offset=${offset}`, { method: 'GET' });
+    if (offset === 0) {
+      historyCursors.clear();
+    }
+    const cursor = historyCursors.get(offset);
+    const url = cursor
+      ? `/history/list?offset=${offset}&cursor=${encodeURIComponent(cursor)}`
+      : `/history/list?offset=${offset}`;
+    const res = await fetch(url, { method: 'GET' });
     const payload = await res.json();
 
     if (!Array.isArray(payload)) {
@@ -59,6 +69,11 @@ export const historyList = async (offset = 0): Promise<Conversation[] | null> =>
       return null;
     }
 
+    const nextCursor = res.headers?.get('X-History-Cursor');
+    if (nextCursor) {
+      historyCursors.set(offset + payload.length, nextCursor);
+    }
+
     const conversations: Conversation[] = await Promise.all(
       payload.map(async (conv: any) => {
         let convMessages: ChatMessage[] = [];
@@ -217,7 +217,9 @@ const Chat = ({ type = ChatType.Browse }: Props) => {
   let toolMessage = {} as ChatMessage
   let assistantContent = ''
 
-  const processTemplateResponse = () => {
+  // partial: called while a template is still streaming; the sections received so far
+  // are closed off with ']}' so they can be rendered before the response completes
+  const processTemplateResponse = (partial = false) => {
     if (type === ChatType.Template) {
       let jsonString = ''
       if (assistantMessage.role === ASSISTANT) {
@@ -235,6 +237,7 @@ const Chat = ({ type = ChatType.Browse }: Props) => {
         } else return
       }
       if (jsonString === '') return
+      if (partial) jsonString += ']}'
 
       setJSONDraftDocument(jsonString) // use in the Answer response
       try {
@@ -254,7 +257,7 @@ const Chat = ({ type = ChatType.Browse }: Props) => {
         setDraftDocument(draftedTemplate)
         appStateContext?.dispatch({ type: 'UPDATE_DRAFTED_DOCUMENT', payload: draftedTemplate })
       } catch (e) {
-        console.error('Failed to parse JSON:', e)
+        if (!partial) console.error('Failed to parse JSON:', e)
       }
     }
   }
@@ -361,6 +364,7 @@ const Chat = ({ type = ChatType.Browse }: Props) => {
                   result.choices[0].messages.forEach(resultObj => {
                     processResultMessage(resultObj, userMessage, conversationId)
                   })
+                  if (type === ChatType.Template) processTemplateResponse(true)
                 } else if (result.error) {
                   throw Error(result.error)
                 }
@@ -533,6 +537,7 @@ const Chat = ({ type = ChatType.Browse }: Props) => {
                   result.choices[0].messages.forEach(resultObj => {
                     processResultMessage(resultObj, userMessage, conversationId)
                   })
+                  if (type === ChatType.Template) processTemplateResponse(true)
                 }
                 runningText = ''
               } else if (result.error) {
@@ -1,65 +1,322 @@
 #!/usr/bin/env python3
 """
-Setup script to create the conversations container in Cosmos DB for template history.
+Provision the conversations container in Cosmos DB for template history.
+
+Creates the container with the indexing policy the history queries are tuned
+for (composite indexes for the conversation list and message queries, message
+bodies excluded from the index), or migrates an existing container to it.
+
+Usage:
+    python setup_conversations_container.py                        # create if missing, 400 RU/s
+    python setup_conversations_container.py --autoscale-max 4000   # create with autoscale throughput
+    python setup_conversations_container.py --migrate --report     # apply the policy, compare query RUs
+
+--report prints the RU charge of the app's history queries for one user. With
+--migrate it runs before the policy change and again once Cosmos has finished
+re-indexing. Once the composite indexes are in place, set
+AZURE_COSMOSDB_COMPOSITE_INDEXES=true so the app uses them.
+
+Containers are created, and --migrate switches existing ones, to TTL on with
+no default expiry (defaultTtl -1): only items with their own ttl expire, which
+is how finished delete-all job statuses clean themselves up. A container that
+already has a default TTL keeps it.
 """
 
+import argparse
 import os
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+import time
+
+from azure.cosmos import CosmosClient, PartitionKey, ThroughputProperties, exceptions
+from azure.identity import DefaultAzureCredential
+
+from backend.history.cosmosdbservice import (CONVERSATIONS_INDEXING_POLICY,
+                                             conversation_list_query,
+                                             messages_query)
+
+PARTITION_KEY = "/userId"
+# Conversations shown per page by /history/list
+LIST_PAGE_SIZE = 25
+INDEX_PROGRESS_HEADER = "x-ms-documentdb-collection-index-transformation-progress"
+
+
+def _composite_key(index):
+    return tuple((path["path"], path.get("order", "ascending").lower()) for path in index)
+
+
+def missing_policy_parts(indexing_policy):
+    """Composite indexes and excluded paths of the tuned policy that ``indexing_policy`` lacks."""
+    composites = {_composite_key(index) for index in indexing_policy.get("compositeIndexes", [])}
+    excluded = {path["path"] for path in indexing_policy.get("excludedPaths", [])}
+    missing_composites = [
+        index for index in CONVERSATIONS_INDEXING_POLICY["compositeIndexes"]
+        if _composite_key(index) not in composites
+    ]
+    missing_excluded = [
+        path["path"] for path in CONVERSATIONS_INDEXING_POLICY["excludedPaths"]
+        if path["path"] not in excluded
+    ]
+    return missing_composites, missing_excluded
+
+
+def throughput_for(args):
+    if args.autoscale_max:
+        return ThroughputProperties(auto_scale_max_throughput=args.autoscale_max)
+    return args.throughput
+
+
+def describe_throughput(container):
+    try:
+        throughput = container.get_throughput()
+    except exceptions.CosmosResourceNotFoundError:
+        return "shared with the database"
+    if throughput.auto_scale_max_throughput:
+        return f"autoscale, max {throughput.auto_scale_max_throughput} RU/s"
+    return f"{throughput.offer_throughput} RU/s"
+
+
+def update_throughput(container, database_name, args):
+    """Apply --throughput or --autoscale-max to an existing container where Cosmos allows it."""
+    if not (args.autoscale_max or args.throughput_set):
+        return
+    try:
+        current = container.get_throughput()
+    except exceptions.CosmosResourceNotFoundError:
+        print("⚠️  Throughput is provisioned on the database, leaving it unchanged")
+        return
+
+    is_autoscale = bool(current.auto_scale_max_throughput)
+    if bool(args.autoscale_max) != is_autoscale:
+        # Switching between manual and autoscale is a separate migration the SDK does not expose
+        target = "autoscale" if args.autoscale_max else "manual"
+        print(f"⚠️  Switching throughput to {target} is not possible from the SDK. Run:")
+        print(f"   az cosmosdb sql container throughput migrate --throughput-type {target} "
+              f"--account-name {os.getenv('AZURE_COSMOSDB_ACCOUNT')} "
+              f"--database-name {database_name} "
+              f"--name {container.id} --resource-group <resource-group>")
+        print("   then run this script again to set the RU/s.")
+        return
+
+    container.replace_throughput(throughput_for(args))
+    print(f"✅ Throughput set to {describe_throughput(container)}")
+
+
+def wait_for_index_transformation(container, timeout):
+    """Block until Cosmos reports the indexing policy change as fully applied."""
+    deadline = time.time() + timeout
+    while True:
+        container.read(populate_quota_info=True)
+        progress = container.client_connection.last_response_headers.get(INDEX_PROGRESS_HEADER)
+        progress = int(progress) if progress is not None else 100
+        print(f"   Index transformation: {progress}%")
+        if progress >= 100:
+            return True
+        if time.time() >= deadline:
+            print("⚠️  Index transformation still running, the after report may not reflect the new policy")
+            return False
+        time.sleep(5)
+
+
+def _run_query(container, query, parameters, user_id, max_item_count, first_page_only=False):
+    charge = 0.0
+    items = 0
+    pager = container.query_items(
+        query=query, parameters=parameters, partition_key=user_id, max_item_count=max_item_count
+    ).by_page()
+    for page in pager:
+        items += len(list(page))
+        charge += float(container.client_connection.last_response_headers.get("x-ms-request-charge", 0))
+        if first_page_only:
+            break
+    return charge, items
+
+
+def pick_sample(container, user_id=None, conversation_id=None):
+    """Return (user_id, conversation_id) to measure, defaulting to the most recent conversation."""
+    if user_id and conversation_id:
+        return user_id, conversation_id
+    query = "SELECT TOP 1 c.userId, c.id FROM c WHERE c.type = 'conversation'"
+    parameters = []
+    if user_id:
+        query += " AND c.userId = @userId"
+        parameters.append({"name": "@userId", "value": user_id})
+    query += " ORDER BY c._ts DESC"
+    for item in container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+        return item["userId"], item["id"]
+    return user_id, None
+
+
+def query_cost_report(container, user_id, conversation_id):
+    """RU charge of each history query shape for one user, keyed by (query, ORDER BY form)."""
+    policy = container.read()["indexingPolicy"]
+    has_composites = not missing_policy_parts(policy)[0]
+    forms = [("default", False)] + ([("composite", True)] if has_composites else [])
+    user_parameters = [{"name": "@userId", "value": user_id}]
+    message_parameters = user_parameters + [{"name": "@conversationId", "value": conversation_id}]
+
+    report = {}
+    for form, composite_indexes in forms:
+        list_query = conversation_list_query("DESC", composite_indexes)
+        report[("list first page", form)] = _run_query(
+            container, list_query, user_parameters, user_id, LIST_PAGE_SIZE, first_page_only=True
+        )
+        report[("list all conversations", form)] = _run_query(
+            container, list_query, user_parameters, user_id, LIST_PAGE_SIZE
+        )
+        if conversation_id:
+            report[("conversation messages", form)] = _run_query(
+                container, messages_query(composite_indexes), message_parameters, user_id, None
+            )
+    return report
+
+
+def print_report(before, after):
+    print(f"\n{'Query':<26}{'ORDER BY':<12}{'Items':>8}{'Before RU':>12}{'After RU':>12}")
+    for key in dict.fromkeys(list(before) + list(after)):
+        name, form = key
+        items = (after.get(key) or before.get(key))[1]
+        columns = [f"{report[key][0]:.2f}" if key in report else "n/a" for report in (before, after)]
+        print(f"{name:<26}{form:<12}{items:>8}{columns[0]:>12}{columns[1]:>12}")
+
+
+def connect():
+    account = os.getenv("AZURE_COSMOSDB_ACCOUNT")
+    account_uri = f"https://{account}.documents.azure.com:443/"
+    # Fall back to Entra ID when no key is configured, as the app does
+    credential = os.getenv("AZURE_COSMOSDB_ACCOUNT_KEY") or DefaultAzureCredential()
+    return CosmosClient(account_uri, credential)
+
+
+def setup_conversations_container(args):
+    """Create or migrate the conversations container; optionally report query costs."""
 
-def setup_conversations_container():
-    """Create the conversations container if it doesn't exist."""
-    
     # Cosmos DB configuration from environment
-    account_uri = f"https://{os.getenv('AZURE_COSMOSDB_ACCOUNT')}.documents.azure.com:443/"
-    account_key = os.getenv('AZURE_COSMOSDB_ACCOUNT_KEY')
     database_name = os.getenv('AZURE_COSMOSDB_DATABASE', 'sql-test')
     container_name = os.getenv('AZURE_COSMOSDB_CONVERSATIONS_CONTAINER', 'conversations')
-    
-    print(f"🔗 Connecting to Cosmos DB...")
+
+    print("🔗 Connecting to Cosmos DB...")
     print(f"   Account: {os.getenv('AZURE_COSMOSDB_ACCOUNT')}")
     print(f"   Database: {database_name}")
     print(f"   Container: {container_name}")
-    
+
     try:
-        # Initialize Cosmos client
-        client = CosmosClient(account_uri, account_key)
-        
-        # Get database
+        client = connect()
         database = client.get_database_client(database_name)
+        database.read()
         print(f"✅ Connected to database: {database_name}")
-        
-        # Check if conversations container exists
+
+        container = database.get_container_client(container_name)
         try:
-            container = database.get_container_client(container_name)
-            # Try to read container properties to verify it exists
             container_properties = container.read()
-            print(f"✅ Container '{container_name}' already exists")
-            print(f"   Partition Key: {container_properties['partitionKey']['paths']}")
-            return True
-            
         except exceptions.CosmosResourceNotFoundError:
             print(f"📝 Container '{container_name}' not found, creating...")
-            
-            # Create conversations container with userId as partition key
             container = database.create_container(
                 id=container_name,
-                partition_key=PartitionKey(path="/userId"),
-                offer_throughput=400  # Minimum throughput
+                partition_key=PartitionKey(path=PARTITION_KEY),
+                indexing_policy=CONVERSATIONS_INDEXING_POLICY,
+                # TTL on, with no default expiry: only items carrying a ttl
+                # (finished delete job statuses) expire
+                default_ttl=-1,
+                offer_throughput=throughput_for(args),
             )
-            
             print(f"✅ Successfully created container: {container_name}")
-            print(f"   Partition Key: /userId")
-            print(f"   Throughput: 400 RU/s")
+            print(f"   Partition Key: {PARTITION_KEY}")
+            print(f"   Throughput: {describe_throughput(container)}")
+            print("   Indexing policy: tuned (composite indexes, message bodies not indexed)")
+            print("   TTL: on, no default expiry (only delete job statuses expire)")
+            if args.report:
+                print("ℹ️  The container is empty, skipping the query cost report")
             return True
-            
+
+        print(f"✅ Container '{container_name}' already exists")
+        print(f"   Partition Key: {container_properties['partitionKey']['paths']}")
+        print(f"   Throughput: {describe_throughput(container)}")
+        if container_properties["partitionKey"]["paths"] != [PARTITION_KEY]:
+            print(f"❌ The history queries expect the partition key {PARTITION_KEY}; "
+                  f"a container's partition key cannot be changed, create a new container instead")
+            return False
+
+        missing_composites, missing_excluded = missing_policy_parts(container_properties["indexingPolicy"])
+        if missing_composites or missing_excluded:
+            print(f"   Indexing policy is missing {len(missing_composites)} composite index(es) "
+                  f"and excluded path(s) {missing_excluded or 'none'}")
+        else:
+            print("   Indexing policy: tuned")
+        default_ttl = container_properties.get("defaultTtl")
+        if default_ttl is None:
+            print("   TTL: off (delete job statuses are never cleaned up)")
+        else:
+            print(f"   TTL: on, default {'none' if default_ttl == -1 else f'{default_ttl}s'}")
+
+        before = {}
+        sample_user, sample_conversation = None, None
+        if args.report:
+            sample_user, sample_conversation = pick_sample(container, args.user_id, args.conversation_id)
+            if sample_user is None:
+                print("ℹ️  No conversations found, skipping the query cost report")
+                args.report = False
+            else:
+                print(f"📊 Measuring history queries for user {sample_user}...")
+                before = query_cost_report(container, sample_user, sample_conversation)
+
+        if args.migrate:
+            update_throughput(container, database_name, args)
+            if missing_composites or missing_excluded or default_ttl is None:
+                if missing_composites or missing_excluded:
+                    print("📝 Applying the tuned indexing policy...")
+                if default_ttl is None:
+                    # Intended: delete job statuses carry a ttl, which only takes effect with TTL on.
+                    # -1 sets no default expiry, so conversations and messages never expire.
+                    print("📝 Turning TTL on with no default expiry so finished delete job statuses expire")
+                container = database.replace_container(
+                    container,
+                    partition_key=PartitionKey(path=PARTITION_KEY),
+                    indexing_policy=CONVERSATIONS_INDEXING_POLICY,
+                    # replace_container drops settings it is not given, so pass the TTL explicitly
+                    default_ttl=-1 if default_ttl is None else default_ttl,
+                )
+                if missing_composites or missing_excluded:
+                    print("✅ Indexing policy replaced, Cosmos re-indexes in the background")
+                    if args.report or args.wait:
+                        wait_for_index_transformation(container, args.timeout)
+                else:
+                    print("✅ TTL turned on")
+            print("ℹ️  Set AZURE_COSMOSDB_COMPOSITE_INDEXES=true once the index transformation is complete")
+        elif missing_composites or missing_excluded or default_ttl is None:
+            print("ℹ️  Run with --migrate to apply the tuned indexing policy and TTL")
+
+        if args.report:
+            after = query_cost_report(container, sample_user, sample_conversation) if args.migrate else {}
+            print_report(before, after)
+        return True
+
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return False
 
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the Cosmos DB conversations container")
+    throughput = parser.add_mutually_exclusive_group()
+    throughput.add_argument("--throughput", type=int, help="Manual throughput in RU/s (default 400)")
+    throughput.add_argument("--autoscale-max", type=int, help="Autoscale throughput with this maximum RU/s")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Apply the indexing policy and throughput to an existing container, and turn TTL on "
+                             "(no default expiry, so only delete job statuses expire) if it is off")
+    parser.add_argument("--wait", action="store_true", help="With --migrate, wait until re-indexing completes")
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds to wait for re-indexing (default 600)")
+    parser.add_argument("--report", action="store_true", help="Print the RU charge of the history queries (before and after with --migrate)")
+    parser.add_argument("--user-id", help="User whose history is measured (default: the most recently active)")
+    parser.add_argument("--conversation-id", help="Conversation whose messages are measured (requires --user-id)")
+    args = parser.parse_args()
+    if args.conversation_id and not args.user_id:
+        parser.error("--conversation-id requires --user-id")
+    args.throughput_set = args.throughput is not None
+    if args.throughput is None:
+        args.throughput = 400  # Minimum manual throughput
+
     print("🚀 Setting up CosmosDB conversations container for template history...")
-    success = setup_conversations_container()
+    success = setup_conversations_container(args)
     if success:
         print("\n🎉 Setup complete! Template history should now work properly.")
     else:
-        print("\n💥 Setup failed. Please check your Cosmos DB configuration.")
\ No newline at end of file
+        print("\n💥 Setup failed. Please check your Cosmos DB configuration.")
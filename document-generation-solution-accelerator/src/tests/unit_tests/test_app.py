@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+# Settings are read when the app module is imported
+os.environ.setdefault("AZURE_OPENAI_MODEL", "gpt-4o")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+os.environ.setdefault("AZURE_OPENAI_KEY", "test-key")
+
+import app as app_module  # noqa: E402
+from backend.response_cache import ResponseCache  # noqa: E402
+
+PROMPTFLOW_RESULT = {"enhanced_result": json.dumps({"enhanced_analysis": "You did 120 pushups last week."})}
+
+
+@pytest.fixture
+def promptflow_app(monkeypatch):
+    monkeypatch.setattr(app_module.app_settings.base_settings, "use_promptflow", True)
+    monkeypatch.setattr(app_module.app_settings.base_settings, "use_ai_foundry_sdk", False)
+    monkeypatch.setattr(app_module.promptflow_handler, "is_available", lambda: True)
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache(ttl=60, stale_ttl=0, enabled=True))
+    return app_module.create_app()
+
+
+@pytest.mark.asyncio
+async def test_template_failure_falls_back_to_promptflow_answer(promptflow_app, monkeypatch):
+    async def acall_promptflow(**kwargs):
+        return PROMPTFLOW_RESULT
+
+    class FailingCompletions:
+        async def create(self, **kwargs):
+            raise RuntimeError("deployment not found")
+
+    class FailingClient:
+        chat = type("Chat", (), {"completions": FailingCompletions()})()
+
+    monkeypatch.setattr(app_module.promptflow_handler, "acall_promptflow", acall_promptflow)
+    monkeypatch.setattr(app_module, "init_openai_client", lambda: FailingClient())
+
+    response = await promptflow_app.test_client().post("/conversation", json={
+        "chat_type": "template",
+        "messages": [{"role": "user", "content": "Write a report on my pushups"}],
+    })
+
+    chunks = [json.loads(line) for line in (await response.get_data(as_text=True)).splitlines()]
+    assert response.status_code == 200
+    assert chunks[0]["choices"][0]["messages"][0]["content"] == "You did 120 pushups last week."
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streamed_questions_share_one_flow_call(promptflow_app, monkeypatch):
+    calls = []
+
+    async def astream_promptflow(**kwargs):
+        calls.append(kwargs)
+        for chunk in ["You did ", "120 pushups ", "last week."]:
+            await asyncio.sleep(0.02)
+            yield chunk
+
+    monkeypatch.setattr(app_module.app_settings.azure_openai, "stream", True)
+    monkeypatch.setattr(app_module.promptflow_handler, "astream_promptflow", astream_promptflow)
+    client = promptflow_app.test_client()
+
+    async def ask(question):
+        response = await client.post("/conversation", json={
+            "messages": [{"role": "user", "content": question}],
+        })
+        chunks = [json.loads(line) for line in (await response.get_data(as_text=True)).splitlines()]
+        return "".join(chunk["choices"][0]["messages"][0]["content"] for chunk in chunks)
+
+    answers = await asyncio.gather(*(ask(question) for question in [
+        "How many pushups did I do last week?",
+        "how many pushups did I do last week",
+        "How many  pushups did I do last week?",
+    ]))
+
+    assert len(calls) == 1
+    assert answers == ["You did 120 pushups last week."] * 3
@@ -0,0 +1,45 @@
+import httpx
+import pytest
+
+from backend.client_registry import ClientRegistry, PoolStats, _PoolStatsTransport
+
+
+async def _body():
+    yield b"ok"
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_track_in_flight_requests():
+    stats = PoolStats(max_connections=1, max_keepalive_connections=1)
+    transport = _PoolStatsTransport(
+        httpx.MockTransport(lambda request: httpx.Response(200, content=_body())),
+        stats,
+    )
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        async with client.stream("GET", "https://example.test/a"):
+            assert stats.in_flight == 1
+            await client.get("https://example.test/b")
+            assert stats.saturated_requests == 1
+            assert stats.peak_in_flight == 2
+
+    assert stats.in_flight == 0
+    assert stats.total_requests == 2
+    assert stats.as_dict()["saturation"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_builds_client_once():
+    registry = ClientRegistry()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        return object()
+
+    first = await registry.get_or_create("client", factory)
+    second = await registry.get_or_create("client", factory)
+
+    assert first is second
+    assert len(calls) == 1
+    assert registry.stats()["clients"] == ["client"]
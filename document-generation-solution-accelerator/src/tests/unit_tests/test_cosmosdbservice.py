@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+from azure.cosmos import exceptions
+
+from backend.history.cosmosdbservice import (CONVERSATIONS_INDEXING_POLICY,
+                                             CosmosConversationClient,
+                                             conversation_list_query,
+                                             decode_cursor, encode_cursor)
+
+
+class FakeContainer:
+    def __init__(self, conversations=()):
+        self.conversations = set(conversations)
+        self.items = {}
+        self.batches = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def read_item(self, item, partition_key):
+        document = self.items.get((partition_key, item))
+        if document is None:
+            raise exceptions.CosmosResourceNotFoundError(message="Not found")
+        return document
+
+    async def execute_item_batch(self, batch_operations, partition_key):
+        self.batches.append((batch_operations, partition_key))
+        if batch_operations[-1][0] == "delete":
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            await asyncio.sleep(0)
+            self.in_flight -= 1
+            return [{"statusCode": 204} for _ in batch_operations]
+        patch_id = batch_operations[-1][1][0]
+        if patch_id not in self.conversations:
+            raise exceptions.CosmosBatchOperationError(
+                error_index=len(batch_operations) - 1,
+                headers={},
+                status_code=404,
+                message="Not found",
+                operation_responses=[],
+            )
+        return [{"statusCode": 200, "resourceBody": operation[1][0]} for operation in batch_operations]
+
+
+@pytest.fixture
+def conversation_client():
+    client = CosmosConversationClient.__new__(CosmosConversationClient)
+    client.enable_message_feedback = True
+    client.delete_concurrency = 2
+    client.container_client = FakeContainer(conversations=["conv-1"])
+    return client
+
+
+@pytest.mark.asyncio
+async def test_create_messages_writes_one_batch(conversation_client):
+    created = await conversation_client.create_messages(
+        "conv-1",
+        "user-1",
+        [
+            ("tool-1", {"role": "tool", "content": "{}"}),
+            ("msg-1", {"role": "assistant", "content": "You did 120 pushups"}),
+        ],
+    )
+
+    [(operations, partition_key)] = conversation_client.container_client.batches
+    assert partition_key == "user-1"
+    assert [operation[0] for operation in operations] == ["upsert", "upsert", "patch"]
+    assert operations[-1][1][1][0]["value"] == created[-1]["createdAt"]
+    assert [message["id"] for message in created] == ["tool-1", "msg-1"]
+    assert created[0]["feedback"] == ""
+
+
+@pytest.mark.asyncio
+async def test_create_message_reports_missing_conversation(conversation_client):
+    result = await conversation_client.create_message(
+        "msg-1", "conv-2", "user-1", {"role": "user", "content": "hi"}
+    )
+
+    assert result == "Conversation not found"
+
+
+@pytest.mark.asyncio
+async def test_delete_items_uses_bounded_batches(conversation_client):
+    progress = []
+
+    async def report(deleted):
+        progress.append(deleted)
+
+    item_ids = [f"msg-{i}" for i in range(250)]
+    deleted = await conversation_client.delete_items("user-1", item_ids, report)
+
+    batches = conversation_client.container_client.batches
+    assert deleted == 250
+    assert [len(operations) for operations, _ in batches] == [100, 100, 50]
+    assert sorted(progress) == [50, 100, 100]
+    assert conversation_client.container_client.peak_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_get_conversation_uses_point_read(conversation_client):
+    items = conversation_client.container_client.items
+    items[("user-1", "conv-1")] = {"id": "conv-1", "type": "conversation"}
+    items[("user-1", "msg-1")] = {"id": "msg-1", "type": "message"}
+
+    assert await conversation_client.get_conversation("user-1", "conv-1") == items[("user-1", "conv-1")]
+    assert await conversation_client.get_conversation("user-2", "conv-1") is None
+    assert await conversation_client.get_conversation("user-1", "msg-1") is None
+
+
+def test_cursor_round_trip():
+    token = '[{"compositeToken":"+RID:~abc==#RT:1","orderByItems":[{"item":"2025-01-01"}]}]'
+    cursor = encode_cursor(token)
+
+    assert "=" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == token
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_composite_list_query_matches_indexing_policy():
+    composites = [
+        [(path["path"], path["order"]) for path in index]
+        for index in CONVERSATIONS_INDEXING_POLICY["compositeIndexes"]
+    ]
+
+    assert conversation_list_query("DESC").endswith("ORDER BY c.updatedAt DESC")
+    assert conversation_list_query("DESC", composite_indexes=True).endswith(
+        "ORDER BY c.type ASC, c.updatedAt DESC"
+    )
+    assert [("/type", "ascending"), ("/updatedAt", "descending")] in composites
+    with pytest.raises(ValueError):
+        conversation_list_query("DESC; DROP", composite_indexes=True)
+
+
+class ShortPageContainer:
+    """Returns at most 10 items per page whatever max_item_count asks for, as Cosmos may."""
+
+    def __init__(self, total):
+        self.items = [{"id": f"conv-{number}"} for number in range(total)]
+        self.requests = []
+
+    def query_items(self, query, parameters, partition_key, max_item_count):
+        container = self
+
+        class Pages:
+            def __init__(self, continuation_token):
+                self.start = int(continuation_token or 0)
+                self.end = min(self.start + max_item_count, self.start + 10, len(container.items))
+                self.continuation_token = None
+                self.read = False
+                container.requests.append((self.start, max_item_count))
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                if self.read or self.start == self.end:
+                    raise StopAsyncIteration
+                self.read = True
+                self.continuation_token = str(self.end) if self.end < len(container.items) else None
+                return self.items(container.items[self.start:self.end])
+
+            async def items(self, page):
+                for item in page:
+                    yield item
+
+        class Pager:
+            def by_page(self, continuation_token=None):
+                return Pages(continuation_token)
+
+        return Pager()
+
+
+@pytest.mark.asyncio
+async def test_conversation_pages_are_filled_across_short_pages(conversation_client):
+    container = ShortPageContainer(total=60)
+    conversation_client.container_client = container
+    conversation_client.composite_indexes = False
+
+    first, token = await conversation_client.get_conversations_page("user-1", 25)
+    second, token = await conversation_client.get_conversations_page("user-1", 25, token)
+    last, token = await conversation_client.get_conversations_page("user-1", 25, token)
+
+    assert [item["id"] for item in first + second + last] == [f"conv-{number}" for number in range(60)]
+    assert (len(first), len(second), len(last), token) == (25, 25, 10, None)
+    assert container.requests[:3] == [(0, 25), (10, 15), (20, 5)]
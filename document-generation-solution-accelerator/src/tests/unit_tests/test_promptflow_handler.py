@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.promptflow_handler import PromptFlowHandler
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv("PROMPTFLOW_ENDPOINT", "http://127.0.0.1:8080/score")
+    monkeypatch.setenv("PROMPTFLOW_MAX_CONCURRENCY", "2")
+    return PromptFlowHandler()
+
+
+@pytest.mark.asyncio
+async def test_acall_promptflow_success(handler):
+    def respond(request):
+        assert request.headers["Content-Type"] == "application/json"
+        return httpx.Response(200, json={"enhanced_result": "ok"})
+
+    handler._async_client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+
+    result = await handler.acall_promptflow("how many pushups")
+
+    assert result == {"enhanced_result": "ok"}
+    assert handler.in_flight == 0
+    await handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_acall_promptflow_deadline(handler):
+    async def respond(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    handler._async_client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+
+    with pytest.raises(Exception, match="deadline"):
+        await handler.acall_promptflow("how many pushups", timeout=0.05)
+
+    assert handler.in_flight == 0
+    await handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_astream_promptflow_relays_sse_chunks(handler):
+    def respond(request):
+        assert request.headers["Accept"] == "text/event-stream"
+        body = (
+            b'data: {"enhanced_result": "You did "}\n\n'
+            b'data: {"enhanced_result": "120 pushups"}\n\n'
+        )
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=body
+        )
+
+    handler._async_client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+
+    chunks = [chunk async for chunk in handler.astream_promptflow("how many pushups")]
+
+    assert chunks == ["You did ", "120 pushups"]
+    assert handler.in_flight == 0
+    await handler.aclose()
+
+
+def test_streamed_result_marks_llm_errors(handler):
+    failed = handler.streamed_result("\n\nError in LLM enhancement: rate limited")
+    answered = handler.streamed_result("You did 120 pushups.")
+
+    assert json.loads(failed["enhanced_result"])["status"] == "error"
+    assert json.loads(answered["enhanced_result"]) == {"status": "success", "enhanced_analysis": "You did 120 pushups."}
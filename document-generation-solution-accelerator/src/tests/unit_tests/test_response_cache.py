@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.response_cache import ResponseCache, SqliteCacheStore
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call():
+    cache = ResponseCache(ttl=60, stale_ttl=0, enabled=True)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"enhanced_result": "120 pushups"}
+
+    key = cache.make_key("How many pushups?", True, "hybrid", "browse")
+    results = await asyncio.gather(*(cache.get_or_call(key, call) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(result == {"enhanced_result": "120 pushups"} for result in results)
+    assert cache.stats.coalesced == 4
+    assert await cache.get_or_call(cache.make_key("how many  PUSHUPS", True, "hybrid", "browse"), call)
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing(tmp_path):
+    shared = SqliteCacheStore(str(tmp_path / "responses.db"))
+    cache = ResponseCache(ttl=0, stale_ttl=60, shared=shared, enabled=True)
+    answers = iter(["old", "new"])
+
+    async def call():
+        return {"enhanced_result": next(answers)}
+
+    key = cache.make_key("max bench", True, "hybrid", "browse")
+    assert await cache.get_or_call(key, call) == {"enhanced_result": "old"}
+    await asyncio.sleep(0.01)
+
+    assert await cache.get_or_call(key, call) == {"enhanced_result": "old"}
+    await asyncio.gather(*cache._pending.values())
+    assert cache.stats.stale_hits == 1
+    assert cache.stats.refreshes == 1
+
+    # A second worker picks the refreshed answer up from the shared tier
+    other = ResponseCache(ttl=0, stale_ttl=60, shared=shared, enabled=True)
+    assert await other.get(key) == {"enhanced_result": "new"}
+    assert other.stats.shared_hits == 1
+    await cache.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streamed_misses_share_one_stream():
+    cache = ResponseCache(ttl=60, stale_ttl=0, enabled=True)
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        for chunk in ["You did ", "120 ", "pushups."]:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def read(delay):
+        await asyncio.sleep(delay)
+        return "".join([chunk async for chunk in cache.stream(key, open_stream, "".join)])
+
+    key = cache.make_key("How many pushups?", True, "hybrid", "browse")
+    # The later readers join after some chunks have already arrived
+    answers = await asyncio.gather(*(read(delay) for delay in (0, 0, 0.015, 0.025)))
+
+    assert len(opened) == 1
+    assert answers == ["You did 120 pushups."] * 4
+    assert cache.stats.coalesced == 3
+    assert await cache.get(key) == "You did 120 pushups."
+
+
+@pytest.mark.asyncio
+async def test_streamed_miss_errors_reach_every_reader():
+    cache = ResponseCache(ttl=60, stale_ttl=0, enabled=True)
+
+    async def open_stream():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("flow endpoint unreachable")
+        yield
+
+    async def read():
+        return [chunk async for chunk in cache.stream("key", open_stream, "".join)]
+
+    results = await asyncio.gather(read(), read(), return_exceptions=True)
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert await cache.get("key") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("result", [
+    {"enhanced_result": '{"status":"error","message":"Error in LLM enhancement: 429","fallback_analysis":"..."}'},
+    {
+        "enhanced_result": '{"status":"success","enhanced_analysis":"The query failed."}',
+        "sql_result": '{"status":"error","message":"Query rejected: predicted 900 RU"}',
+    },
+])
+async def test_error_results_are_not_served_from_the_cache(result):
+    cache = ResponseCache(ttl=60, stale_ttl=0, enabled=True)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return result
+
+    key = cache.make_key("How many pushups?", True, "hybrid", "browse")
+    assert await cache.get_or_call(key, call) == result
+    assert await cache.get_or_call(key, call) == result
+
+    assert len(calls) == 2
+    assert await cache.get(key) is None
+    assert cache.stats.not_cached == 2
+
+
+@pytest.mark.asyncio
+async def test_streams_ending_in_an_error_marker_are_not_cached():
+    cache = ResponseCache(ttl=60, stale_ttl=0, enabled=True)
+
+    async def open_stream():
+        yield "Here is your analysis"
+        yield "\n\nError in LLM enhancement: connection reset"
+
+    def to_value(chunks):
+        text = "".join(chunks)
+        status = "error" if "Error in LLM enhancement:" in text else "success"
+        return {"enhanced_result": json.dumps({"status": status, "enhanced_analysis": text})}
+
+    chunks = [chunk async for chunk in cache.stream("key", open_stream, to_value)]
+
+    assert len(chunks) == 2
+    assert await cache.get("key") is None
@@ -1,6 +1,7 @@
 import pytest
 
-from backend.utils import format_as_ndjson, parse_multi_columns
+from backend.utils import (TemplateSectionParser, format_as_ndjson,
+                           parse_multi_columns)
 
 
 @pytest.mark.asyncio
@@ -29,3 +30,20 @@ def test_parse_multi_columns():
     assert parse_multi_columns(test_pipes) == ["col1", "col2", "col3"]
     assert parse_multi_columns(test_commas) == ["col1", "col2", "col3"]
     assert parse_multi_columns(test_single) == ["col1"]
+
+
+def test_template_section_parser_streams_sections():
+    completion = (
+        '```json\n{"template": [{"section_title": "Intro {1}", "section_description": "Say \\"hi\\""},'
+        ' {"section_title": "Progress", "section_description": "Bench press"}]}\n```'
+    )
+    parser = TemplateSectionParser()
+    sections = []
+    for i in range(0, len(completion), 7):
+        sections.extend(parser.feed(completion[i:i + 7]))
+
+    assert sections == [
+        {"section_title": "Intro {1}", "section_description": 'Say "hi"'},
+        {"section_title": "Progress", "section_description": "Bench press"},
+    ]
+    assert parser.raw == completion
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Process-wide Cosmos DB, AI Search and Azure OpenAI clients shared by the flow nodes."""
+
+import logging
+import os
+import threading
+import time
+
+from azure.core.credentials import AzureKeyCredential
+from azure.cosmos import CosmosClient
+from azure.search.documents import SearchClient
+from dotenv import load_dotenv
+from openai import AzureOpenAI
+
+# Load environment variables
+load_dotenv()
+
+
+class ClientProvider:
+    """
+    Lazily creates one client per endpoint and hands the same instance to every caller.
+
+    The Cosmos, Search and OpenAI SDK clients are thread-safe and keep their own
+    connection pools, so a single instance per endpoint lets concurrent flow
+    requests reuse warm connections and the cached Cosmos account and partition
+    metadata instead of rebuilding them on every node call.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, factory):
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    start = time.perf_counter()
+                    client = factory()
+                    self._clients[key] = client
+                    self._stats[key] = {
+                        "create_ms": round((time.perf_counter() - start) * 1000, 1),
+                        "uses": 0
+                    }
+        with self._lock:
+            self._stats[key]["uses"] += 1
+        return client
+
+    def cosmos_client(self, url=None, key=None):
+        url = url or os.getenv("COSMOS_URI")
+        return self._get(
+            ("cosmos", url),
+            lambda: CosmosClient(url=url, credential=key or os.getenv("COSMOS_KEY"))
+        )
+
+    def cosmos_container(self, database=None, container=None):
+        """Return the container client for the workout data (COSMOS_DB / COSMOS_CONTAINER by default)."""
+        database = database or os.getenv("COSMOS_DB")
+        container = container or os.getenv("COSMOS_CONTAINER")
+        client = self.cosmos_client()
+        return self._get(
+            ("cosmos_container", os.getenv("COSMOS_URI"), database, container),
+            lambda: client.get_database_client(database).get_container_client(container)
+        )
+
+    def search_client(self, endpoint=None, index_name=None, key=None):
+        endpoint = endpoint or os.getenv("AZURE_SEARCH_ENDPOINT")
+        index_name = index_name or os.getenv("AZURE_SEARCH_INDEX_NAME")
+        return self._get(
+            ("search", endpoint, index_name),
+            lambda: SearchClient(
+                endpoint=endpoint,
+                index_name=index_name,
+                credential=AzureKeyCredential(key or os.getenv("AZURE_SEARCH_ADMIN_KEY"))
+            )
+        )
+
+    def openai_client(self, endpoint=None, api_version=None, api_key=None):
+        endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
+        api_version = api_version or os.getenv("AZURE_OPENAI_API_VERSION")
+        return self._get(
+            ("openai", endpoint, api_version),
+            lambda: AzureOpenAI(
+                api_key=api_key or os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version=api_version,
+                azure_endpoint=endpoint
+            )
+        )
+
+    def warm_up(self):
+        """
+        Create the default clients and open their first connections.
+
+        Reading the container properties resolves the Cosmos account, database and
+        container metadata up front, and a document count opens the Search connection,
+        so the first user request does not pay for either.
+        """
+        timings = {}
+        steps = {
+            "cosmos": lambda: self.cosmos_container().read(),
+            "search": lambda: self.search_client().get_document_count(),
+            "openai": self.openai_client
+        }
+        for name, step in steps.items():
+            start = time.perf_counter()
+            try:
+                step()
+                timings[name] = round((time.perf_counter() - start) * 1000, 1)
+            except Exception as e:
+                logging.warning(f"Warm-up of {name} client failed: {e}")
+                timings[name] = None
+        print(f"Warmed up flow clients (ms): {timings}")
+        return timings
+
+    def stats(self):
+        """Per-client creation time and how many calls reused the pooled instance."""
+        with self._lock:
+            clients = {
+                "/".join(str(part) for part in key if part): {
+                    **stats,
+                    "reuses": max(stats["uses"] - 1, 0)
+                }
+                for key, stats in self._stats.items()
+            }
+        return {
+            "clients": clients,
+            "created": len(clients),
+            "total_uses": sum(stats["uses"] for stats in clients.values())
+        }
+
+    def close(self):
+        with self._lock:
+            for key, client in self._clients.items():
+                close = getattr(client, "close", None)
+                if close is None:
+                    continue
+                try:
+                    close()
+                except Exception as e:
+                    logging.warning(f"Error closing client {key[0]}: {e}")
+            self._clients.clear()
+            self._stats.clear()
+
+
+# Global instance shared by every node in this process
+clients = ClientProvider()
+
+# The flow server imports the node modules when it starts, so warming up here
+# opens the connections before the first request arrives
+if os.getenv("FLOW_WARM_UP_CLIENTS", "false").lower() == "true":
+    threading.Thread(target=clients.warm_up, name="flow-client-warm-up", daemon=True).start()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""In-memory columnar snapshot of the workout container for local query execution.
+
+The snapshot is built from the same JSONL file the loaders upload. Each
+top-level field becomes a NumPy column: numbers as float64 with a presence
+mask, strings dictionary-encoded as int32 codes into a category list. The SQL
+subset understood by sql_parser then runs as vectorized scans, with no network
+calls and no RU charge, which makes it usable for dashboards, load tests and
+as a Cosmos DB stand-in in CI (COSMOS_QUERY_BACKEND=local).
+
+Like the rollup store, numeric text ("12") is treated as a number in
+aggregates and numeric comparisons, matching queries that wrap the field in
+StringToNumber().
+"""
+
+import argparse
+import json
+import operator
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sql_parser import Aggregate, UnsupportedQuery, parse_query
+
+DEFAULT_SNAPSHOT_FILE = os.getenv("COLUMNAR_SNAPSHOT_FILE") or os.getenv("JSONL_FILE", "workout_entries_cosmos.jsonl")
+
+_COMPARE = {
+    "=": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+def _result_number(number):
+    return int(number) if float(number).is_integer() else float(number)
+
+
+class NumericColumn:
+    def __init__(self, values):
+        present = np.array([value is not None for value in values], dtype=bool)
+        self.values = np.array([value if value is not None else np.nan for value in values], dtype=np.float64)
+        self.present = present
+        self.integral = all(isinstance(value, int) for value in values if value is not None)
+
+    def numbers(self):
+        return self.values, self.present
+
+    def compare(self, op, literal):
+        if isinstance(literal, bool) or not isinstance(literal, (int, float)):
+            # Cosmos never matches values of different types
+            return np.zeros(len(self.values), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            return _COMPARE[op](self.values, literal) & self.present
+
+    def sort_keys(self):
+        return self.values
+
+    def value(self, number):
+        return _result_number(number) if self.integral else float(number)
+
+
+class StringColumn:
+    def __init__(self, values):
+        categories = sorted({value for value in values if value is not None})
+        lookup = {value: code for code, value in enumerate(categories)}
+        self.categories = np.array(categories, dtype=object)
+        self.codes = np.array([lookup[value] if value is not None else -1 for value in values], dtype=np.int32)
+        self.present = self.codes >= 0
+        self._numbers = None
+
+    def numbers(self):
+        """Numeric view of the column for aggregates (StringToNumber semantics)."""
+        if self._numbers is None:
+            parsed = np.full(len(self.categories) + 1, np.nan)
+            for code, category in enumerate(self.categories):
+                try:
+                    parsed[code] = float(category)
+                except ValueError:
+                    pass
+            values = parsed[self.codes]  # code -1 maps to the trailing NaN
+            self._numbers = (values, ~np.isnan(values))
+        return self._numbers
+
+    def category(self, code):
+        return self.categories[int(code)]
+
+    def category_mask(self, predicate):
+        """Evaluate a predicate once per category and broadcast it to the rows."""
+        matches = np.append(np.array([predicate(category) for category in self.categories], dtype=bool), False)
+        return matches[self.codes]
+
+    def compare(self, op, literal):
+        if isinstance(literal, str):
+            return self.category_mask(lambda category: _COMPARE[op](category, literal))
+        if isinstance(literal, (int, float)) and not isinstance(literal, bool):
+            values, present = self.numbers()
+            with np.errstate(invalid="ignore"):
+                return _COMPARE[op](values, literal) & present
+        return np.zeros(len(self.codes), dtype=bool)
+
+    def sort_keys(self):
+        # Categories are sorted, so codes order like the strings themselves
+        return self.codes.astype(np.float64)
+
+    def value(self, number):
+        return _result_number(number)
+
+
+class ColumnarStore:
+    """
+    Columnar snapshot of a list of workout documents.
+
+    Args:
+        documents: Documents as loaded into Cosmos DB
+        source: Where the documents came from (for reporting)
+    """
+
+    def __init__(self, documents, source=None):
+        self.documents = documents
+        self.source = source
+        self.size = len(documents)
+        names = {}
+        for document in documents:
+            for name in document:
+                if not name.startswith("_"):
+                    names.setdefault(name, None)
+        self.columns = {}
+        for name in names:
+            values = [document.get(name) for document in documents]
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                self.columns[name] = NumericColumn(values)
+            else:
+                self.columns[name] = StringColumn(
+                    [None if value is None else value if isinstance(value, str) else json.dumps(value)
+                     for value in values]
+                )
+
+    @classmethod
+    def from_jsonl(cls, jsonl_file_path):
+        with open(jsonl_file_path, "r", encoding="utf-8") as file:
+            documents = [json.loads(line) for line in file if line.strip()]
+        return cls(documents, source=str(jsonl_file_path))
+
+    def _column(self, name):
+        if "." in name:
+            raise UnsupportedQuery(f"Nested field {name} is not in the columnar snapshot")
+        return self.columns.get(name)
+
+    def _filter(self, conditions):
+        mask = np.ones(self.size, dtype=bool)
+        for condition in conditions:
+            column = self._column(condition.field)
+            if column is None:
+                return np.zeros(self.size, dtype=bool)
+            if condition.op == "IN":
+                matches = np.zeros(self.size, dtype=bool)
+                for value in condition.value:
+                    matches |= column.compare("=", value)
+                mask &= matches
+            else:
+                mask &= column.compare(condition.op, condition.value)
+        return mask
+
+    def _aggregate(self, aggregate, mask, groups=None, group_count=1):
+        """Aggregate over the masked rows, per group when groups (row → group index) is given."""
+        if groups is None:
+            groups = np.zeros(int(mask.sum()), dtype=np.int64)
+        if aggregate.func == "COUNT" and aggregate.field is None:
+            return [int(count) for count in np.bincount(groups, minlength=group_count)]
+
+        column = self._column(aggregate.field)
+        if column is None:
+            return [0 if aggregate.func in ("COUNT", "SUM") else None] * group_count
+        if aggregate.func == "COUNT":
+            return [int(count) for count in np.bincount(groups, weights=column.present[mask], minlength=group_count)]
+
+        to_result = column.value
+        if isinstance(column, StringColumn) and aggregate.function is None:
+            if aggregate.func in ("SUM", "AVG"):
+                raise UnsupportedQuery(f"{aggregate.func} over text field {aggregate.field} needs StringToNumber")
+            # Cosmos orders strings for MIN/MAX; sorted category codes order the same way
+            values, present = column.codes.astype(np.float64), column.present
+            to_result = column.category
+        else:
+            values, present = column.numbers()
+        values, present = values[mask], present[mask]
+        counts = np.bincount(groups[present], minlength=group_count)
+        if aggregate.func in ("SUM", "AVG"):
+            sums = np.bincount(groups[present], weights=values[present], minlength=group_count)
+            if aggregate.func == "SUM":
+                return [column.value(total) for total in sums]
+            return [float(total / count) if count else None for total, count in zip(sums, counts)]
+
+        # MIN / MAX: sort once, then take the first or last value of each group
+        results = [None] * group_count
+        order = np.lexsort((values[present], groups[present]))
+        sorted_groups = groups[present][order]
+        sorted_values = values[present][order]
+        if len(sorted_groups):
+            starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+            ends = np.r_[starts[1:], len(sorted_groups)] - 1
+            picks = starts if aggregate.func == "MIN" else ends
+            for index in picks:
+                results[sorted_groups[index]] = to_result(sorted_values[index])
+        return results
+
+    def _group_keys(self, names, mask):
+        """Group index per masked row and the key values of each group."""
+        codes = []
+        for name in names:
+            column = self._column(name)
+            if column is None:
+                codes.append(np.full(int(mask.sum()), -1, dtype=np.int64))
+            elif isinstance(column, StringColumn):
+                codes.append(column.codes[mask].astype(np.int64))
+            else:
+                _, inverse = np.unique(np.where(column.present, column.values, np.inf)[mask], return_inverse=True)
+                codes.append(np.where(column.present[mask], inverse, -1))
+        if not codes or not len(codes[0]):
+            return np.zeros(0, dtype=np.int64), []
+        _, first, groups = np.unique(np.stack(codes, axis=1), axis=0, return_index=True, return_inverse=True)
+
+        # Key values are read back from the first document of each group
+        rows = np.flatnonzero(mask)[first]
+        key_values = [[self.documents[row].get(name) for name in names] for row in rows]
+        return groups.reshape(-1), key_values
+
+    def execute(self, sql_query):
+        """
+        Run a query against the snapshot.
+
+        Returns:
+            List of results shaped like the Cosmos DB response
+
+        Raises:
+            UnsupportedQuery: If the query is outside the supported subset
+        """
+        query = parse_query(sql_query) if isinstance(sql_query, str) else sql_query
+        mask = self._filter(query.where)
+        names = query.output_names()
+
+        if query.is_aggregate or query.group_by:
+            if query.group_by:
+                groups, key_values = self._group_keys(query.group_by, mask)
+            else:
+                groups, key_values = None, [[]]
+            columns = []
+            for item in query.select or []:
+                if isinstance(item.expr, Aggregate):
+                    columns.append(self._aggregate(item.expr, mask, groups, len(key_values)))
+                elif item.expr in query.group_by:
+                    position = query.group_by.index(item.expr)
+                    columns.append([key[position] for key in key_values])
+                else:
+                    raise UnsupportedQuery(f"{item.expr} is neither aggregated nor grouped")
+            rows = list(zip(*columns)) if columns else []
+            if query.value:
+                results = [row[0] for row in rows if row[0] is not None]
+            else:
+                results = [{name: value for name, value in zip(names, row) if value is not None} for row in rows]
+            return results[:query.top] if query.top is not None else results
+
+        rows = np.flatnonzero(mask)
+        for name, descending in reversed(query.order_by):
+            column = self._column(name)
+            if column is None:
+                return []
+            rows = rows[column.present[rows]]
+            keys = column.sort_keys()[rows]
+            order = np.argsort(-keys if descending else keys, kind="stable")
+            rows = rows[order]
+
+        results = []
+        seen = set()
+        for row in rows:
+            document = self.documents[row]
+            if query.select is None:
+                result = document
+            elif query.value:
+                result = document.get(query.select[0].expr)
+                if result is None:
+                    continue
+            else:
+                result = {name: document[item.expr] for name, item in zip(names, query.select)
+                          if item.expr in document}
+            if query.distinct:
+                key = json.dumps(result, sort_keys=True, default=str)
+                if key in seen:
+                    continue
+                seen.add(key)
+            results.append(result)
+            if query.top is not None and len(results) >= query.top:
+                break
+        return results
+
+    def stats(self):
+        return {
+            "source": self.source,
+            "documents": self.size,
+            "columns": {name: type(column).__name__ for name, column in self.columns.items()},
+            "memory_bytes": sum(
+                column.values.nbytes + column.present.nbytes if isinstance(column, NumericColumn)
+                else column.codes.nbytes
+                for column in self.columns.values()
+            )
+        }
+
+
+_store = None
+_store_mtime = None
+_store_lock = threading.Lock()
+
+
+def get_columnar_store(path=None):
+    """Shared snapshot, rebuilt when the JSONL file changes."""
+    global _store, _store_mtime
+    path = Path(path or DEFAULT_SNAPSHOT_FILE)
+    mtime = path.stat().st_mtime
+    with _store_lock:
+        if _store is None or _store.source != str(path) or _store_mtime != mtime:
+            started = time.perf_counter()
+            _store = ColumnarStore.from_jsonl(path)
+            _store_mtime = mtime
+            print(f"Loaded columnar snapshot of {_store.size} documents from {path} "
+                  f"in {time.perf_counter() - started:.2f}s")
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Cosmos DB SQL against an in-memory snapshot of a JSONL file")
+    parser.add_argument("jsonl", help="JSONL file of workout documents")
+    parser.add_argument("queries", nargs="+", help="SQL queries to run")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each query N times and report the mean latency")
+    args = parser.parse_args()
+
+    store = get_columnar_store(args.jsonl)
+    print(json.dumps(store.stats()))
+    for sql_query in args.queries:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            results = store.execute(sql_query)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / args.repeat
+        print(f"{sql_query}\n  {elapsed_ms:.2f} ms, {len(results)} results: {json.dumps(results[:5], default=str)}")
+
+
+if __name__ == "__main__":
+    main()
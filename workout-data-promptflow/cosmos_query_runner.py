@@ -2,88 +2,287 @@
 """Execute SQL queries against Azure Cosmos DB and return results."""
 
 import os
-import json
+import time
 from promptflow.core import tool
-from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
+from clients import clients
+from rollup_store import get_rollup_store
+from sql_parser import UnsupportedQuery
+from sql_guard import MAX_QUERY_RU, record_actual
+from result_format import encode_rows, to_json
 
 
 # Load environment variables when running locally
 load_dotenv()
 
 
+# Result cap and page size for paged execution
+DEFAULT_MAX_RESULTS = int(os.getenv('COSMOS_MAX_RESULTS', '100'))
+DEFAULT_PAGE_SIZE = int(os.getenv('COSMOS_PAGE_SIZE', '100'))
+
+# "cosmos" (default) or "local" to run queries against the in-memory columnar snapshot
+QUERY_BACKEND = os.getenv('COSMOS_QUERY_BACKEND', 'cosmos').lower()
+
+# Metrics in x-ms-documentdb-query-metrics that are summed across requests
+QUERY_METRICS_HEADER = 'x-ms-documentdb-query-metrics'
+
+
+class QueryCost:
+    """Accumulates RU charge and query metrics from every backend response of a query."""
+
+    def __init__(self):
+        self.request_charge = 0.0
+        self.round_trips = 0
+        self.metrics = {}
+
+    def __call__(self, pipeline_response):
+        # Invoked by the azure-core pipeline for every HTTP response, including
+        # the per-partition requests a cross-partition query fans out to
+        headers = pipeline_response.http_response.headers
+        self.round_trips += 1
+        self.request_charge += float(headers.get('x-ms-request-charge', 0) or 0)
+        for metric in (headers.get(QUERY_METRICS_HEADER) or '').split(';'):
+            name, _, value = metric.partition('=')
+            try:
+                self.metrics[name] = round(self.metrics.get(name, 0) + float(value), 3)
+            except ValueError:
+                continue
+
+    def as_dict(self):
+        return {
+            "request_charge": round(self.request_charge, 2),
+            "round_trips": self.round_trips,
+            "query_metrics": self.metrics
+        }
+
+
+def run_paged_query(container, sql_query, max_results=DEFAULT_MAX_RESULTS,
+                    page_size=DEFAULT_PAGE_SIZE, continuation_token=None, max_request_charge=None):
+    """
+    Fetch query results page by page, stopping as soon as the cap is reached.
+    
+    When fewer than page_size items are left under the cap, the query resumes
+    from the continuation token with a smaller page, so at most max_results
+    items are returned and the token never skips items.
+    
+    Args:
+        container: Cosmos DB container client
+        sql_query: SQL query string to execute
+        max_results: Maximum number of items to return
+        page_size: Items requested per round trip (max_item_count)
+        continuation_token: Token from a previous call to resume after its last page
+        max_request_charge: Stop fetching pages once this many RUs have been spent
+        
+    Returns:
+        Tuple of (items, continuation token or None when exhausted, QueryCost)
+    """
+    cost = QueryCost()
+    items = []
+    next_token = continuation_token
+    resume = True
+    while resume and len(items) < max_results:
+        resume = False
+        item_count = min(page_size, max_results - len(items))
+        pager = container.query_items(
+            query=sql_query,
+            enable_cross_partition_query=True,
+            populate_query_metrics=True,
+            max_integrated_cache_staleness_in_ms=0,
+            max_item_count=item_count,
+            raw_response_hook=cost
+        ).by_page(next_token)
+        
+        for page in pager:
+            items.extend(page)
+            next_token = pager.continuation_token
+            if not next_token:
+                break
+            if max_request_charge and cost.request_charge >= max_request_charge:
+                print(f"Stopped after {cost.request_charge:.2f} RUs (limit {max_request_charge:g})")
+                break
+            if max_results - len(items) < item_count:
+                # Reopen the query with a page that fits under the cap
+                resume = True
+                break
+    
+    return items[:max_results], next_token, cost
+
+
+def answer_from_rollups(sql_query):
+    """
+    Answer recognised aggregate queries from the local rollup store.
+    
+    Returns:
+        JSON string in the same shape as a Cosmos DB answer, or None to fall back to Cosmos DB
+    """
+    store = get_rollup_store()
+    if store is None:
+        return None
+    
+    started = time.perf_counter()
+    try:
+        results = store.answer(sql_query)
+    except UnsupportedQuery:
+        return None
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    print(f"Answered from rollups in {elapsed_ms} ms")
+    
+    response = {
+        "status": "success",
+        "message": "Query answered from precomputed rollups",
+        "count": len(results),
+        "results": encode_rows(results),
+        "source": "rollups",
+        "request_charge": 0,
+        "round_trips": 0,
+        "elapsed_ms": elapsed_ms
+    }
+    if len(results) == 1 and not isinstance(results[0], dict):
+        response["value"] = results[0]
+    return to_json(response)
+
+
+def run_local_query(sql_query, max_results=DEFAULT_MAX_RESULTS, continuation_token=None):
+    """
+    Execute a query against the in-memory columnar snapshot instead of Cosmos DB.
+    
+    Continuation tokens are result offsets, so paging behaves like the Cosmos path.
+    
+    Returns:
+        JSON string in the same shape as a Cosmos DB answer
+    """
+    from columnar_store import get_columnar_store
+    
+    store = get_columnar_store()
+    started = time.perf_counter()
+    results = store.execute(sql_query)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    
+    offset = int(continuation_token or 0)
+    page = results[offset:offset + max_results]
+    next_token = str(offset + max_results) if offset + max_results < len(results) else None
+    print(f"Executed locally in {elapsed_ms} ms over {store.size} documents")
+    
+    response = {
+        "status": "success",
+        "message": f"Query returned {len(page)} results" if page
+                   else "Query executed successfully but returned no results",
+        "count": len(page),
+        "truncated": next_token is not None,
+        "continuation_token": next_token,
+        "results": encode_rows(page),
+        "source": "local",
+        "request_charge": 0,
+        "round_trips": 0,
+        "elapsed_ms": elapsed_ms
+    }
+    if len(page) == 1 and not isinstance(page[0], dict) and not offset:
+        response["value"] = page[0]
+    return to_json(response)
+
+
 @tool
-def cosmos_query_runner(sql_query: str) -> str:
+def cosmos_query_runner(sql_query: str, max_results: int = DEFAULT_MAX_RESULTS,
+                        continuation_token: str = None, guard_report: dict = None) -> str:
     """
     Execute SQL query against Cosmos DB and return results.
     
     Args:
         sql_query: SQL query string to execute
+        max_results: Maximum number of items to fetch; paging stops once reached
+        continuation_token: Resume a previous query from where it stopped
+        guard_report: Output of the sql_guard node; rejected queries are not executed
         
     Returns:
-        JSON string containing query results or error message
+        JSON string containing query results, RU charge and query metrics, or error message
     """
+    if guard_report and not guard_report.get("allowed", True):
+        print(f"Query rejected by SQL guard: {guard_report.get('reason')}")
+        return to_json({
+            "status": "error",
+            "message": f"Query rejected: {guard_report.get('reason')}",
+            "query": sql_query,
+            "predicted_request_charge": guard_report.get("predicted_ru")
+        })
+    
     try:
-        # Initialize Cosmos client
-        client = CosmosClient(
-            url=os.getenv('COSMOS_URI'),
-            credential=os.getenv('COSMOS_KEY')
-        )
+        if QUERY_BACKEND == 'local':
+            return run_local_query(sql_query, max_results=max_results, continuation_token=continuation_token)
         
-        # Get database and container references
-        database = client.get_database_client(os.getenv('COSMOS_DB'))
-        container = database.get_container_client(os.getenv('COSMOS_CONTAINER'))
+        # Aggregates over exercise, type and date come from the rollups without an RU charge
+        if not continuation_token:
+            rollup_answer = answer_from_rollups(sql_query)
+            if rollup_answer is not None:
+                return rollup_answer
+        
+        # Shared container client for this process
+        container = clients.cosmos_container()
         
         # Execute query
         print(f"Executing query: {sql_query}")
         
-        # Enable aggregate queries 
-        items = list(container.query_items(
-            query=sql_query,
-            enable_cross_partition_query=True,
-            populate_query_metrics=True,
-            max_integrated_cache_staleness_in_ms=0
-        ))
+        items, next_token, cost = run_paged_query(
+            container, sql_query,
+            max_results=max_results,
+            continuation_token=continuation_token,
+            max_request_charge=MAX_QUERY_RU or None
+        )
+        print(f"Query consumed {cost.request_charge:.2f} RUs over {cost.round_trips} round trips")
+        
+        cost_fields = cost.as_dict()
+        ledger_entry = record_actual(guard_report, cost.request_charge)
+        if ledger_entry:
+            cost_fields["predicted_request_charge"] = ledger_entry["predicted_ru"]
         
         # Format results
         if not items:
-            return json.dumps({
+            return to_json({
                 "status": "success",
                 "message": "Query executed successfully but returned no results",
                 "count": 0,
-                "results": []
-            }, indent=2)
+                "results": [],
+                **cost_fields
+            })
         
         # For aggregation queries that return a single value
         if len(items) == 1 and isinstance(items[0], dict):
             # Check if it's an aggregation result
             keys = list(items[0].keys())
             if len(keys) == 1 and keys[0].startswith('$'):
-                return json.dumps({
+                return to_json({
                     "status": "success",
                     "message": "Query executed successfully",
                     "count": 1,
                     "value": items[0][keys[0]],
-                    "results": items
-                }, indent=2)
+                    "results": items,
+                    **cost_fields
+                })
         
         # For regular queries
-        return json.dumps({
+        message = f"Query returned {len(items)} results"
+        if next_token and len(items) < max_results:
+            message += f" (stopped at the {MAX_QUERY_RU:g} RU limit; more are available)"
+        elif next_token:
+            message += f" (stopped at the {max_results} result cap; more are available)"
+        return to_json({
             "status": "success",
-            "message": f"Query returned {len(items)} results",
+            "message": message,
             "count": len(items),
-            "results": items[:100]  # Limit to first 100 results
-        }, indent=2)
+            "truncated": next_token is not None,
+            "continuation_token": next_token,
+            "results": encode_rows(items),
+            **cost_fields
+        })
         
     except Exception as e:
         error_message = f"Error executing query: {str(e)}"
         print(error_message)
         
-        return json.dumps({
+        return to_json({
             "status": "error",
             "message": error_message,
             "query": sql_query
-        }, indent=2)
+        })
 
 
 # For local testing
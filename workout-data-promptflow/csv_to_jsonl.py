@@ -1,39 +1,200 @@
 #!/usr/bin/env python3
-"""Convert CSV workout data to JSONL format for Cosmos DB ingestion."""
+"""Convert CSV workout data to JSONL format for Cosmos DB ingestion.
 
+Ids are content hashes and numbers and dates are typed. Files written by
+earlier versions used entry_N ids and string values, so a container or search
+index loaded from them must be emptied before loading this format (see
+"Upgrading data loaded with entry_N ids" in README.md), or every workout is
+stored twice.
+"""
+
+import argparse
 import csv
+import hashlib
 import json
+import os
 import sys
+from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
 from pathlib import Path
 
+# Column types applied while converting; anything not listed stays a string
+SCHEMA = {
+    "Set": "int",
+    "Reps": "int",
+    "Weight": "float",
+    "ExDate": "date",
+}
+
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%m/%d/%y",
+    "%Y/%m/%d",
+    "%d-%b-%Y",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %I:%M:%S %p",
+]
+
+
+def parse_date(value):
+    """Return an ISO date (YYYY-MM-DD) for the formats seen in workout exports."""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+
+def coerce_value(field, value):
+    """Convert a CSV string to the type declared in SCHEMA; empty values become None."""
+    if value is None or value == "":
+        return None
+    field_type = SCHEMA.get(field)
+    if field_type == "int":
+        return int(float(value))
+    if field_type == "float":
+        return float(value)
+    if field_type == "date":
+        return parse_date(value)
+    return value
+
+
+def convert_row(row):
+    """
+    Clean and type a CSV row.
+
+    Returns:
+        Tuple of (typed record, number of values that could not be coerced)
+    """
+    record = {}
+    failures = 0
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip()
+        value = value.strip() if value else value
+        try:
+            record[key] = coerce_value(key, value)
+        except ValueError:
+            # Keep the original text rather than dropping the value
+            record[key] = value
+            failures += 1
+    return record, failures
+
+
+def content_id(record):
+    """Deterministic id derived from the row content, stable across re-exports."""
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:20]
+
+
+def shape_record(record, shape):
+    """Return the record in the upload-ready shape for the target store (without id)."""
+    if shape == "search":
+        from populate_search_index import build_search_document, create_searchable_text
+        document = build_search_document({"id": None, **record}, create_searchable_text(record))
+        document.pop("id")
+        return document
+    return record
+
 
-def csv_to_jsonl(csv_file_path, jsonl_file_path):
+def convert_chunk(args):
     """
-    Convert CSV file to JSONL format with unique IDs.
-    
+    Convert a chunk of CSV rows in a worker process.
+
+    Returns:
+        Tuple of (list of (content id, JSON body without id), coercion failures, skipped rows)
+    """
+    rows, shape = args
+    converted = []
+    failures = 0
+    skipped = 0
+    for row in rows:
+        record, row_failures = convert_row(row)
+        failures += row_failures
+        try:
+            body = json.dumps(shape_record(record, shape), separators=(',', ':'))
+        except (TypeError, ValueError):
+            # The search index has typed fields, so untyped values cannot be shaped for it
+            skipped += 1
+            continue
+        converted.append((content_id(record), body))
+    return converted, failures, skipped
+
+
+def read_chunks(csv_reader, chunk_size, shape):
+    while True:
+        rows = list(islice(csv_reader, chunk_size))
+        if not rows:
+            return
+        yield rows, shape
+
+
+def csv_to_jsonl(csv_file_path, jsonl_file_path, shape="cosmos", workers=None, chunk_size=10000):
+    """
+    Convert CSV file to JSONL format with typed values and content-derived IDs.
+
+    The parent process reads the CSV (so quoted newlines are handled by the csv
+    module) and hands chunks of rows to a process pool for type coercion,
+    hashing and JSON encoding. Chunks come back in order, so identical rows get
+    the same "-1", "-2" duplicate suffixes on every run.
+
     Args:
         csv_file_path: Path to input CSV file
         jsonl_file_path: Path to output JSONL file
+        shape: "cosmos" for typed workout documents, "search" for AI Search index documents
+        workers: Worker processes (default: CPU count, 1 converts in-process)
+        chunk_size: Rows per worker task
     """
     try:
-        with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
+        workers = workers or os.cpu_count() or 1
+        seen_ids = {}
+        total = 0
+        total_failures = 0
+        total_skipped = 0
+
+        with open(csv_file_path, 'r', encoding='utf-8', newline='') as csv_file:
             csv_reader = csv.DictReader(csv_file)
-            
+            chunks = read_chunks(csv_reader, chunk_size, shape)
+
             with open(jsonl_file_path, 'w', encoding='utf-8') as jsonl_file:
-                for idx, row in enumerate(csv_reader, 1):
-                    # Add unique ID field
-                    row['id'] = f"entry_{idx}"
-                    
-                    # Clean up field names (remove any extra spaces)
-                    cleaned_row = {key.strip(): value.strip() if value else value 
-                                   for key, value in row.items()}
-                    
-                    # Write as JSON line
-                    jsonl_file.write(json.dumps(cleaned_row) + '\n')
-        
+                if workers > 1:
+                    pool = Pool(workers)
+                    results = pool.imap(convert_chunk, chunks)
+                else:
+                    pool = None
+                    results = map(convert_chunk, chunks)
+
+                try:
+                    for converted, failures, skipped in results:
+                        total_failures += failures
+                        total_skipped += skipped
+                        for doc_id, body in converted:
+                            # Identical rows (e.g. repeated sets) get a stable counter suffix
+                            occurrence = seen_ids.get(doc_id, 0)
+                            seen_ids[doc_id] = occurrence + 1
+                            if occurrence:
+                                doc_id = f"{doc_id}-{occurrence}"
+                            separator = "," if body != "{}" else ""
+                            jsonl_file.write(f'{{"id":"{doc_id}"{separator}{body[1:]}\n')
+                            total += 1
+                finally:
+                    if pool is not None:
+                        pool.close()
+                        pool.join()
+
         print(f"Successfully converted {csv_file_path} to {jsonl_file_path}")
-        print(f"Total records: {idx}")
-        
+        print(f"Total records: {total}")
+        if total_failures:
+            print(f"Warning: {total_failures} values did not match their column type and were kept as text")
+        if total_skipped:
+            print(f"Warning: {total_skipped} rows could not be converted to the {shape} shape and were skipped")
+
     except FileNotFoundError:
         print(f"Error: Could not find file {csv_file_path}")
         sys.exit(1)
@@ -43,9 +204,20 @@ def csv_to_jsonl(csv_file_path, jsonl_file_path):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python csv_to_jsonl.py <input.csv> <output.jsonl>")
-        print("Example: python csv_to_jsonl.py 'Workout Entries SP.csv' workout_entries_cosmos.jsonl")
+    parser = argparse.ArgumentParser(
+        description="Convert CSV workout data to JSONL",
+        epilog="Example: python csv_to_jsonl.py 'Workout Entries SP.csv' workout_entries_cosmos.jsonl"
+    )
+    parser.add_argument("input", help="Input CSV file")
+    parser.add_argument("output", help="Output JSONL file")
+    parser.add_argument("--shape", choices=["cosmos", "search"], default="cosmos",
+                        help="Document shape to write (default: cosmos)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per worker task")
+    args = parser.parse_args()
+
+    if not Path(args.input).exists():
+        print(f"Error: Could not find file {args.input}")
         sys.exit(1)
-    
-    csv_to_jsonl(sys.argv[1], sys.argv[2])
\ No newline at end of file
+
+    csv_to_jsonl(args.input, args.output, shape=args.shape, workers=args.workers, chunk_size=args.chunk_size)
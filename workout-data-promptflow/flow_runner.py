@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Run the workout flow locally, executing independent nodes concurrently."""
+
+import argparse
+import importlib
+import json
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import yaml
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FLOW_DIR = Path(__file__).resolve().parent
+FLOW_FILE = FLOW_DIR / "flow.dag.yaml"
+
+# Matches ${inputs.query}, ${node.output} and ${node.output.key}
+REFERENCE_PATTERN = re.compile(r"^\$\{([A-Za-z_]\w*)\.([\w.]+)\}$")
+
+
+def load_flow(flow_file=FLOW_FILE):
+    """Load the flow definition from its DAG YAML file."""
+    with open(flow_file, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def parse_reference(value):
+    """Return (source, path) for a ${...} reference, or None for a literal."""
+    if not isinstance(value, str):
+        return None
+    match = REFERENCE_PATTERN.match(value.strip())
+    if not match:
+        return None
+    return match.group(1), match.group(2).split(".")
+
+
+def resolve_value(value, inputs, outputs):
+    """Resolve a node input or flow output against flow inputs and node outputs."""
+    reference = parse_reference(value)
+    if reference is None:
+        return value
+
+    source, path = reference
+    if source == "inputs":
+        return inputs.get(path[0])
+
+    # Skipped nodes resolve to None, as they do in promptflow
+    result = outputs.get(source)
+    for key in path[1:]:
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except json.JSONDecodeError:
+                return None
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def node_dependencies(node):
+    """Names of the nodes whose outputs this node reads."""
+    values = list(node.get("inputs", {}).values())
+    if node.get("activate"):
+        values.append(node["activate"].get("when"))
+
+    dependencies = set()
+    for value in values:
+        reference = parse_reference(value)
+        if reference and reference[0] != "inputs":
+            dependencies.add(reference[0])
+    return dependencies
+
+
+def load_node_function(node):
+    """Import the tool function for a python node (module and function share a name)."""
+    module_name = Path(node["source"]["path"]).stem
+    if str(FLOW_DIR) not in sys.path:
+        sys.path.insert(0, str(FLOW_DIR))
+    module = importlib.import_module(module_name)
+    return getattr(module, module_name)
+
+
+def is_active(node, inputs, outputs):
+    activate = node.get("activate")
+    if not activate:
+        return True
+    return resolve_value(activate.get("when"), inputs, outputs) == activate.get("is")
+
+
+def critical_path(nodes, timings):
+    """Longest chain of dependent nodes by wall time."""
+    longest = {}
+
+    def path_to(name):
+        if name not in longest:
+            best = (0.0, [])
+            for dependency in node_dependencies(nodes[name]):
+                candidate = path_to(dependency)
+                if candidate[0] > best[0]:
+                    best = candidate
+            wall_time = timings.get(name, {}).get("wall_time", 0.0)
+            longest[name] = (best[0] + wall_time, best[1] + [name])
+        return longest[name]
+
+    return max((path_to(name) for name in nodes), key=lambda item: item[0])
+
+
+def run_flow(inputs=None, flow_file=FLOW_FILE, max_workers=None):
+    """
+    Execute the flow, starting each node as soon as the nodes it depends on finish.
+
+    Args:
+        inputs: Flow inputs; missing values use the defaults from the DAG file
+        flow_file: Path to flow.dag.yaml
+        max_workers: Thread pool size (None runs every ready node at once, 1 runs sequentially)
+
+    Returns:
+        Tuple of (flow outputs, timing report)
+    """
+    flow = load_flow(flow_file)
+    flow_inputs = {
+        name: spec.get("default") for name, spec in flow.get("inputs", {}).items()
+    }
+    flow_inputs.update(inputs or {})
+
+    nodes = {node["name"]: node for node in flow["nodes"]}
+    dependencies = {name: node_dependencies(node) for name, node in nodes.items()}
+    outputs = {}
+    timings = {}
+    pending = set(nodes)
+    running = {}
+    flow_start = time.perf_counter()
+
+    def run_node(name, kwargs):
+        start = time.perf_counter()
+        result = load_node_function(nodes[name])(**kwargs)
+        end = time.perf_counter()
+        return result, start, end
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(nodes)) as executor:
+        while pending or running:
+            finished = set(outputs) | set(timings)
+            for name in sorted(pending):
+                if not dependencies[name] <= finished:
+                    continue
+                pending.discard(name)
+                node = nodes[name]
+                if not is_active(node, flow_inputs, outputs):
+                    outputs[name] = None
+                    timings[name] = {"skipped": True, "wall_time": 0.0}
+                    finished.add(name)
+                    continue
+                kwargs = {
+                    key: resolve_value(value, flow_inputs, outputs)
+                    for key, value in node.get("inputs", {}).items()
+                }
+                running[executor.submit(run_node, name, kwargs)] = name
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Unresolvable node dependencies: {sorted(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, start, end = future.result()
+                outputs[name] = result
+                timings[name] = {
+                    "start": round(start - flow_start, 3),
+                    "end": round(end - flow_start, 3),
+                    "wall_time": round(end - start, 3),
+                }
+
+    total = time.perf_counter() - flow_start
+    path_time, path = critical_path(nodes, timings)
+    report = {
+        "nodes": timings,
+        "total_wall_time": round(total, 3),
+        "sum_of_node_times": round(sum(t["wall_time"] for t in timings.values()), 3),
+        "critical_path": path,
+        "critical_path_time": round(path_time, 3),
+    }
+
+    flow_outputs = {
+        name: resolve_value(spec.get("reference"), flow_inputs, outputs)
+        for name, spec in flow.get("outputs", {}).items()
+    }
+    return flow_outputs, report
+
+
+def print_report(report):
+    """Print per-node wall times and the critical path."""
+    print(f"\n{'Node':<24}{'Start':>10}{'End':>10}{'Wall (s)':>10}")
+    print("-" * 54)
+    for name, timing in sorted(report["nodes"].items(), key=lambda item: item[1].get("start", 0)):
+        if timing.get("skipped"):
+            print(f"{name:<24}{'skipped':>30}")
+            continue
+        print(f"{name:<24}{timing['start']:>10.3f}{timing['end']:>10.3f}{timing['wall_time']:>10.3f}")
+    print("-" * 54)
+    print(f"Total wall time:     {report['total_wall_time']:.3f}s")
+    print(f"Sum of node times:   {report['sum_of_node_times']:.3f}s")
+    print(f"Critical path:       {' -> '.join(report['critical_path'])} ({report['critical_path_time']:.3f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the workout flow locally with concurrent branches")
+    parser.add_argument("query", help="Natural language question about workout data")
+    parser.add_argument("--no-search", action="store_true", help="Skip the AI Search branch")
+    parser.add_argument("--search-type", default="hybrid", help="semantic, vector, hybrid or keyword")
+    parser.add_argument("--sequential", action="store_true", help="Run one node at a time for comparison")
+    args = parser.parse_args()
+
+    outputs, report = run_flow(
+        {"query": args.query, "use_search": not args.no_search, "search_type": args.search_type},
+        max_workers=1 if args.sequential else None,
+    )
+
+    print(outputs.get("enhanced_result"))
+    print_report(report)
+
+    from clients import clients
+    print(f"Client reuse:        {json.dumps(clients.stats())}")
+
+
+if __name__ == "__main__":
+    main()
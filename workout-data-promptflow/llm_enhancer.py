@@ -3,16 +3,38 @@
 
 import os
 import json
+import time
 from promptflow.core import tool
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from clients import clients
+from prompt_builder import log_usage, prompt_builder
+from result_format import to_json
 
 # Load environment variables
 load_dotenv()
 
 
+def stream_analysis(client, deployment, messages):
+    """Yield the analysis text as the model generates it."""
+    try:
+        response = client.chat.completions.create(
+            model=deployment,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        error_message = f"Error in LLM enhancement: {str(e)}"
+        print(error_message)
+        yield f"\n\n{error_message}"
+
+
 @tool
-def llm_enhancer(question: str, sql_results: str, search_results: str = None) -> str:
+def llm_enhancer(question: str, sql_results: str, search_results: str = None, stream: bool = False):
     """
     Enhance query results with LLM-powered analysis, insights, and natural language summaries.
     
@@ -20,17 +42,15 @@ def llm_enhancer(question: str, sql_results: str, search_results: str = None) ->
         question: Original user question
         sql_results: Results from SQL query against Cosmos DB
         search_results: Optional results from Azure AI Search
+        stream: Return a generator of analysis text chunks instead of a JSON string,
+            so the flow server can relay tokens as server-sent events
         
     Returns:
         Enhanced analysis with insights, summaries, and recommendations
     """
     try:
-        # Initialize Azure OpenAI client
-        client = AzureOpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
+        # Shared Azure OpenAI client for this process
+        client = clients.openai_client()
         deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
         
         # Parse the input data
@@ -63,53 +83,38 @@ def llm_enhancer(question: str, sql_results: str, search_results: str = None) ->
         
         Always be encouraging and focus on helping the user improve their fitness journey."""
         
-        # Build the user message with context
-        user_message_parts = [
-            f"User Question: {question}",
-            "\n--- SQL Query Results ---"
+        # Fit question, SQL rows and search hits into the input-token budget
+        instructions = [
+            "Please provide an insightful analysis with:",
+            "1. A clear answer to the user's question",
+            "2. Key insights and patterns from the data",
+            "3. Actionable recommendations for improvement",
+            "4. Motivational observations about their progress"
         ]
+        messages, prompt_stats = prompt_builder.build(system_prompt, question, sql_data, search_data, instructions)
         
-        if sql_data:
-            if sql_data.get("status") == "success":
-                user_message_parts.append(f"Query returned {sql_data.get('count', 0)} results")
-                if sql_data.get("results"):
-                    user_message_parts.append("Data:")
-                    user_message_parts.append(json.dumps(sql_data["results"], indent=2))
-                elif sql_data.get("value") is not None:
-                    user_message_parts.append(f"Result: {sql_data['value']}")
-            else:
-                user_message_parts.append(f"SQL Error: {sql_data.get('message', 'Unknown error')}")
-        
-        if search_data and search_data.get("status") == "success":
-            user_message_parts.append("\n--- Search Results ---")
-            user_message_parts.append(f"Found {search_data.get('returned_count', 0)} relevant entries")
-            if search_data.get("results"):
-                # Summarize search results more concisely
-                exercises = [r.get("exercise") for r in search_data["results"][:5] if r.get("exercise")]
-                if exercises:
-                    user_message_parts.append(f"Top exercises: {', '.join(set(exercises))}")
-        
-        user_message_parts.append("\nPlease provide an insightful analysis with:")
-        user_message_parts.append("1. A clear answer to the user's question")
-        user_message_parts.append("2. Key insights and patterns from the data")
-        user_message_parts.append("3. Actionable recommendations for improvement")
-        user_message_parts.append("4. Motivational observations about their progress")
-        
-        user_message = "\n".join(user_message_parts)
+        if stream:
+            log_usage(prompt_stats)
+            return stream_analysis(client, deployment, messages)
         
         # Generate enhanced response
+        started = time.perf_counter()
         response = client.chat.completions.create(
             model=deployment,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
+            messages=messages,
             temperature=0.7,
             max_tokens=1000
         )
         
         enhanced_analysis = response.choices[0].message.content.strip()
         
+        # Model latency and actual token usage next to the section budget, for p95 tuning
+        prompt_stats["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if getattr(response, "usage", None):
+            prompt_stats["prompt_tokens"] = response.usage.prompt_tokens
+            prompt_stats["completion_tokens"] = response.usage.completion_tokens
+        log_usage(prompt_stats)
+        
         # Structure the final response
         final_response = {
             "status": "success",
@@ -120,10 +125,11 @@ def llm_enhancer(question: str, sql_results: str, search_results: str = None) ->
                 "search_available": search_data is not None,
                 "sql_results_count": sql_data.get("count") if sql_data else 0,
                 "search_results_count": search_data.get("returned_count") if search_data else 0
-            }
+            },
+            "prompt_stats": prompt_stats
         }
         
-        return json.dumps(final_response, indent=2)
+        return to_json(final_response)
         
     except Exception as e:
         error_message = f"Error in LLM enhancement: {str(e)}"
@@ -134,7 +140,7 @@ def llm_enhancer(question: str, sql_results: str, search_results: str = None) ->
             "message": error_message,
             "question": question,
             "fallback_analysis": "Unable to provide enhanced analysis due to technical issues. Please review the raw data results."
-        }, indent=2)
+        })
 
 
 # For local testing
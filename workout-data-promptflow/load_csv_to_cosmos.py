@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 """Load JSONL workout data into Azure Cosmos DB."""
 
+import argparse
+import asyncio
 import json
 import os
 import sys
+import time
 from pathlib import Path
 from azure.cosmos import CosmosClient, exceptions
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
 from dotenv import load_dotenv
+from rollup_store import DEFAULT_ROLLUP_PATH, RollupStore
+
+# Transactional batches are limited to 100 operations on one logical partition
+MAX_BATCH_OPERATIONS = 100
+REQUEST_CHARGE_HEADER = 'x-ms-request-charge'
+RETRY_AFTER_HEADER = 'x-ms-retry-after-ms'
+# Uploaded records buffered before they are applied to the rollup store
+ROLLUP_FLUSH_SIZE = 1000
 
 
 def load_env():
@@ -64,14 +76,15 @@ def get_or_create_container(database, container_name):
         sys.exit(1)
 
 
-def load_jsonl_to_cosmos(container, jsonl_file_path):
-    """Load JSONL records into Cosmos DB container."""
+def load_jsonl_to_cosmos(container, jsonl_file_path, rollups=None):
+    """Load JSONL records into Cosmos DB container, keeping the rollup store (if given) in step."""
     if not Path(jsonl_file_path).exists():
         print(f"Error: JSONL file not found: {jsonl_file_path}")
         sys.exit(1)
     
     success_count = 0
     error_count = 0
+    uploaded = []
     
     with open(jsonl_file_path, 'r', encoding='utf-8') as file:
         for line_num, line in enumerate(file, 1):
@@ -89,6 +102,12 @@ def load_jsonl_to_cosmos(container, jsonl_file_path):
                 container.upsert_item(body=record)
                 success_count += 1
                 
+                if rollups is not None:
+                    uploaded.append(record)
+                    if len(uploaded) >= ROLLUP_FLUSH_SIZE:
+                        rollups.apply(uploaded)
+                        uploaded = []
+                
                 if success_count % 100 == 0:
                     print(f"Progress: {success_count} records uploaded...")
                     
@@ -102,6 +121,9 @@ def load_jsonl_to_cosmos(container, jsonl_file_path):
                 print(f"Unexpected error on line {line_num}: {e}")
                 error_count += 1
     
+    if rollups is not None and uploaded:
+        rollups.apply(uploaded)
+    
     print(f"\nUpload complete!")
     print(f"Successfully uploaded: {success_count} records")
     print(f"Errors: {error_count} records")
@@ -109,8 +131,295 @@ def load_jsonl_to_cosmos(container, jsonl_file_path):
     return success_count, error_count
 
 
+class RUThrottle:
+    """Token bucket that keeps sustained RU consumption under a per-second budget."""
+    
+    def __init__(self, ru_per_second):
+        self.rate = float(ru_per_second)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self, estimated_ru):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= estimated_ru or self.tokens >= self.rate:
+                    self.tokens -= estimated_ru
+                    return
+                await asyncio.sleep((min(estimated_ru, self.rate) - self.tokens) / self.rate)
+    
+    def settle(self, estimated_ru, actual_ru):
+        """Correct the bucket once the real charge of an operation is known."""
+        if self.rate > 0:
+            self.tokens = min(self.rate, self.tokens + estimated_ru - actual_ru)
+
+
+class Checkpoint:
+    """
+    Tracks the highest line number below which every line has been committed.
+    
+    Operations finish out of order, so the saved watermark only advances over a
+    contiguous run of finished lines; resuming re-sends at most the lines that
+    were in flight, which is safe because every write is an upsert. Lines whose
+    write failed are never marked, so the watermark stops before the first of
+    them and the next run retries it.
+    """
+    
+    def __init__(self, path, source, restart=False):
+        self.path = Path(path)
+        self.source = str(source)
+        self.line = 0
+        self.finished = set()
+        self.failed = []
+        if self.path.exists() and not restart:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                saved = json.load(file)
+            if saved.get('source') == self.source:
+                self.line = saved.get('line', 0)
+    
+    def mark(self, line_numbers):
+        self.finished.update(line_numbers)
+        while self.line + 1 in self.finished:
+            self.line += 1
+            self.finished.discard(self.line)
+    
+    def fail(self, line_numbers):
+        self.failed.extend(line_numbers)
+    
+    def save(self):
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'source': self.source, 'line': self.line, 'failed_lines': sorted(self.failed)}, file)
+        os.replace(tmp_path, self.path)
+
+
+class BulkStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.success = 0
+        self.errors = 0
+        self.request_charge = 0.0
+        self.throttled = 0
+        self.batches = 0
+    
+    def report(self, label="Progress"):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        print(f"{label}: {self.success} records, {self.errors} errors, "
+              f"{self.success / elapsed:.0f} docs/sec, {self.request_charge / elapsed:.0f} RU/sec, "
+              f"{self.throttled} throttled retries")
+
+
+def partition_key_value(record, partition_key_path):
+    value = record
+    for part in partition_key_path.strip('/').split('/'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _request_charge(result):
+    headers = result.get_response_headers() if hasattr(result, 'get_response_headers') else {}
+    return float(headers.get(REQUEST_CHARGE_HEADER, 0) or 0)
+
+
+async def _with_backoff(operation, stats, max_retries):
+    """Run a Cosmos operation, sleeping for the server's retry-after on 429s."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await operation()
+        except exceptions.CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == max_retries:
+                raise
+            stats.throttled += 1
+            retry_after_ms = (e.headers or {}).get(RETRY_AFTER_HEADER)
+            delay = float(retry_after_ms) / 1000 if retry_after_ms else min(0.1 * 2 ** attempt, 5)
+            await asyncio.sleep(delay)
+
+
+def build_work_units(window, partition_key_path):
+    """
+    Group a window of (line_num, record) pairs into write units.
+    
+    Records sharing a partition key value go out as transactional batches of up
+    to 100 operations (one round trip each); the rest are single upserts. With
+    the default /id partition key every record is its own partition, so all
+    units are single upserts and throughput comes from concurrency alone.
+    """
+    groups = {}
+    for line_num, record in window:
+        key = json.dumps(partition_key_value(record, partition_key_path), sort_keys=True)
+        groups.setdefault(key, []).append((line_num, record))
+    
+    units = []
+    for entries in groups.values():
+        for i in range(0, len(entries), MAX_BATCH_OPERATIONS):
+            units.append(entries[i:i + MAX_BATCH_OPERATIONS])
+    return units
+
+
+async def bulk_load_jsonl_to_cosmos(jsonl_file_path, concurrency=32, ru_budget=0, window_size=2000,
+                                    checkpoint_path=None, restart=False, max_retries=10, rollups=None):
+    """
+    Load JSONL records into Cosmos DB with concurrent, partition-batched upserts.
+    
+    Args:
+        jsonl_file_path: Path to the JSONL file
+        concurrency: Maximum number of write requests in flight
+        ru_budget: Sustained RU/sec ceiling (0 disables the throttle)
+        window_size: Records read ahead and grouped by partition key per window
+        checkpoint_path: File storing the last contiguously committed line
+        restart: Ignore an existing checkpoint and load from the first line
+        max_retries: Attempts per request after 429 responses
+        rollups: RollupStore updated with every committed record
+        
+    Returns:
+        Tuple of (success_count, error_count)
+    """
+    if not Path(jsonl_file_path).exists():
+        print(f"Error: JSONL file not found: {jsonl_file_path}")
+        sys.exit(1)
+    
+    checkpoint = Checkpoint(checkpoint_path or f"{jsonl_file_path}.checkpoint", jsonl_file_path, restart)
+    if checkpoint.line:
+        print(f"Resuming after line {checkpoint.line} from {checkpoint.path}")
+    
+    stats = BulkStats()
+    throttle = RUThrottle(ru_budget)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    estimated_ru_per_doc = [10.0]
+    uploaded = []
+    
+    def flush_rollups():
+        if rollups is not None and uploaded:
+            rollups.apply(uploaded)
+            uploaded.clear()
+    
+    async def write_unit(container, unit, partition_key_path):
+        line_numbers = [line_num for line_num, _ in unit]
+        estimate = estimated_ru_per_doc[0] * len(unit)
+        await throttle.acquire(estimate)
+        charge = 0.0
+        try:
+            if len(unit) == 1:
+                result = await _with_backoff(
+                    lambda: container.upsert_item(body=unit[0][1], no_response=True), stats, max_retries
+                )
+            else:
+                operations = [("upsert", (record,)) for _, record in unit]
+                key = partition_key_value(unit[0][1], partition_key_path)
+                result = await _with_backoff(
+                    lambda: container.execute_item_batch(operations, partition_key=key), stats, max_retries
+                )
+                stats.batches += 1
+            charge = _request_charge(result)
+            stats.success += len(unit)
+            if rollups is not None:
+                uploaded.extend(record for _, record in unit)
+                if len(uploaded) >= ROLLUP_FLUSH_SIZE:
+                    flush_rollups()
+            if charge:
+                estimated_ru_per_doc[0] = 0.9 * estimated_ru_per_doc[0] + 0.1 * (charge / len(unit))
+            checkpoint.mark(line_numbers)
+        except Exception as e:
+            print(f"Error uploading lines {line_numbers[0]}-{line_numbers[-1]}: {e}")
+            stats.errors += len(unit)
+            checkpoint.fail(line_numbers)
+        finally:
+            throttle.settle(estimate, charge)
+            stats.request_charge += charge
+    
+    async def worker(container, partition_key_path):
+        while True:
+            unit = await queue.get()
+            try:
+                await write_unit(container, unit, partition_key_path)
+            finally:
+                queue.task_done()
+    
+    async def reporter():
+        while True:
+            await asyncio.sleep(5)
+            # Rollups are flushed before the checkpoint so a resumed load cannot skip them
+            flush_rollups()
+            checkpoint.save()
+            stats.report()
+    
+    async with AsyncCosmosClient(os.getenv('COSMOS_URI'), credential=os.getenv('COSMOS_KEY')) as client:
+        database = client.get_database_client(os.getenv('COSMOS_DB'))
+        container = database.get_container_client(os.getenv('COSMOS_CONTAINER'))
+        properties = await container.read()
+        partition_key_path = properties['partitionKey']['paths'][0]
+        print(f"Bulk loading with {concurrency} concurrent requests, partition key {partition_key_path}"
+              + (f", RU budget {ru_budget}/sec" if ru_budget else ""))
+        
+        workers = [asyncio.create_task(worker(container, partition_key_path)) for _ in range(concurrency)]
+        progress = asyncio.create_task(reporter())
+        
+        window = []
+        with open(jsonl_file_path, 'r', encoding='utf-8') as file:
+            for line_num, line in enumerate(file, 1):
+                if line_num <= checkpoint.line:
+                    continue
+                try:
+                    record = json.loads(line.strip())
+                except json.JSONDecodeError as e:
+                    print(f"Error parsing JSON on line {line_num}: {e}")
+                    stats.errors += 1
+                    checkpoint.mark([line_num])
+                    continue
+                
+                if 'id' not in record or partition_key_value(record, partition_key_path) is None:
+                    print(f"Warning: Line {line_num} missing 'id' or partition key field, skipping")
+                    stats.errors += 1
+                    checkpoint.mark([line_num])
+                    continue
+                
+                window.append((line_num, record))
+                if len(window) >= window_size:
+                    for unit in build_work_units(window, partition_key_path):
+                        await queue.put(unit)
+                    window = []
+        
+        for unit in build_work_units(window, partition_key_path):
+            await queue.put(unit)
+        await queue.join()
+        
+        progress.cancel()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(progress, *workers, return_exceptions=True)
+    
+    flush_rollups()
+    checkpoint.save()
+    print(f"\nUpload complete!")
+    stats.report("Sustained")
+    print(f"Successfully uploaded: {stats.success} records ({stats.batches} transactional batches)")
+    print(f"Errors: {stats.errors} records")
+    print(f"Total RU charge: {stats.request_charge:.0f}")
+    if checkpoint.failed:
+        print(f"{len(checkpoint.failed)} lines failed to upload; the checkpoint stops at line {checkpoint.line}, "
+              f"so running the load again retries them (lines after it are upserted again)")
+    
+    return stats.success, stats.errors
+
+
 def main():
     """Main function to orchestrate the upload process."""
+    parser = argparse.ArgumentParser(description="Load JSONL workout data into Azure Cosmos DB")
+    parser.add_argument("--bulk", action="store_true", help="Concurrent async upserts with batching and checkpoints")
+    parser.add_argument("--concurrency", type=int, default=32, help="Write requests in flight (bulk mode)")
+    parser.add_argument("--ru-budget", type=float, default=0, help="Sustained RU/sec ceiling, 0 for none (bulk mode)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <JSONL_FILE>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from line 1")
+    parser.add_argument("--skip-rollups", action="store_true", help="Do not update the local rollup store")
+    args = parser.parse_args()
+    
     print("Loading Cosmos DB workout data...")
     
     # Load environment variables
@@ -127,7 +436,34 @@ def main():
     
     # Load JSONL data
     jsonl_file = os.getenv('JSONL_FILE')
-    success, errors = load_jsonl_to_cosmos(container, jsonl_file)
+    rollups = None if args.skip_rollups else RollupStore()
+    if args.skip_rollups and Path(DEFAULT_ROLLUP_PATH).exists():
+        # Documents written now are missing from the rollups, so stop serving from them
+        skipped = RollupStore()
+        skipped.mark_incomplete()
+        skipped.close()
+    if args.bulk:
+        success, errors = asyncio.run(bulk_load_jsonl_to_cosmos(
+            jsonl_file,
+            concurrency=args.concurrency,
+            ru_budget=args.ru_budget,
+            checkpoint_path=args.checkpoint,
+            restart=args.restart,
+            rollups=rollups
+        ))
+    else:
+        success, errors = load_jsonl_to_cosmos(container, jsonl_file, rollups=rollups)
+    
+    if rollups is not None:
+        print(f"Rollup store {rollups.path}: {rollups.document_count()} documents")
+        if not rollups.is_complete():
+            print("Rollups only cover documents written by this loader; run "
+                  "`python rollup_store.py --rebuild <JSONL>` with the full data to serve aggregates from them")
+        rollups.close()
+
+    if success:
+        # The web app's response cache keys on this setting and does not see loads on its own
+        print("Bump RESPONSE_CACHE_DATA_VERSION in the web app settings and restart it so cached answers are not reused")
     
     # Exit with error code if there were failures
     sys.exit(0 if errors == 0 else 1)
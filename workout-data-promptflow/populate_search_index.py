@@ -3,17 +3,36 @@
 
 import os
 import json
-import asyncio
+import argparse
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+from openai import APIConnectionError, AzureOpenAI, InternalServerError, RateLimitError
 from dotenv import load_dotenv
+from pathlib import Path
+from search_manifest import SearchManifest, content_hash
 import time
 
+# The embedding cache is shared with the document-generation ingestion scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "document-generation-solution-accelerator" / "scripts"))
+from embedding_cache import EmbeddingCache  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
+# Embedding request packing; the API accepts up to 2048 inputs per call
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "32000"))
+
+# Starting limits until the deployment's x-ratelimit-* headers are seen
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "120000"))
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "720"))
+
+UPLOAD_BATCH_SIZE = 100
+DELETE_BATCH_SIZE = 1000
+
 
 def create_searchable_text(record):
     """Create a searchable text field combining all relevant workout information."""
@@ -35,100 +54,399 @@ def create_searchable_text(record):
     return " | ".join(parts)
 
 
-def get_embedding(text, openai_client, deployment_name):
-    """Get embedding for text using Azure OpenAI."""
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken encoding, loaded on first use; None when it cannot be loaded."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # get_encoding downloads its BPE file on first use, which fails on offline hosts
+            print(f"tiktoken unavailable, estimating batch tokens: {e}")
+        _encoding_loaded = True
+    return _encoding
+
+
+def estimate_tokens(text):
+    """Token count with tiktoken when available, otherwise a ~4 characters per token estimate."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def pack_batches(items, max_inputs=EMBEDDING_BATCH_MAX_INPUTS, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    """
+    Group (document, text) pairs into embedding requests by input count and token total.
+
+    Yields:
+        Tuples of (items in the batch, estimated tokens for the batch)
+    """
+    batch, batch_tokens = [], 0
+    for item in items:
+        tokens = estimate_tokens(item[1])
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            yield batch, batch_tokens
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch, batch_tokens
+
+
+class RateLimiter:
+    """
+    Token bucket over tokens-per-minute and requests-per-minute.
+
+    Buckets refill continuously at limit/60 per second and are corrected from the
+    x-ratelimit-limit-* and x-ratelimit-remaining-* headers of each response, so
+    the pipeline runs at the deployment's real quota instead of fixed sleeps.
+    """
+
+    def __init__(self, tokens_per_minute=EMBEDDING_TPM, requests_per_minute=EMBEDDING_RPM):
+        self.limits = {"tokens": float(tokens_per_minute), "requests": float(requests_per_minute)}
+        self.available = dict(self.limits)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        for name, limit in self.limits.items():
+            self.available[name] = min(limit, self.available[name] + elapsed * limit / 60)
+
+    def acquire(self, tokens):
+        while True:
+            with self.lock:
+                self._refill()
+                # A batch larger than the whole bucket proceeds once the bucket is full
+                needed_tokens = min(tokens, self.limits["tokens"])
+                wait_for = self.paused_until - time.monotonic()
+                if wait_for <= 0 and self.available["tokens"] >= needed_tokens and self.available["requests"] >= 1:
+                    self.available["tokens"] -= tokens
+                    self.available["requests"] -= 1
+                    return
+                if wait_for <= 0:
+                    token_wait = (needed_tokens - self.available["tokens"]) * 60 / self.limits["tokens"]
+                    request_wait = (1 - self.available["requests"]) * 60 / self.limits["requests"]
+                    wait_for = max(token_wait, request_wait, 0.01)
+            time.sleep(wait_for)
+
+    def update(self, headers):
+        """Align the buckets with the rate limit state reported by the service."""
+        with self.lock:
+            self._refill()
+            for name in ("tokens", "requests"):
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if limit:
+                    self.limits[name] = float(limit)
+                if remaining is not None:
+                    self.available[name] = min(self.available[name], float(remaining))
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _retry_after_seconds(headers, default):
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            return default
+    return default
+
+
+def get_embeddings(texts, openai_client, deployment_name, limiter, estimated_tokens, max_retries=6):
+    """
+    Embed a batch of texts in one request, waiting on the shared rate limiter.
+
+    429s pause every worker through the limiter; timeouts, connection errors
+    and 5xx responses back off this batch only.
+
+    Returns:
+        List of embeddings in input order
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimated_tokens)
+        try:
+            raw = openai_client.embeddings.with_raw_response.create(
+                model=deployment_name,
+                input=texts
+            )
+        except RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            limiter.pause(_retry_after_seconds(e.response.headers, min(2 ** attempt, 60)))
+            continue
+        except (APIConnectionError, InternalServerError) as e:
+            # APIConnectionError covers APITimeoutError
+            if attempt == max_retries:
+                raise
+            delay = min(2 ** attempt, 60)
+            print(f"Transient embedding error ({e.__class__.__name__}), retrying in {delay}s")
+            time.sleep(delay)
+            continue
+        limiter.update(raw.headers)
+        response = raw.parse()
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def build_search_document(record, searchable_text):
+    """Map a workout record onto the search index fields (without the embedding)."""
+    return {
+        "id": record["id"],
+        "ExDate": record.get("ExDate", ""),
+        "Exercise": record.get("Exercise", ""),
+        "Set": int(record.get("Set", 0)) if record.get("Set") else 0,
+        "Reps": int(record.get("Reps", 0)) if record.get("Reps") else 0,
+        "Weight": float(record.get("Weight", 0)) if record.get("Weight") else 0.0,
+        "ExType": record.get("ExType", ""),
+        "SearchableText": searchable_text
+    }
+
+
+def read_documents(jsonl_file):
+    """Yield (search document, searchable text) for each valid JSONL record."""
+    with open(jsonl_file, 'r', encoding='utf-8') as file:
+        for line_num, line in enumerate(file, 1):
+            try:
+                record = json.loads(line.strip())
+                searchable_text = create_searchable_text(record)
+                yield build_search_document(record, searchable_text), searchable_text
+            except json.JSONDecodeError as e:
+                print(f"Error parsing JSON on line {line_num}: {e}")
+            except Exception as e:
+                print(f"Error processing line {line_num}: {e}")
+
+
+def split_cached(items, embedding_cache, group_size=EMBEDDING_BATCH_MAX_INPUTS):
+    """
+    Attach cached embeddings and yield only the items that still need embedding.
+
+    Yields:
+        Tuples of (uncached items, documents whose embedding came from the cache)
+    """
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) >= group_size:
+            yield _split_group(group, embedding_cache)
+            group = []
+    if group:
+        yield _split_group(group, embedding_cache)
+
+
+def _split_group(group, embedding_cache):
+    uncached, cached_docs = [], []
+    vectors = embedding_cache.get_many([text for _, text in group])
+    for (document, text), vector in zip(group, vectors):
+        if vector is None:
+            uncached.append((document, text))
+        else:
+            document["Embedding"] = vector
+            cached_docs.append(document)
+    return uncached, cached_docs
+
+
+def upload_batch(search_client, documents):
+    """Upload documents and return the ids the index accepted."""
     try:
-        response = openai_client.embeddings.create(
-            model=deployment_name,
-            input=text
-        )
-        return response.data[0].embedding
+        result = search_client.upload_documents(documents)
+        succeeded = [r.key for r in result if r.succeeded]
+        print(f"Uploaded {len(succeeded)} documents successfully")
+        return succeeded
     except Exception as e:
-        print(f"Error getting embedding for text '{text[:50]}...': {e}")
-        return None
+        print(f"Error uploading batch: {e}")
+        return []
 
 
-def populate_search_index():
-    """Populate the search index with workout data and embeddings."""
-    
+def delete_stale_documents(search_client, manifest):
+    """Delete ids that disappeared from the source since the last sync."""
+    stale_ids = manifest.stale_ids()
+    deleted = 0
+    for i in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+        batch = stale_ids[i:i + DELETE_BATCH_SIZE]
+        try:
+            result = search_client.delete_documents(documents=[{"id": doc_id} for doc_id in batch])
+            succeeded = [r.key for r in result if r.succeeded]
+            manifest.remove(succeeded)
+            deleted += len(succeeded)
+        except Exception as e:
+            print(f"Error deleting batch of {len(batch)} documents: {e}")
+    return deleted
+
+
+def populate_search_index(embed_workers=4, upload_workers=2, incremental=False, manifest_path=None):
+    """
+    Populate the search index with workout data and embeddings.
+
+    Records are packed into token-bounded embedding requests that run on a pool
+    of workers while completed documents are uploaded on a separate pool, so the
+    index fills as fast as the embedding deployment's quota allows. Text already
+    embedded by a previous run is served from the local embedding cache.
+
+    In incremental mode a manifest of id → content hash from the previous sync
+    limits embedding and upload to new or changed rows, and ids no longer in
+    the source are deleted from the index.
+
+    Args:
+        embed_workers: Embedding requests in flight
+        upload_workers: upload_documents calls in flight
+        incremental: Only sync rows that changed since the last run
+        manifest_path: SQLite manifest file (default: <JSONL_FILE>.manifest.db)
+
+    Returns:
+        Number of documents that could not be embedded or uploaded
+    """
+
     # Initialize clients
     search_client = SearchClient(
         endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
         index_name=os.getenv("AZURE_SEARCH_INDEX_NAME"),
         credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
     )
-    
+
     openai_client = AzureOpenAI(
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        max_retries=0  # get_embeddings retries 429s (through the rate limiter) and transient errors
     )
-    
+
     embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
     jsonl_file = os.getenv("JSONL_FILE")
-    
-    # Read workout data
-    documents = []
-    with open(jsonl_file, 'r', encoding='utf-8') as file:
-        for line_num, line in enumerate(file, 1):
-            try:
-                record = json.loads(line.strip())
-                
-                # Create searchable text
-                searchable_text = create_searchable_text(record)
-                
-                # Get embedding
-                print(f"Processing record {line_num}: {record.get('Exercise', 'Unknown')}...")
-                embedding = get_embedding(searchable_text, openai_client, embedding_deployment)
-                
-                if embedding:
-                    # Prepare document for search index
-                    search_doc = {
-                        "id": record["id"],
-                        "ExDate": record.get("ExDate", ""),
-                        "Exercise": record.get("Exercise", ""),
-                        "Set": int(record.get("Set", 0)) if record.get("Set") else 0,
-                        "Reps": int(record.get("Reps", 0)) if record.get("Reps") else 0,
-                        "Weight": float(record.get("Weight", 0)) if record.get("Weight") else 0.0,
-                        "ExType": record.get("ExType", ""),
-                        "SearchableText": searchable_text,
-                        "Embedding": embedding
-                    }
-                    
-                    documents.append(search_doc)
-                
-                # Add small delay to avoid rate limiting
-                if line_num % 10 == 0:
-                    time.sleep(1)
-                    
-                # Upload in batches of 100
-                if len(documents) >= 100:
-                    print(f"Uploading batch of {len(documents)} documents...")
-                    try:
-                        result = search_client.upload_documents(documents)
-                        print(f"Uploaded {len([r for r in result if r.succeeded])} documents successfully")
-                        documents = []
-                    except Exception as e:
-                        print(f"Error uploading batch: {e}")
-                        documents = []
-                        
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON on line {line_num}: {e}")
-            except Exception as e:
-                print(f"Error processing line {line_num}: {e}")
-    
-    # Upload remaining documents
-    if documents:
-        print(f"Uploading final batch of {len(documents)} documents...")
-        try:
-            result = search_client.upload_documents(documents)
-            print(f"Uploaded {len([r for r in result if r.succeeded])} documents successfully")
-        except Exception as e:
-            print(f"Error uploading final batch: {e}")
-    
+    limiter = RateLimiter()
+    embedding_cache = EmbeddingCache(embedding_deployment)
+    manifest = SearchManifest(manifest_path or f"{jsonl_file}.manifest.db") if incremental else None
+    pending_hashes = {}
+    unchanged_count = 0
+
+    started = time.monotonic()
+    embedded_count = 0
+    uploaded_count = 0
+    dropped_count = 0
+    pending_docs = []
+
+    with ThreadPoolExecutor(max_workers=embed_workers) as embed_pool, \
+            ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+        embedding_futures = {}
+        upload_futures = []
+
+        def flush_uploads():
+            while len(pending_docs) >= UPLOAD_BATCH_SIZE:
+                upload_futures.append((upload_pool.submit(
+                    upload_batch, search_client, pending_docs[:UPLOAD_BATCH_SIZE]
+                ), UPLOAD_BATCH_SIZE))
+                del pending_docs[:UPLOAD_BATCH_SIZE]
+
+        def collect(done):
+            nonlocal embedded_count, dropped_count
+            for future in done:
+                batch = embedding_futures.pop(future)
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    print(f"Error embedding batch of {len(batch)} records: {e}")
+                    dropped_count += len(batch)
+                    continue
+                embedding_cache.put_many([text for _, text in batch], embeddings)
+                for (document, _), embedding in zip(batch, embeddings):
+                    document["Embedding"] = embedding
+                    pending_docs.append(document)
+                embedded_count += len(batch)
+            flush_uploads()
+
+        def changed_documents():
+            nonlocal unchanged_count
+            for document, text in read_documents(jsonl_file):
+                if manifest is None:
+                    yield document, text
+                    continue
+                manifest.mark_seen(document["id"])
+                doc_hash = content_hash(document, embedding_deployment)
+                if manifest.is_unchanged(document["id"], doc_hash):
+                    unchanged_count += 1
+                    continue
+                pending_hashes[document["id"]] = doc_hash
+                yield document, text
+
+        def uncached_documents():
+            for uncached, cached_docs in split_cached(changed_documents(), embedding_cache):
+                pending_docs.extend(cached_docs)
+                flush_uploads()
+                yield from uncached
+
+        for batch, batch_tokens in pack_batches(uncached_documents()):
+            # Keep a bounded number of batches in memory ahead of the workers
+            if len(embedding_futures) >= embed_workers * 2:
+                done, _ = wait(embedding_futures, return_when=FIRST_COMPLETED)
+                collect(done)
+            texts = [text for _, text in batch]
+            embedding_futures[embed_pool.submit(
+                get_embeddings, texts, openai_client, embedding_deployment, limiter, batch_tokens
+            )] = batch
+            print(f"Queued embedding batch of {len(batch)} records (~{batch_tokens} tokens)")
+
+        while embedding_futures:
+            done, _ = wait(embedding_futures, return_when=FIRST_COMPLETED)
+            collect(done)
+
+        # Upload remaining documents
+        if pending_docs:
+            print(f"Uploading final batch of {len(pending_docs)} documents...")
+            upload_futures.append((upload_pool.submit(upload_batch, search_client, list(pending_docs)), len(pending_docs)))
+
+        for future, batch_size in upload_futures:
+            uploaded_ids = future.result()
+            uploaded_count += len(uploaded_ids)
+            dropped_count += batch_size - len(uploaded_ids)
+            if manifest is not None:
+                manifest.record_uploaded({doc_id: pending_hashes[doc_id] for doc_id in uploaded_ids})
+
+    if manifest is not None:
+        deleted_count = delete_stale_documents(search_client, manifest)
+        manifest.close()
+        print(f"Incremental sync: {unchanged_count} unchanged, {len(pending_hashes)} new or changed, "
+              f"{deleted_count} deleted")
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"\nEmbedded {embedded_count} records and uploaded {uploaded_count} documents "
+          f"in {elapsed:.1f}s ({uploaded_count / elapsed:.1f} docs/sec)")
+    print(f"Embedding cache: {embedding_cache.stats()}")
+    embedding_cache.close()
+    if dropped_count:
+        # The manifest only records uploaded ids, so an incremental run picks the dropped rows up again
+        print(f"\n❌ {dropped_count} documents were not indexed; run again with --incremental to retry them")
+        return dropped_count
     print("\n✅ Search index population complete!")
+    return 0
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate Azure AI Search with workout data and embeddings")
+    parser.add_argument("--embed-workers", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--upload-workers", type=int, default=2, help="Upload requests in flight")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed and upload new or changed rows, delete removed ids")
+    parser.add_argument("--manifest", help="Manifest file for incremental syncs (default: <JSONL_FILE>.manifest.db)")
+    args = parser.parse_args()
+
     print("Populating Azure AI Search index with workout data and embeddings...")
-    populate_search_index()
\ No newline at end of file
+    dropped = populate_search_index(
+        embed_workers=args.embed_workers,
+        upload_workers=args.upload_workers,
+        incremental=args.incremental,
+        manifest_path=args.manifest
+    )
+    sys.exit(1 if dropped else 0)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Assemble the llm_enhancer prompt within an input-token budget."""
+
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from result_format import count_tokens, decode_rows, prompt_savings, render_for_prompt, render_table
+
+# Input tokens for the whole prompt (system, question, results and instructions)
+PROMPT_INPUT_TOKENS = int(os.getenv("PROMPT_INPUT_TOKENS", "3000"))
+# Share of the space left after the fixed sections given to SQL rows; search hits get the rest
+PROMPT_SQL_SHARE = float(os.getenv("PROMPT_SQL_SHARE", "0.75"))
+# Optional JSON-lines file receiving the per-section usage of every prompt
+PROMPT_USAGE_LOG = os.getenv("PROMPT_USAGE_LOG")
+
+# Fields that identify a row rather than describe a workout
+IDENTITY_FIELDS = {"id", "searchable_text", "score", "captions", "answers"}
+# Preferred columns to pre-aggregate by, in order
+GROUP_PREFERENCE = ["Exercise", "exercise", "ExType", "exercise_type"]
+
+logger = logging.getLogger(__name__)
+
+
+def dedup_rows(rows):
+    """Drop identity fields and collapse identical rows, adding a count column when any repeat."""
+    counts = Counter()
+    unique = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            return rows, False
+        content = {key: value for key, value in row.items() if key not in IDENTITY_FIELDS}
+        key = json.dumps(content, sort_keys=True, default=str)
+        counts[key] += 1
+        unique.setdefault(key, content)
+    if len(unique) == len(rows):
+        return list(unique.values()), False
+    return [{**content, "count": counts[key]} for key, content in unique.items()], True
+
+
+def _group_column(rows):
+    columns = {key for row in rows for key in row}
+    for name in GROUP_PREFERENCE:
+        if name in columns:
+            return name
+    for name in sorted(columns):
+        values = {str(row.get(name)) for row in rows if isinstance(row.get(name), str)}
+        if 1 < len(values) <= max(len(rows) // 4, 2):
+            return name
+    return None
+
+
+def aggregate_rows(rows):
+    """
+    Pre-aggregate rows per exercise (or the first low-cardinality text column).
+
+    Returns:
+        List of per-group rows with counts, numeric totals/averages/maxima and the
+        date range, or None when there is no column to group by
+    """
+    group_column = _group_column(rows)
+    if group_column is None:
+        return None
+    numeric = sorted({
+        key for row in rows for key, value in row.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and key != "count"
+    })
+    dates = [key for key in ("ExDate", "date") if any(key in row for row in rows)]
+
+    groups = {}
+    for row in rows:
+        weight = row.get("count", 1)
+        group = groups.setdefault(row.get(group_column), {"rows": 0, "values": {name: [] for name in numeric},
+                                                          "dates": []})
+        group["rows"] += weight
+        for name in numeric:
+            value = row.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                group["values"][name].extend([value] * weight)
+        for name in dates:
+            if row.get(name):
+                group["dates"].append(str(row[name]))
+
+    aggregated = []
+    for key, group in sorted(groups.items(), key=lambda item: -item[1]["rows"]):
+        entry = {group_column: key, "rows": group["rows"]}
+        for name, values in group["values"].items():
+            if values:
+                entry[f"{name}_total"] = round(sum(values), 2)
+                entry[f"{name}_avg"] = round(sum(values) / len(values), 2)
+                entry[f"{name}_max"] = max(values)
+        if group["dates"]:
+            entry["first"] = min(group["dates"])
+            entry["last"] = max(group["dates"])
+        aggregated.append(entry)
+    return aggregated
+
+
+def render_sql_section(sql_data, budget):
+    """
+    Render the SQL results section, degrading from full rows to dedup,
+    pre-aggregation and finally statistics plus an even sample.
+
+    Returns:
+        Tuple of (section text, usage details)
+    """
+    usage = {"allocated": budget, "strategy": "none", "rows": 0}
+    if not sql_data:
+        return "", usage
+    if sql_data.get("status") != "success":
+        usage["strategy"] = "error"
+        return f"SQL Error: {sql_data.get('message', 'Unknown error')}", usage
+
+    header = f"Query returned {sql_data.get('count', 0)} results"
+    results = decode_rows(sql_data.get("results"))
+    if not results:
+        if sql_data.get("value") is not None:
+            usage["strategy"] = "value"
+            return f"{header}\nResult: {sql_data['value']}", usage
+        return header, usage
+
+    usage["rows"] = len(results)
+    available = budget - count_tokens(header) - 5
+
+    text, _ = render_for_prompt(results, max_tokens=10 ** 9)
+    usage["strategy"] = "full"
+    if count_tokens(text) > available:
+        rows, collapsed = dedup_rows(results)
+        tabular = isinstance(rows[0], dict)
+        if tabular:
+            text = render_table(rows)
+            usage["strategy"] = "dedup" if collapsed else "compact"
+        if tabular and count_tokens(text) > available:
+            aggregated = aggregate_rows(rows)
+            if aggregated:
+                group_column = next(iter(aggregated[0]))
+                text = f"Per-{group_column} totals over all {len(results)} rows:\n" + render_table(aggregated)
+                usage["strategy"] = "aggregate"
+        if count_tokens(text) > available:
+            text, _ = render_for_prompt(rows, max_tokens=available)
+            usage["strategy"] = "sample"
+
+    usage["savings"] = prompt_savings(results, text)
+    label = "Data:" if usage["strategy"] in ("full", "compact") else f"Data ({usage['strategy']}):"
+    return f"{header}\n{label}\n{text}", usage
+
+
+def _search_line(hit):
+    parts = [str(hit.get("exercise") or "?")]
+    for key in ("exercise_type", "date"):
+        if hit.get(key):
+            parts.append(str(hit[key]))
+    volume = []
+    if hit.get("set") is not None:
+        volume.append(f"set {hit['set']}")
+    if hit.get("reps") is not None:
+        volume.append(f"{hit['reps']} reps")
+    if hit.get("weight") is not None:
+        volume.append(f"@ {hit['weight']}")
+    if volume:
+        parts.append(" ".join(volume))
+    return " | ".join(parts)
+
+
+def render_search_section(search_data, budget):
+    """
+    Render search hits as one short line each, dropping duplicates and whatever exceeds the budget.
+
+    Returns:
+        Tuple of (section text, usage details)
+    """
+    usage = {"allocated": budget, "strategy": "none", "rows": 0}
+    if not search_data or search_data.get("status") != "success":
+        return "", usage
+
+    hits = decode_rows(search_data.get("results"))
+    header = f"Found {search_data.get('returned_count', 0)} relevant entries"
+    used = count_tokens(header)
+    lines = []
+    seen = set()
+    for hit in hits:
+        line = _search_line(hit)
+        if line in seen:
+            continue
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        seen.add(line)
+        lines.append(line)
+        used += cost
+    usage.update({"strategy": "lines", "rows": len(lines), "dropped": len(hits) - len(lines)})
+    return "\n".join([header] + lines), usage
+
+
+class PromptBuilder:
+    """
+    Fits the system prompt, question, SQL rows, search hits and instructions
+    into one input-token budget.
+
+    The fixed sections are measured first; the rest is split between SQL and
+    search results by PROMPT_SQL_SHARE, and whatever one section leaves unused
+    is handed to the other.
+
+    Args:
+        budget: Input tokens for the whole prompt (PROMPT_INPUT_TOKENS)
+        sql_share: Fraction of the variable space reserved for SQL rows (PROMPT_SQL_SHARE)
+    """
+
+    def __init__(self, budget=None, sql_share=None):
+        self.budget = budget or PROMPT_INPUT_TOKENS
+        self.sql_share = PROMPT_SQL_SHARE if sql_share is None else sql_share
+
+    def build(self, system_prompt, question, sql_data, search_data, instructions):
+        """
+        Returns:
+            Tuple of (chat messages, usage record with per-section token counts)
+        """
+        started = time.perf_counter()
+        question_text = f"User Question: {question}"
+        instructions_text = "\n".join(instructions)
+        fixed = {
+            "system": count_tokens(system_prompt),
+            "question": count_tokens(question_text),
+            "instructions": count_tokens(instructions_text)
+        }
+        variable = max(self.budget - sum(fixed.values()) - 20, 0)
+
+        # Search hits take what they need up to their share; SQL gets the remainder
+        search_budget = int(variable * (1 - self.sql_share)) if search_data else 0
+        search_text, search_usage = render_search_section(search_data, search_budget)
+        sql_budget = variable - (count_tokens(search_text) if search_text else 0)
+        sql_text, sql_usage = render_sql_section(sql_data, sql_budget)
+
+        parts = [question_text, "\n--- SQL Query Results ---", sql_text]
+        if search_text:
+            parts.extend(["\n--- Search Results ---", search_text])
+        parts.append("\n" + instructions_text)
+        user_message = "\n".join(part for part in parts if part)
+
+        sql_usage["tokens"] = count_tokens(sql_text)
+        search_usage["tokens"] = count_tokens(search_text) if search_text else 0
+        sections = {name: {"tokens": tokens} for name, tokens in fixed.items()}
+        sections["sql"] = sql_usage
+        sections["search"] = search_usage
+        total = count_tokens(system_prompt) + count_tokens(user_message)
+        usage = {
+            "budget": self.budget,
+            "total_tokens": total,
+            "over_budget": total > self.budget,
+            "sections": sections,
+            "build_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        return messages, usage
+
+
+def log_usage(usage):
+    """Log per-section prompt usage (and the model latency, when set) for budget tuning."""
+    sections = usage["sections"]
+    print(f"Prompt {usage['total_tokens']}/{usage['budget']} tokens: " + ", ".join(
+        f"{name} {section['tokens']}" + (f" ({section['strategy']})" if section.get("strategy") else "")
+        for name, section in sections.items()
+    ))
+    logger.info("prompt_usage %s", json.dumps(usage, default=str))
+    if PROMPT_USAGE_LOG:
+        try:
+            with open(PROMPT_USAGE_LOG, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps({"timestamp": time.time(), **usage}, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write prompt usage log: {e}")
+
+
+prompt_builder = PromptBuilder()
@@ -3,16 +3,65 @@
 
 import os
 import json
+import logging
+import re
 from promptflow.core import tool
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from clients import clients
 from schema_discovery import discover_schema
+from sql_cache import sql_cache
 
 
 # Load environment variables when running locally
 load_dotenv()
 
 
+FIELD_DESCRIPTIONS = {
+    "id": "unique identifier",
+    "Exercise": "exercise name",
+    "Set": "set number",
+    "Reps": "repetitions",
+    "Weight": "weight used",
+    "ExType": "exercise type",
+    "ExDate": "date of the workout",
+}
+
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _is_numeric_text(value):
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def describe_fields(fields):
+    """
+    Describe each discovered field with its stored type for the prompt.
+    
+    Returns:
+        Tuple of (field description lines, numeric fields stored as strings, ISO date fields)
+    """
+    lines, numeric_strings, iso_dates = [], [], []
+    for name, info in fields.items():
+        field_type = info.get("type")
+        sample = info.get("sample_value")
+        description = FIELD_DESCRIPTIONS.get(name, name)
+        if field_type in ("int", "float"):
+            lines.append(f"- {name}: number ({description})")
+        elif field_type == "str" and name != "id" and _is_numeric_text(sample):
+            numeric_strings.append(name)
+            lines.append(f"- {name}: string ({description} stored as string)")
+        elif field_type == "str" and ISO_DATE.match(sample or ""):
+            iso_dates.append(name)
+            lines.append(f"- {name}: string ({description}, ISO date YYYY-MM-DD)")
+        else:
+            lines.append(f"- {name}: {'string' if field_type == 'str' else field_type} ({description})")
+    return lines, numeric_strings, iso_dates
+
+
 @tool
 def query_interpreter(question: str) -> str:
     """
@@ -24,16 +73,30 @@ def query_interpreter(question: str) -> str:
     Returns:
         SQL query string for Cosmos DB
     """
-    # Initialize Azure OpenAI client with environment variables
-    client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
+    # Shared Azure OpenAI client for this process
+    client = clients.openai_client()
     deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
     
     # Discover schema dynamically
     schema = discover_schema()
+    schema_version = schema.get("schema_version") if schema else None
+    
+    # Reuse SQL generated for the same (or a near-identical) question
+    embedding = None
+    if schema_version:
+        def embed(text):
+            try:
+                return client.embeddings.create(
+                    model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+                    input=text
+                ).data[0].embedding
+            except Exception as e:
+                logging.warning(f"SQL cache embedding failed, skipping similarity lookup: {e}")
+                return None
+        
+        cached_sql, embedding = sql_cache.lookup(question, schema_version, embed=embed)
+        if cached_sql is not None:
+            return cached_sql
     
     # Build dynamic system prompt with actual categorical values
     if schema and "categorical_values" in schema:
@@ -43,16 +106,34 @@ def query_interpreter(question: str) -> str:
         exercise_list = ", ".join(f'"{ex}"' for ex in exercise_values[:20])  # Limit to first 20
         extype_list = ", ".join(f'"{et}"' for et in extype_values)
         
+        # Numeric guidance follows the types actually stored in the container
+        field_lines, numeric_strings, iso_dates = describe_fields(schema.get("fields", {}))
+        field_list = "\n".join(field_lines)
+        if numeric_strings:
+            numeric_names = ", ".join(numeric_strings)
+            numeric_rules = f"""CRITICAL: Numeric fields ({numeric_names}) are stored as strings! 
+- For counting: Use StringToNumber(c.{numeric_strings[0]}) or VALUE COUNT(1)
+- For summing: SELECT VALUE SUM(StringToNumber(c.{numeric_strings[0]})) FROM c
+- For averaging: SELECT VALUE AVG(StringToNumber(c.{numeric_strings[-1]})) FROM c"""
+            aggregate_note = f"- For aggregations with numeric fields, use StringToNumber: SELECT VALUE SUM(StringToNumber(c.{numeric_strings[0]}))"
+        else:
+            numeric_rules = """Numeric fields are stored as numbers - aggregate them directly:
+- For summing: SELECT VALUE SUM(c.Reps) FROM c
+- For averaging: SELECT VALUE AVG(c.Weight) FROM c
+- Do NOT wrap numeric fields in StringToNumber()"""
+            aggregate_note = "- For aggregations with numeric fields, use them directly: SELECT VALUE SUM(c.Reps)"
+        if iso_dates:
+            date_field = iso_dates[0]
+            numeric_rules += (
+                f"\n\nDate fields ({', '.join(iso_dates)}) are ISO strings (YYYY-MM-DD) and compare correctly as strings:\n"
+                f'- For date ranges: WHERE c.{date_field} >= "2024-01-01" AND c.{date_field} < "2024-02-01"'
+            )
+        
         system_prompt = f"""You are a SQL query generator for Azure Cosmos DB. 
 Convert natural language questions into valid Cosmos DB SQL queries.
 
 The database schema includes these fields:
-- id: string (unique identifier)
-- Exercise: string (exercise name)
-- Set: string (set number stored as string)
-- Reps: string (repetitions stored as string)
-- Weight: string (weight used stored as string)
-- ExType: string (exercise type)
+{field_list}
 
 ACTUAL EXERCISE NAMES IN DATABASE: {exercise_list}
 ACTUAL EXERCISE TYPES IN DATABASE: {extype_list}
@@ -63,16 +144,13 @@ CRITICAL: Use EXACT exercise names from the database!
 - For "bench press" use "Bench Press"
 - Always match the exact capitalization and spelling from the database
 
-CRITICAL: Numeric fields (Reps, Weight, Set) are stored as strings! 
-- For counting: Use StringToNumber(c.Reps) or VALUE COUNT(1)
-- For summing: SELECT VALUE SUM(StringToNumber(c.Reps)) FROM c
-- For averaging: SELECT VALUE AVG(StringToNumber(c.Weight)) FROM c
+{numeric_rules}
 
 Important Cosmos DB SQL notes:
 - Use SELECT * or SELECT specific fields FROM c
 - The collection alias is 'c'
 - For counting records, use: SELECT VALUE COUNT(1) FROM c
-- For aggregations with numeric fields, use StringToNumber: SELECT VALUE SUM(StringToNumber(c.Reps))
+{aggregate_note}
 - All aggregate queries must use VALUE keyword
 - CRITICAL: DO NOT use ORDER BY clauses - they cause syntax errors
 - CRITICAL: Use TOP N instead of LIMIT for restricting results
@@ -86,7 +164,7 @@ Return ONLY the SQL query without any explanation or markdown formatting."""
 Convert natural language questions into valid Cosmos DB SQL queries.
 
 The database schema includes fields like Exercise, Set, Reps, Weight, ExType.
-CRITICAL: Use StringToNumber() for numeric operations on string fields.
+If numeric fields are stored as strings, use StringToNumber() for numeric operations.
 Use exact case-sensitive matching for exercise names.
 
 Return ONLY the SQL query without any explanation or markdown formatting."""
@@ -108,6 +186,9 @@ Return ONLY the SQL query without any explanation or markdown formatting."""
     if sql_query.startswith("```"):
         sql_query = sql_query.split("\n", 1)[1].rsplit("\n", 1)[0]
     
+    if schema_version:
+        sql_cache.put(question, schema_version, sql_query, embedding=embedding)
+    
     return sql_query
 
 
@@ -122,4 +203,6 @@ if __name__ == "__main__":
     for q in test_questions:
         print(f"Question: {q}")
         print(f"SQL: {query_interpreter(q)}")
-        print("-" * 50)
\ No newline at end of file
+        print("-" * 50)
+    
+    print(f"SQL cache: {sql_cache.stats()}")
\ No newline at end of file
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Compact result encoding between flow nodes and token-budgeted rendering for prompts."""
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+# tiktoken encoding used to measure prompt sections
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "o200k_base")
+
+# "rows" keeps results as a list of objects; "columnar" sends {"columns": [...], "rows": [[...]]}
+RESULT_ENCODING = os.getenv("RESULT_ENCODING", "rows").lower()
+# Tokens the SQL results may take up in the analysis prompt before they are summarised
+RESULT_PROMPT_TOKENS = int(os.getenv("RESULT_PROMPT_TOKENS", "1500"))
+
+# Distinct values listed per text column when a result set is summarised
+SUMMARY_TOP_VALUES = 5
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding, loaded on first use; None when it cannot be loaded."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(PROMPT_TOKEN_ENCODING)
+                except Exception as e:
+                    # get_encoding downloads its BPE file on first use, which fails on offline hosts
+                    logger.warning(f"tiktoken unavailable, estimating prompt tokens: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+def to_json(data):
+    """Serialize results compactly; they are consumed by code and LLM prompts, not people."""
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+
+def count_tokens(text):
+    """Token count with tiktoken when available, otherwise a ~4 characters per token estimate."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def _columns(rows):
+    columns = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+def encode_rows(rows, encoding=None):
+    """
+    Encode query results for the inter-node payload.
+
+    Rows that are all objects are stored column-wise when the encoding is
+    "columnar", so each key is written once instead of once per row.
+    Scalar results (aggregates, VALUE queries) are returned unchanged.
+    """
+    encoding = encoding or RESULT_ENCODING
+    if encoding != "columnar" or not rows or not all(isinstance(row, dict) for row in rows):
+        return rows
+    columns = _columns(rows)
+    return {"columns": columns, "rows": [[row.get(column) for column in columns] for row in rows]}
+
+
+def decode_rows(results):
+    """Return results as a list of rows whichever encoding they were sent in."""
+    if isinstance(results, dict) and "columns" in results and "rows" in results:
+        columns = results["columns"]
+        return [
+            {column: value for column, value in zip(columns, row) if value is not None}
+            for row in results["rows"]
+        ]
+    return results or []
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (dict, list)):
+        return to_json(value)
+    return str(value).replace("\n", " ").replace(",", ";")
+
+
+def render_table(rows, columns=None):
+    """Render rows as CSV-style lines: one header, then values only."""
+    columns = columns or _columns(rows)
+    lines = [",".join(columns)]
+    lines.extend(",".join(_cell(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def summarize_rows(rows, columns=None):
+    """Column statistics for a result set too large to include in full."""
+    columns = columns or _columns(rows)
+    lines = [f"Summary of all {len(rows)} rows:"]
+    for column in columns:
+        values = [row.get(column) for row in rows if row.get(column) is not None]
+        numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        if numbers and len(numbers) == len(values):
+            lines.append(
+                f"- {column}: count {len(numbers)}, sum {round(sum(numbers), 2)}, min {min(numbers)}, "
+                f"max {max(numbers)}, avg {round(sum(numbers) / len(numbers), 2)}"
+            )
+        elif values:
+            counts = Counter(_cell(value) for value in values)
+            if len(counts) == len(values) > SUMMARY_TOP_VALUES:
+                # Identifiers and other unique values say nothing in aggregate
+                lines.append(f"- {column}: {len(counts)} distinct values")
+                continue
+            top = ", ".join(f"{value} ({count})" for value, count in counts.most_common(SUMMARY_TOP_VALUES))
+            more = f", {len(counts) - SUMMARY_TOP_VALUES} more" if len(counts) > SUMMARY_TOP_VALUES else ""
+            lines.append(f"- {column}: {len(counts)} distinct: {top}{more}")
+    return "\n".join(lines)
+
+
+def render_for_prompt(results, max_tokens=RESULT_PROMPT_TOKENS):
+    """
+    Render query results for an LLM prompt within a token budget.
+
+    Small result sets are rendered as a compact table. Larger ones get column
+    statistics over every row plus as many rows as still fit, sampled evenly
+    across the result set so the sample spans its whole range.
+
+    Returns:
+        Tuple of (text for the prompt, whether the rows were summarised)
+    """
+    rows = decode_rows(results)
+    if not rows:
+        return "", False
+    if not all(isinstance(row, dict) for row in rows):
+        text = ", ".join(_cell(row) for row in rows)
+        if count_tokens(text) <= max_tokens:
+            return text, False
+        rows = [{"value": row} for row in rows]
+
+    columns = _columns(rows)
+    table = render_table(rows, columns)
+    if count_tokens(table) <= max_tokens:
+        return table, False
+
+    summary = summarize_rows(rows, columns)
+    budget = max_tokens - count_tokens(summary) - 20
+    header = ",".join(columns)
+    lines = [",".join(_cell(row.get(column)) for column in columns) for row in rows]
+    # Estimate how many rows fit from the average line, then trim until the sample does
+    average = max(count_tokens("\n".join(lines[:50])) / min(len(lines), 50), 1)
+    shown = min(max(int((budget - count_tokens(header)) / average), 0), len(lines))
+    while shown:
+        step = len(lines) / shown
+        sample = [lines[int(i * step)] for i in range(shown)]
+        if count_tokens("\n".join([header] + sample)) <= budget:
+            break
+        shown -= max(shown // 10, 1)
+    if not shown:
+        return summary, True
+    text = f"{summary}\nSample of {shown} of {len(rows)} rows:\n" + "\n".join([header] + sample)
+    return text, True
+
+
+def prompt_savings(results, rendered):
+    """
+    Tokens saved by the compact rendering compared with pretty-printed JSON.
+
+    Returns:
+        Dict with the rendered and baseline token counts
+    """
+    baseline = count_tokens(json.dumps(decode_rows(results), indent=2, default=str))
+    used = count_tokens(rendered)
+    return {
+        "result_tokens": used,
+        "pretty_json_tokens": baseline,
+        "tokens_saved": baseline - used,
+        "tokenizer": "tiktoken" if _get_encoding() is not None else "estimate"
+    }
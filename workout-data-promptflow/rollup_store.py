@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""Precomputed workout rollups answering common aggregate questions without Cosmos DB.
+
+The store keeps one row per (Exercise, ExType, ExDate) with the count, sum, min
+and max of each numeric field. Per-exercise, per-type, per-day and per-week
+figures are all sums (or min/max) over that grain, so a question like "total
+pushup reps in January" becomes a small indexed SQLite query instead of a
+cross-partition aggregate over the raw container.
+
+Rollups are maintained idempotently: every loaded document is upserted into a
+per-document table by id and only the groups it touches are recomputed, so
+re-running a load or replaying the change feed never double counts.
+
+The loader only rolls up the documents it writes, so the store is not known to
+cover the whole container until it has been rebuilt from the full JSONL or
+synced from the start of the change feed. Those two paths record a "complete"
+marker, and the flow only answers from the store once the marker is present.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from sql_parser import Aggregate, UnsupportedQuery, parse_query
+
+DEFAULT_ROLLUP_PATH = os.getenv("ROLLUP_STORE_PATH", "workout_rollups.db")
+# Meta key recording that the store covers every document in the container
+COMPLETE_KEY = "complete"
+
+# Document fields forming the rollup grain, and the numeric fields aggregated per group
+DIMENSIONS = {"Exercise": "exercise", "ExType": "ex_type", "ExDate": "day"}
+MEASURES = {"Set": "sets", "Reps": "reps", "Weight": "weight"}
+
+_SQL_OPERATORS = {"=": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _number(value):
+    """Numeric value of a field as Cosmos StringToNumber would see it, else None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() and "." not in str(value) else number
+
+
+class RollupStore:
+    """
+    SQLite rollups of workout documents.
+
+    Args:
+        path: Database file (ROLLUP_STORE_PATH, default workout_rollups.db)
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or DEFAULT_ROLLUP_PATH)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        dims = ", ".join(f"{column} TEXT" for column in DIMENSIONS.values())
+        doc_measures = ", ".join(f"{column} NUMERIC" for column in MEASURES.values())
+        rollup_measures = ", ".join(
+            f"{column}_n INTEGER, {column}_sum NUMERIC, {column}_min NUMERIC, {column}_max NUMERIC"
+            for column in MEASURES.values()
+        )
+        group = ", ".join(DIMENSIONS.values())
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, {dims}, {doc_measures});
+            CREATE INDEX IF NOT EXISTS documents_group ON documents ({group});
+            CREATE TABLE IF NOT EXISTS rollups ({dims}, n INTEGER, {rollup_measures});
+            CREATE UNIQUE INDEX IF NOT EXISTS rollups_group ON rollups ({group});
+            CREATE INDEX IF NOT EXISTS rollups_day ON rollups (day);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.conn.commit()
+
+    def _document_row(self, document):
+        row = [str(document["id"])]
+        for field in DIMENSIONS:
+            value = document.get(field)
+            row.append(None if value is None else str(value))
+        for field in MEASURES:
+            row.append(_number(document.get(field)))
+        return row
+
+    def apply(self, documents):
+        """
+        Upsert documents and recompute the rollup groups they were in or moved to.
+
+        Returns:
+            Number of rollup groups recomputed
+        """
+        rows = [self._document_row(document) for document in documents if document.get("id") is not None]
+        if not rows:
+            return 0
+
+        dim_columns = list(DIMENSIONS.values())
+        columns = ["id"] + dim_columns + list(MEASURES.values())
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        match_group = " AND ".join(f"{column} IS ?" for column in dim_columns)
+
+        with self._lock:
+            groups = {tuple(row[1:1 + len(dim_columns)]) for row in rows}
+            # Groups the documents belonged to before this update lose them
+            for i in range(0, len(rows), 500):
+                ids = [row[0] for row in rows[i:i + 500]]
+                groups.update(self.conn.execute(
+                    f"SELECT {', '.join(dim_columns)} FROM documents "
+                    f"WHERE id IN ({', '.join('?' for _ in ids)})", ids
+                ).fetchall())
+
+            self.conn.executemany(
+                f"INSERT INTO documents ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}", rows
+            )
+            for group in groups:
+                self._recompute(group, match_group)
+            self._set_meta("updated_at", str(time.time()))
+            self.conn.commit()
+        return len(groups)
+
+    def _recompute(self, group, match_group):
+        dim_columns = list(DIMENSIONS.values())
+        aggregates = ", ".join(
+            f"COUNT({column}), SUM({column}), MIN({column}), MAX({column})" for column in MEASURES.values()
+        )
+        totals = self.conn.execute(
+            f"SELECT COUNT(*), {aggregates} FROM documents WHERE {match_group}", group
+        ).fetchone()
+        self.conn.execute(f"DELETE FROM rollups WHERE {match_group}", group)
+        if totals[0]:
+            placeholders = ", ".join("?" for _ in range(len(dim_columns) + len(totals)))
+            self.conn.execute(f"INSERT INTO rollups VALUES ({placeholders})", tuple(group) + tuple(totals))
+
+    def remove(self, doc_ids):
+        """Drop deleted documents from the rollups."""
+        doc_ids = list(doc_ids)
+        dim_columns = list(DIMENSIONS.values())
+        match_group = " AND ".join(f"{column} IS ?" for column in dim_columns)
+        with self._lock:
+            groups = set()
+            for doc_id in doc_ids:
+                row = self.conn.execute(
+                    f"SELECT {', '.join(dim_columns)} FROM documents WHERE id = ?", (doc_id,)
+                ).fetchone()
+                if row:
+                    groups.add(row)
+            self.conn.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in doc_ids])
+            for group in groups:
+                self._recompute(group, match_group)
+            self.conn.commit()
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value)
+        )
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def mark_complete(self, source):
+        """Record that the store now holds every document, rolled up from ``source``."""
+        with self._lock:
+            self._set_meta(COMPLETE_KEY, json.dumps({"source": source, "at": time.time()}))
+            self.conn.commit()
+
+    def mark_incomplete(self):
+        """Stop serving from the store until it is rebuilt or fully synced again."""
+        with self._lock:
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (COMPLETE_KEY,))
+            self.conn.commit()
+
+    def is_complete(self):
+        return self.get_meta(COMPLETE_KEY) is not None
+
+    def document_count(self):
+        return self.conn.execute("SELECT COALESCE(SUM(n), 0) FROM rollups").fetchone()[0]
+
+    def _aggregate_sql(self, aggregate):
+        if aggregate.func == "COUNT" and aggregate.field is None:
+            return "COALESCE(SUM(n), 0)"
+        column = MEASURES.get(aggregate.field)
+        if column is None:
+            raise UnsupportedQuery(f"No rollup for {aggregate.func}({aggregate.field})")
+        return {
+            "COUNT": f"COALESCE(SUM({column}_n), 0)",
+            "SUM": f"COALESCE(SUM({column}_sum), 0)",
+            "AVG": f"1.0 * SUM({column}_sum) / SUM({column}_n)",
+            "MIN": f"MIN({column}_min)",
+            "MAX": f"MAX({column}_max)",
+        }[aggregate.func]
+
+    def answer(self, sql_query):
+        """
+        Answer an aggregate query from the rollups.
+
+        Returns:
+            List of results shaped like the Cosmos DB response
+
+        Raises:
+            UnsupportedQuery: If the query is not an aggregate over rollup dimensions
+        """
+        query = parse_query(sql_query) if isinstance(sql_query, str) else sql_query
+        if not query.is_aggregate or query.distinct or query.order_by:
+            raise UnsupportedQuery("Only plain aggregate queries are answered from rollups")
+
+        group_columns = []
+        for name in query.group_by:
+            if name not in DIMENSIONS:
+                raise UnsupportedQuery(f"No rollup dimension for GROUP BY {name}")
+            group_columns.append(DIMENSIONS[name])
+
+        select_sql = []
+        for item in query.select:
+            if isinstance(item.expr, Aggregate):
+                select_sql.append(self._aggregate_sql(item.expr))
+            elif item.expr in query.group_by:
+                select_sql.append(DIMENSIONS[item.expr])
+            else:
+                raise UnsupportedQuery(f"{item.expr} is neither aggregated nor grouped")
+
+        where_sql = []
+        params = []
+        for condition in query.where:
+            column = DIMENSIONS.get(condition.field)
+            if column is None or not isinstance(condition.value, (str, tuple)):
+                raise UnsupportedQuery(f"No rollup dimension for filter on {condition.field}")
+            if condition.op == "IN":
+                if not all(isinstance(value, str) for value in condition.value):
+                    raise UnsupportedQuery("IN filters on rollup dimensions take strings")
+                where_sql.append(f"{column} IN ({', '.join('?' for _ in condition.value)})")
+                params.extend(condition.value)
+            else:
+                where_sql.append(f"{column} {_SQL_OPERATORS[condition.op]} ?")
+                params.append(condition.value)
+
+        statement = f"SELECT {', '.join(select_sql)} FROM rollups"
+        if where_sql:
+            statement += " WHERE " + " AND ".join(where_sql)
+        if group_columns:
+            statement += " GROUP BY " + ", ".join(group_columns)
+        if query.top is not None:
+            statement += f" LIMIT {int(query.top)}"
+
+        with self._lock:
+            rows = self.conn.execute(statement, params).fetchall()
+
+        names = query.output_names()
+        results = []
+        for row in rows:
+            # AVG/MIN/MAX over no numeric values are undefined in Cosmos and omitted
+            if query.value:
+                if row[0] is not None:
+                    results.append(row[0])
+            else:
+                results.append({name: value for name, value in zip(names, row) if value is not None})
+        if group_columns:
+            results = [result for result in results if result != {}]
+        return results
+
+    def summary(self, by="exercise", exercise=None, ex_type=None, start=None, end=None):
+        """
+        Totals per exercise, type, day or ISO week for dashboards.
+
+        Args:
+            by: "exercise", "ex_type", "day" or "week"
+            exercise, ex_type: Optional equality filters
+            start, end: Optional inclusive/exclusive ExDate bounds (YYYY-MM-DD)
+        """
+        key = {"exercise": "exercise", "ex_type": "ex_type", "day": "day",
+               "week": "strftime('%Y-W%W', day)"}[by]
+        filters, params = [], []
+        for column, value, op in (("exercise", exercise, "="), ("ex_type", ex_type, "="),
+                                  ("day", start, ">="), ("day", end, "<")):
+            if value is not None:
+                filters.append(f"{column} {op} ?")
+                params.append(value)
+        statement = (
+            f"SELECT {key} AS bucket, SUM(n), SUM(sets_n), SUM(reps_sum), "
+            f"1.0 * SUM(weight_sum) / SUM(weight_n), MAX(weight_max) FROM rollups"
+            + (" WHERE " + " AND ".join(filters) if filters else "")
+            + " GROUP BY bucket ORDER BY bucket"
+        )
+        with self._lock:
+            rows = self.conn.execute(statement, params).fetchall()
+        return [
+            {"bucket": bucket, "documents": n, "sets": sets, "total_reps": reps,
+             "avg_weight": avg_weight, "max_weight": max_weight}
+            for bucket, n, sets, reps, avg_weight, max_weight in rows
+        ]
+
+    def rebuild_from_jsonl(self, jsonl_file_path, batch_size=1000):
+        """Load every document of a JSONL file (the same file the Cosmos loaders read)."""
+        batch = []
+        total = 0
+        with open(jsonl_file_path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    self.apply(batch)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            self.apply(batch)
+            total += len(batch)
+        self.mark_complete(f"jsonl:{jsonl_file_path}")
+        return total
+
+    def sync_change_feed(self, container, batch_size=1000):
+        """
+        Apply documents created or updated since the last sync from the Cosmos change feed.
+
+        The feed's continuation token is kept in the store, so each call only
+        reads what changed. Deletes do not appear in the latest-version change
+        feed; remove them with remove() or rebuild the store. A sync that
+        starts from the beginning of the feed marks the store complete once it
+        has read all of it.
+        """
+        continuation = self.get_meta("change_feed_continuation")
+        if continuation:
+            feed = container.query_items_change_feed(continuation=continuation, max_item_count=batch_size)
+        else:
+            feed = container.query_items_change_feed(is_start_from_beginning=True, max_item_count=batch_size)
+
+        total = 0
+        batch = []
+        for document in feed:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                self.apply(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.apply(batch)
+            total += len(batch)
+
+        token = container.client_connection.last_response_headers.get("etag")
+        if token:
+            with self._lock:
+                self._set_meta("change_feed_continuation", token)
+                self.conn.commit()
+        if not continuation:
+            self.mark_complete("change_feed")
+        return total
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_rollup_store = None
+_rollup_store_lock = threading.Lock()
+
+
+def get_rollup_store():
+    """Shared read store for the flow, or None when no complete rollups have been built."""
+    global _rollup_store
+    if os.getenv("ROLLUP_FAST_PATH", "true").lower() != "true" or not Path(DEFAULT_ROLLUP_PATH).exists():
+        return None
+    with _rollup_store_lock:
+        if _rollup_store is None:
+            _rollup_store = RollupStore(DEFAULT_ROLLUP_PATH)
+    # A store that may be missing documents would return wrong totals without any error
+    if not _rollup_store.is_complete():
+        return None
+    return _rollup_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the workout rollup store")
+    parser.add_argument("--path", default=DEFAULT_ROLLUP_PATH, help="Rollup database file")
+    parser.add_argument("--rebuild", metavar="JSONL", help="Recompute from a JSONL file of workout documents")
+    parser.add_argument("--sync", action="store_true", help="Apply changes from the Cosmos DB change feed")
+    parser.add_argument("--summary", choices=["exercise", "ex_type", "day", "week"], help="Print totals")
+    args = parser.parse_args()
+
+    store = RollupStore(args.path)
+    try:
+        if args.rebuild:
+            store.close()
+            Path(args.path).unlink(missing_ok=True)
+            store = RollupStore(args.path)
+            total = store.rebuild_from_jsonl(args.rebuild)
+            print(f"Rolled up {total} documents from {args.rebuild}")
+        if args.sync:
+            from clients import clients
+            total = store.sync_change_feed(clients.cosmos_container())
+            print(f"Applied {total} changed documents from the change feed")
+        if args.summary:
+            for row in store.summary(by=args.summary):
+                print(json.dumps(row, default=str))
+        if not (args.rebuild or args.sync or args.summary):
+            parser.print_help()
+            sys.exit(1)
+        print(f"{store.document_count()} documents in {args.path}")
+        if not store.is_complete():
+            print("Store is not marked complete, so the flow does not answer from it; "
+                  "run --rebuild with the full JSONL or --sync on a new store")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
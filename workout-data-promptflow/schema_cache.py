@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Persistent, self-refreshing cache for the discovered Cosmos DB schema."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_FILE = Path(__file__).resolve().parent / ".schema_cache.json"
+
+
+def schema_version(schema):
+    """Stable hash of the schema, used to invalidate anything derived from it."""
+    payload = {key: value for key, value in schema.items() if key != "schema_version"}
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class SchemaCache:
+    """
+    Schema snapshot shared through a JSON file and kept fresh by a daemon thread.
+
+    Reads never wait on Cosmos DB once a snapshot exists: an expired snapshot is
+    served while a refresh runs in the background. The refresher compares the
+    container's MAX(_ts) watermark with the one stored in the snapshot and only
+    re-runs discovery when documents changed or the snapshot is older than the TTL.
+    """
+
+    def __init__(self, discover, watermark, path=None, ttl=None, refresh_interval=None,
+                 background_refresh=None):
+        """
+        Args:
+            discover: Callable returning a freshly discovered schema dict (or None)
+            watermark: Callable returning the container's current change watermark
+            path: Snapshot file shared by every worker on the host
+            ttl: Maximum snapshot age in seconds before discovery is forced
+            refresh_interval: Seconds between watermark checks
+            background_refresh: Run the refresher thread (disable for one-off scripts)
+        """
+        self.discover = discover
+        self.watermark = watermark
+        self.path = Path(path or os.getenv("SCHEMA_CACHE_FILE", DEFAULT_CACHE_FILE))
+        self.ttl = float(ttl if ttl is not None else os.getenv("SCHEMA_CACHE_TTL", "86400"))
+        self.refresh_interval = float(
+            refresh_interval if refresh_interval is not None
+            else os.getenv("SCHEMA_REFRESH_INTERVAL", "300")
+        )
+        if background_refresh is None:
+            background_refresh = os.getenv("SCHEMA_BACKGROUND_REFRESH", "true").lower() == "true"
+        self.background_refresh = background_refresh
+
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """Return the cached schema, discovering it only if no snapshot exists anywhere."""
+        snapshot = self._snapshot or self._load()
+        if snapshot is None:
+            snapshot = self.refresh(force=True)
+        self._start_refresher()
+        return snapshot["schema"] if snapshot else None
+
+    def refresh(self, force=False):
+        """
+        Re-discover the schema if the container changed since the last snapshot.
+
+        Args:
+            force: Skip the watermark comparison and always re-run discovery
+
+        Returns:
+            The current snapshot dict, or None if discovery failed with nothing cached
+        """
+        with self._lock:
+            current = self._newest(self._snapshot, self._load())
+            now = time.time()
+
+            # Another worker refreshed the shared snapshot recently
+            if not force and current and now - current["checked_at"] < self.refresh_interval:
+                self._snapshot = current
+                return current
+
+            watermark = self.watermark()
+            expired = current is None or now - current["discovered_at"] >= self.ttl
+            if not force and not expired and watermark is not None \
+                    and watermark == current.get("watermark"):
+                current["checked_at"] = now
+                self._save(current)
+                return current
+
+            schema = self.discover()
+            if schema is None:
+                return current
+
+            schema["schema_version"] = schema_version(schema)
+            snapshot = {
+                "schema": schema,
+                "watermark": watermark,
+                "discovered_at": now,
+                "checked_at": now,
+            }
+            if current is None or current["schema"]["schema_version"] != schema["schema_version"]:
+                logging.info(f"Schema cache updated to version {schema['schema_version']}")
+            self._save(snapshot)
+            return snapshot
+
+    def stop(self):
+        self._stop.set()
+
+    def _start_refresher(self):
+        if not self.background_refresh or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._refresh_loop, name="schema-cache-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def _refresh_loop(self):
+        # Refresh straight away if the snapshot we started from is already stale
+        delay = 0 if self._is_stale(self._snapshot) else self.refresh_interval
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"Background schema refresh failed: {e}")
+            delay = self.refresh_interval
+
+    def _is_stale(self, snapshot):
+        if snapshot is None:
+            return True
+        return time.time() - snapshot["checked_at"] >= self.refresh_interval
+
+    @staticmethod
+    def _newest(*snapshots):
+        snapshots = [snapshot for snapshot in snapshots if snapshot]
+        return max(snapshots, key=lambda s: s["checked_at"]) if snapshots else None
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable schema snapshot {self.path}: {e}")
+            return None
+
+        if "schema_version" not in snapshot.get("schema", {}):
+            return None
+        if self._snapshot is None:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _save(self, snapshot):
+        self._snapshot = snapshot
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial snapshot
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(snapshot, file, default=str)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not persist schema snapshot to {self.path}: {e}")
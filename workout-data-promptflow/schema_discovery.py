@@ -3,16 +3,26 @@
 
 import os
 import json
-from azure.cosmos import CosmosClient
 from promptflow.core import tool
 from dotenv import load_dotenv
 import logging
+from schema_cache import SchemaCache
+from clients import clients
 
 # Load environment variables
 load_dotenv()
 
-# Cache for schema information
-_schema_cache = None
+# String fields whose distinct values are listed for the query generator
+CATEGORICAL_FIELDS = [
+    field.strip()
+    for field in os.getenv("SCHEMA_CATEGORICAL_FIELDS", "Exercise,ExType").split(",")
+    if field.strip()
+]
+
+
+def get_container():
+    """Return the shared workout container client."""
+    return clients.cosmos_container()
 
 
 def get_distinct_values(container, field_name, limit=100):
@@ -30,35 +40,40 @@ def get_distinct_values(container, field_name, limit=100):
         return []
 
 
-def discover_schema():
-    """Discover the database schema including field types and categorical values."""
-    global _schema_cache
-    
-    # Return cached schema if available
-    if _schema_cache is not None:
-        return _schema_cache
-    
+def get_change_watermark():
+    """Latest _ts in the container; it moves whenever a document is written."""
     try:
-        # Initialize Cosmos DB client
-        client = CosmosClient(
-            url=os.getenv("COSMOS_URI"),
-            credential=os.getenv("COSMOS_KEY")
-        )
-        database = client.get_database_client(os.getenv("COSMOS_DB"))
-        container = database.get_container_client(os.getenv("COSMOS_CONTAINER"))
+        items = list(get_container().query_items(
+            query="SELECT VALUE MAX(c._ts) FROM c",
+            enable_cross_partition_query=True
+        ))
+        return items[0] if items else None
+    except Exception as e:
+        logging.warning(f"Could not read change watermark: {e}")
+        return None
+
+
+def _discover_schema_from_cosmos():
+    """Query Cosmos DB for field types and categorical values."""
+    try:
+        container = get_container()
         
-        # Get a sample document to understand structure
-        query = "SELECT TOP 1 * FROM c"
+        # Sample a few documents so a null value in one does not hide a field's type
+        query = "SELECT TOP 10 * FROM c"
         items = list(container.query_items(
             query=query,
             enable_cross_partition_query=True
         ))
-        
+
         if not items:
             return None
-            
-        sample_doc = items[0]
-        
+
+        sample_doc = {}
+        for item in items:
+            for field_name, value in item.items():
+                if sample_doc.get(field_name) is None:
+                    sample_doc[field_name] = value
+
         # Build schema information
         schema = {
             "fields": {},
@@ -79,13 +94,11 @@ def discover_schema():
             }
             
             # For string fields that might be categorical, get distinct values
-            if field_type == "str" and field_name in ["Exercise", "ExType"]:
+            if field_type == "str" and field_name in CATEGORICAL_FIELDS:
                 distinct_values = get_distinct_values(container, field_name)
                 if distinct_values:
-                    schema["categorical_values"][field_name] = distinct_values
+                    schema["categorical_values"][field_name] = sorted(distinct_values, key=str)
         
-        # Cache the schema
-        _schema_cache = schema
         return schema
         
     except Exception as e:
@@ -93,6 +106,20 @@ def discover_schema():
         return None
 
 
+_schema_cache = SchemaCache(_discover_schema_from_cosmos, get_change_watermark)
+
+
+def discover_schema():
+    """
+    Discover the database schema including field types and categorical values.
+    
+    Served from the persistent schema cache; Cosmos DB is only queried when no
+    snapshot exists yet or the background refresher sees the container change.
+    The returned dict carries a ``schema_version`` hash of its contents.
+    """
+    return _schema_cache.get()
+
+
 @tool
 def get_schema_context() -> str:
     """
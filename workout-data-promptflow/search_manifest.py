@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Manifest of indexed documents used for incremental search index syncs."""
+
+import hashlib
+import json
+import sqlite3
+
+
+def content_hash(document, deployment=None):
+    """Hash of everything that ends up in the index except the embedding itself."""
+    payload = {key: value for key, value in document.items() if key != "Embedding"}
+    payload["_embedding_deployment"] = deployment
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class SearchManifest:
+    """
+    SQLite table of id → content hash for every document in the search index.
+
+    Each sync is a numbered run. Rows seen in the source during a run are stamped
+    with it; rows still carrying an older run number afterwards belong to ids that
+    were removed from the source and are deleted from the index. SQLite keeps a
+    multi-million row manifest off the Python heap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, hash TEXT NOT NULL, run INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+        row = self.conn.execute("SELECT COALESCE(MAX(run), 0) FROM documents").fetchone()
+        self.run = row[0] + 1
+        self._seen = []
+
+    def is_unchanged(self, doc_id, doc_hash):
+        row = self.conn.execute("SELECT hash FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return row is not None and row[0] == doc_hash
+
+    def mark_seen(self, doc_id):
+        """Record that an id is still in the source, batching the writes."""
+        self._seen.append((self.run, doc_id))
+        if len(self._seen) >= 1000:
+            self._flush_seen()
+
+    def _flush_seen(self):
+        if self._seen:
+            self.conn.executemany("UPDATE documents SET run = ? WHERE id = ?", self._seen)
+            self.conn.commit()
+            self._seen = []
+
+    def record_uploaded(self, hashes):
+        """Store the new hashes of documents the index accepted."""
+        self.conn.executemany(
+            "INSERT INTO documents (id, hash, run) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET hash = excluded.hash, run = excluded.run",
+            [(doc_id, doc_hash, self.run) for doc_id, doc_hash in hashes.items()]
+        )
+        self.conn.commit()
+
+    def stale_ids(self):
+        """Ids that were not in the source during this run."""
+        self._flush_seen()
+        return [row[0] for row in self.conn.execute(
+            "SELECT id FROM documents WHERE run < ?", (self.run,)
+        )]
+
+    def remove(self, doc_ids):
+        self.conn.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in doc_ids])
+        self.conn.commit()
+
+    def close(self):
+        self._flush_seen()
+        self.conn.close()
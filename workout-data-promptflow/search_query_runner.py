@@ -2,12 +2,10 @@
 """Execute semantic and vector searches against Azure AI Search."""
 
 import os
-import json
 from promptflow.core import tool
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from clients import clients
+from result_format import encode_rows, to_json
 
 # Load environment variables
 load_dotenv()
@@ -26,18 +24,9 @@ def search_query_runner(question: str, search_type: str = "hybrid") -> str:
         JSON string containing search results
     """
     try:
-        # Initialize clients
-        search_client = SearchClient(
-            endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
-            index_name=os.getenv("AZURE_SEARCH_INDEX_NAME"),
-            credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
-        )
-        
-        openai_client = AzureOpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
+        # Shared clients for this process
+        search_client = clients.search_client()
+        openai_client = clients.openai_client()
         
         print(f"Executing {search_type} search for: {question}")
         
@@ -123,21 +112,21 @@ def search_query_runner(question: str, search_type: str = "hybrid") -> str:
             "query": question,
             "total_count": total_count,
             "returned_count": len(search_results),
-            "results": search_results[:10]  # Limit to top 10 for readability
+            "results": encode_rows(search_results[:10])  # Limit to top 10 for readability
         }
         
-        return json.dumps(response_data, indent=2)
+        return to_json(response_data)
         
     except Exception as e:
         error_message = f"Error executing search: {str(e)}"
         print(error_message)
         
-        return json.dumps({
+        return to_json({
             "status": "error",
             "search_type": search_type,
             "message": error_message,
             "query": question
-        }, indent=2)
+        })
 
 
 # For local testing
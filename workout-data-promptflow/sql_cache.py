@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Cache of generated SQL keyed by normalized question and schema version."""
+
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(question):
+    """Lowercase, strip punctuation and collapse whitespace so trivial rephrasings match."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SQLCache:
+    """
+    Thread-safe LRU of question → SQL with an optional embedding-similarity tier.
+
+    Exact lookups use the normalized question. When a similarity threshold is
+    set, a miss embeds the question and reuses the SQL of the closest cached
+    question above the threshold, provided both mention the same numbers
+    ("last 7 days" and "last 30 days" embed almost identically but need
+    different SQL). Every entry belongs to a schema version, so a change in
+    the discovered categorical values invalidates everything generated before it.
+    """
+
+    def __init__(self, max_entries=None, similarity_threshold=None):
+        self.max_entries = int(max_entries or os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+        threshold = similarity_threshold or os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD")
+        self.similarity_threshold = float(threshold) if threshold else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self):
+        return self.similarity_threshold is not None
+
+    def lookup(self, question, schema_version, embed=None):
+        """
+        Find cached SQL for a question.
+
+        Args:
+            question: Natural language question
+            schema_version: Version hash from discover_schema()
+            embed: Callable returning an embedding for a text, used by the similarity tier
+
+        Returns:
+            Tuple of (sql or None, embedding computed for the question or None)
+        """
+        normalized = normalize_question(question)
+        key = (schema_version, normalized)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["sql"], None
+
+        if not self.semantic_enabled or embed is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        embedding = embed(normalized)
+        if embedding is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        numbers = _NUMBER.findall(normalized)
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for candidate_key, candidate in self._entries.items():
+                if candidate_key[0] != schema_version or candidate["embedding"] is None:
+                    continue
+                if candidate["numbers"] != numbers:
+                    continue
+                score = _cosine(embedding, candidate["embedding"])
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None, embedding
+
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key]["sql"], embedding
+
+    def put(self, question, schema_version, sql, embedding=None):
+        normalized = normalize_question(question)
+        with self._lock:
+            self._entries[(schema_version, normalized)] = {
+                "sql": sql,
+                "embedding": embedding,
+                "numbers": _NUMBER.findall(normalized),
+            }
+            self._entries.move_to_end((schema_version, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Global instance shared by query_interpreter calls in this worker
+sql_cache = SQLCache()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Validate, bound and cost generated SQL before it runs against Cosmos DB."""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import replace
+from promptflow.core import tool
+from dotenv import load_dotenv
+from clients import clients
+from schema_discovery import discover_schema
+from sql_parser import UnsupportedQuery, parse_query, to_sql
+
+# Load environment variables
+load_dotenv()
+
+# Rows a non-aggregate query may return (TOP is injected or lowered to this)
+GUARD_MAX_ROWS = int(os.getenv("GUARD_MAX_ROWS", os.getenv("COSMOS_MAX_RESULTS", "100")))
+# Per-query RU ceiling; queries predicted above it are rejected and execution stops once it is spent
+MAX_QUERY_RU = float(os.getenv("MAX_QUERY_RU", "0") or 0)
+# Container statistics and indexing policy are re-read after this many seconds
+GUARD_STATS_TTL = int(os.getenv("GUARD_STATS_TTL", "300"))
+# Predicted vs actual RU charge per executed query, one JSON object per line
+GUARD_LEDGER_FILE = os.getenv("GUARD_LEDGER_FILE", "sql_guard_ledger.jsonl")
+# The ledger is rotated to <file>.1 (replacing the previous one) once it reaches this size
+GUARD_LEDGER_MAX_BYTES = int(os.getenv("GUARD_LEDGER_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Rough RU model: a fixed charge per partition touched, document loads by size,
+# and index-only work for filters and aggregates the index can serve
+BASE_RU_PER_PARTITION = 2.5
+RU_PER_KB_LOADED = 1.0
+RU_PER_INDEX_ENTRY = 0.001
+DEFAULT_SELECTIVITY = {"=": 0.1, "IN": 0.2, "range": 0.3, "!=": 0.9}
+# Calibration learned from actual charges is clamped so one outlier cannot disable the cap
+CALIBRATION_BOUNDS = (0.25, 4.0)
+
+
+def _path_matches(pattern, path):
+    """Match a document path like /Exercise against an index policy path like /Exercise/? or /*."""
+    pattern = pattern.rstrip("?*").rstrip("/")
+    return path == pattern or path.startswith(pattern + "/") or pattern == ""
+
+
+def is_indexed(field, indexing_policy):
+    """Whether a top-level or dotted field is covered by the container's range index."""
+    if not indexing_policy or indexing_policy.get("indexingMode", "consistent") == "none":
+        return False
+    path = "/" + field.replace(".", "/")
+    best = (-1, False)
+    for included, entries in ((True, indexing_policy.get("includedPaths", [])),
+                              (False, indexing_policy.get("excludedPaths", []))):
+        for entry in entries:
+            pattern = entry.get("path", "")
+            if _path_matches(pattern, path):
+                # The most specific (longest) matching path wins
+                specificity = len(pattern.rstrip("?*").rstrip("/"))
+                if specificity > best[0] or (specificity == best[0] and not included):
+                    best = (specificity, included)
+    return best[1]
+
+
+class ContainerStats:
+    """Cached document count, average size, partition count and indexing policy of the container."""
+
+    def __init__(self, ttl=GUARD_STATS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        container = clients.cosmos_container()
+        properties = container.read(populate_quota_info=True)
+        headers = container.client_connection.last_response_headers
+        usage = dict(
+            part.split("=", 1) for part in (headers.get("x-ms-resource-usage") or "").split(";") if "=" in part
+        )
+        documents = int(usage.get("documentsCount", 0) or 0)
+        size_kb = float(usage.get("documentsSize", 0) or 0)
+        try:
+            partitions = len(list(container.read_feed_ranges()))
+        except Exception:
+            partitions = 1
+        return {
+            "documents": documents,
+            "avg_document_kb": size_kb / documents if documents else 1.0,
+            "partitions": max(partitions, 1),
+            "indexing_policy": properties.get("indexingPolicy", {})
+        }
+
+    def get(self):
+        with self._lock:
+            if self._stats is None or time.time() - self._loaded_at > self.ttl:
+                try:
+                    self._stats = self._load()
+                    self._loaded_at = time.time()
+                except Exception as e:
+                    logging.warning(f"Could not read container statistics for the SQL guard: {e}")
+                    return self._stats
+            return self._stats
+
+
+class CostLedger:
+    """
+    Records predicted vs actual RU charge and calibrates later predictions.
+
+    The ratio of actual to predicted charge is tracked as an exponential moving
+    average and applied to new estimates, so the cap compares against what
+    queries really cost on this container.
+    """
+
+    def __init__(self, path=GUARD_LEDGER_FILE, max_bytes=GUARD_LEDGER_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.calibration = 1.0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def record(self, report, actual_ru):
+        predicted = report.get("predicted_ru")
+        entry = {
+            "query_id": report.get("query_id"),
+            "sql": report.get("sql"),
+            "predicted_ru": predicted,
+            "actual_ru": round(actual_ru, 2),
+            "timestamp": time.time()
+        }
+        with self._lock:
+            if predicted and report.get("raw_predicted_ru"):
+                low, high = CALIBRATION_BOUNDS
+                ratio = min(max(actual_ru / report["raw_predicted_ru"], low), high)
+                self.calibration = 0.8 * self.calibration + 0.2 * ratio if self.recorded else ratio
+            self.recorded += 1
+            entry["calibration"] = round(self.calibration, 3)
+            if self.path:
+                try:
+                    if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                        os.replace(self.path, f"{self.path}.1")
+                    with open(self.path, "a", encoding="utf-8") as ledger:
+                        ledger.write(json.dumps(entry) + "\n")
+                except OSError as e:
+                    logging.warning(f"Could not write SQL guard ledger: {e}")
+        return entry
+
+
+container_stats = ContainerStats()
+cost_ledger = CostLedger()
+
+
+def _selectivity(condition, schema):
+    categorical = (schema or {}).get("categorical_values", {}).get(condition.field)
+    if condition.op == "=" and categorical:
+        return 1.0 / len(categorical)
+    if condition.op == "IN" and categorical:
+        return min(1.0, len(condition.value) / len(categorical))
+    if condition.op in ("<", "<=", ">", ">="):
+        return DEFAULT_SELECTIVITY["range"]
+    return DEFAULT_SELECTIVITY.get(condition.op, DEFAULT_SELECTIVITY["="])
+
+
+def estimate_cost(query, stats, schema=None):
+    """
+    Estimate the RU charge of a parsed query.
+
+    Returns:
+        Tuple of (estimated RU, notes explaining the estimate)
+    """
+    notes = []
+    documents = stats["documents"]
+    policy = stats["indexing_policy"]
+    base = BASE_RU_PER_PARTITION * stats["partitions"]
+
+    selectivity = 1.0
+    index_served = True
+    for condition in query.where:
+        selectivity *= _selectivity(condition, schema)
+        if condition.function:
+            index_served = False
+            notes.append(f"{condition.function}(c.{condition.field}) cannot use the index")
+        elif not is_indexed(condition.field, policy):
+            index_served = False
+            notes.append(f"c.{condition.field} is excluded from the index")
+    matched = documents * selectivity
+
+    # Without an index-served filter every document is loaded and evaluated
+    scanned = matched if index_served else documents
+    if not index_served:
+        notes.append(f"full scan of {documents} documents")
+
+    if query.is_aggregate and not query.group_by:
+        aggregate_fields = [aggregate.field for aggregate in query.aggregates if aggregate.field]
+        if index_served and all(is_indexed(name, policy) for name in aggregate_fields):
+            notes.append("aggregate served from the index")
+            return base + matched * RU_PER_INDEX_ENTRY, notes
+        return base + scanned * stats["avg_document_kb"] * RU_PER_KB_LOADED, notes
+
+    loaded = scanned
+    if query.top is not None and not query.order_by and index_served:
+        # TOP stops the query once enough matches are found
+        loaded = min(loaded, query.top)
+    return base + loaded * stats["avg_document_kb"] * RU_PER_KB_LOADED, notes
+
+
+def rewrite_query(sql_query, query, max_rows=GUARD_MAX_ROWS):
+    """
+    Bound the rows a parsed non-aggregate query can return.
+
+    The bounded SQL is rendered from the parsed query rather than edited as
+    text, so TOP lands after DISTINCT and before VALUE as Cosmos requires.
+    Queries that need no rewrite are returned unchanged.
+
+    Returns:
+        Tuple of (rewritten SQL, list of rewrites applied)
+    """
+    if query.is_aggregate or query.group_by:
+        return sql_query, []
+    if query.top is None:
+        rewrites = [f"added TOP {max_rows}"]
+    elif query.top > max_rows:
+        rewrites = [f"lowered TOP {query.top} to {max_rows}"]
+    else:
+        return sql_query, []
+    return to_sql(replace(query, top=max_rows)), rewrites
+
+
+@tool
+def sql_guard(sql_query: str) -> dict:
+    """
+    Check generated SQL before execution: bound it and estimate its cost.
+
+    Args:
+        sql_query: SQL query generated by query_interpreter
+
+    Returns:
+        Guard report with the SQL to run ("sql"), whether it may run ("allowed"),
+        the rewrites applied and the predicted RU charge
+    """
+    report = {
+        "query_id": uuid.uuid4().hex,
+        "original_sql": sql_query,
+        "sql": sql_query,
+        "allowed": True,
+        "rewrites": [],
+        "notes": [],
+        "predicted_ru": None,
+        "raw_predicted_ru": None,
+        "max_query_ru": MAX_QUERY_RU or None
+    }
+
+    if not sql_query or not re.match(r"^\s*SELECT\b", sql_query, re.IGNORECASE):
+        report["allowed"] = False
+        report["reason"] = "Only SELECT queries can be executed"
+        return report
+
+    try:
+        query = parse_query(sql_query)
+    except UnsupportedQuery as e:
+        # Queries outside the parsed subset run unchanged; the runtime RU cap still applies
+        report["notes"].append(f"not analysed: {e}")
+        return report
+
+    report["sql"], report["rewrites"] = rewrite_query(sql_query, query)
+
+    if os.getenv("COSMOS_QUERY_BACKEND", "cosmos").lower() == "local":
+        return report
+
+    stats = container_stats.get()
+    if stats is None:
+        report["notes"].append("container statistics unavailable; cost not estimated")
+        return report
+
+    raw_estimate, notes = estimate_cost(parse_query(report["sql"]), stats, discover_schema())
+    report["notes"].extend(notes)
+    report["raw_predicted_ru"] = round(raw_estimate, 2)
+    report["predicted_ru"] = round(raw_estimate * cost_ledger.calibration, 2)
+
+    if MAX_QUERY_RU and report["predicted_ru"] > MAX_QUERY_RU:
+        report["allowed"] = False
+        report["reason"] = (f"Predicted charge of {report['predicted_ru']} RUs exceeds the "
+                            f"{MAX_QUERY_RU:g} RU limit per query; add a filter on an indexed field")
+
+    print(f"SQL guard: predicted {report['predicted_ru']} RUs, rewrites: {report['rewrites'] or 'none'}")
+    return report
+
+
+def record_actual(report, actual_ru):
+    """Store the real charge of a guarded query next to its prediction."""
+    if report:
+        return cost_ledger.record(report, actual_ru)
+    return None
+
+
+# For local testing
+if __name__ == "__main__":
+    test_queries = [
+        "SELECT * FROM c",
+        "SELECT VALUE COUNT(1) FROM c WHERE c.ExType = 'Strength'",
+        "SELECT c.Weight FROM c WHERE StringToNumber(c.Weight) > 100"
+    ]
+
+    for query in test_queries:
+        print(f"Query: {query}")
+        print(json.dumps(sql_guard(query), indent=2))
+        print("-" * 80)
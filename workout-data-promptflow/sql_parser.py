@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Parse the subset of Cosmos DB SQL that query_interpreter generates.
+
+The parsed form lets local backends (the rollup store and the in-memory
+columnar store) answer a query without sending it to Cosmos DB. Anything
+outside the subset raises UnsupportedQuery so callers fall back to Cosmos.
+
+Supported shape:
+    SELECT [DISTINCT] [TOP n] [VALUE] <*, fields or aggregates> FROM c
+    [WHERE <field> <op> <literal> [AND ...]]
+    [GROUP BY <fields>] [ORDER BY <field> [ASC|DESC]]
+
+Aggregates are COUNT, SUM, AVG, MIN and MAX over a field, StringToNumber(field),
+1 or *. Comparison operators are =, !=, <>, <, <=, >, >= and IN (...).
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+AGGREGATE_FUNCTIONS = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+COMPARISON_OPERATORS = {"=", "!=", "<>", "<", "<=", ">", ">="}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op><=|>=|!=|<>|=|<|>)
+      | (?P<punct>[(),.*\[\];])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+
+class UnsupportedQuery(ValueError):
+    """The query uses SQL outside the subset local backends can answer."""
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    func: str
+    field: Optional[str] = None  # None for COUNT(1) / COUNT(*)
+    function: Optional[str] = None  # "StringToNumber" when the field is wrapped
+
+
+@dataclass(frozen=True)
+class SelectItem:
+    expr: Union[str, Aggregate]
+    alias: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Condition:
+    field: str
+    op: str
+    value: object
+    function: Optional[str] = None  # "StringToNumber" when the field is wrapped (not index-served)
+
+
+@dataclass
+class ParsedQuery:
+    select: Optional[List[SelectItem]]  # None for SELECT *
+    value: bool = False
+    distinct: bool = False
+    top: Optional[int] = None
+    where: List[Condition] = field(default_factory=list)
+    group_by: List[str] = field(default_factory=list)
+    order_by: List[tuple] = field(default_factory=list)  # (field, descending)
+
+    @property
+    def aggregates(self):
+        return [item.expr for item in self.select or [] if isinstance(item.expr, Aggregate)]
+
+    @property
+    def is_aggregate(self):
+        return bool(self.aggregates)
+
+    @property
+    def fields(self):
+        """Every document field the query reads."""
+        names = [condition.field for condition in self.where] + list(self.group_by)
+        names += [name for name, _ in self.order_by]
+        for item in self.select or []:
+            if isinstance(item.expr, Aggregate):
+                if item.expr.field:
+                    names.append(item.expr.field)
+            else:
+                names.append(item.expr)
+        return list(dict.fromkeys(names))
+
+    def output_names(self):
+        """Result keys for non-VALUE queries, numbering unnamed aggregates like Cosmos ($1, $2...)."""
+        names = []
+        unnamed = 0
+        for item in self.select or []:
+            if item.alias:
+                names.append(item.alias)
+            elif isinstance(item.expr, Aggregate):
+                unnamed += 1
+                names.append(f"${unnamed}")
+            else:
+                names.append(item.expr.split(".")[-1])
+        return names
+
+
+def _tokenize(sql):
+    tokens = []
+    position = 0
+    sql = sql.strip()
+    while position < len(sql):
+        match = _TOKEN.match(sql, position)
+        if not match or match.end() == position:
+            raise UnsupportedQuery(f"Unexpected input at: {sql[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            text = re.sub(r"\\(.)", r"\1", text[1:-1])
+        tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, sql):
+        self.tokens = _tokenize(sql)
+        self.position = 0
+        self.alias = "c"
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise UnsupportedQuery("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def keyword(self, *words):
+        """Consume the keyword if it is next (case-insensitive)."""
+        kind, text = self.peek()
+        if kind == "name" and text.upper() in words:
+            self.position += 1
+            return text.upper()
+        return None
+
+    def expect(self, text):
+        kind, value = self.next()
+        if (value or "").upper() != text.upper():
+            raise UnsupportedQuery(f"Expected {text}, found {value}")
+
+    def parse(self):
+        self.expect("SELECT")
+        query = ParsedQuery(select=None)
+        while True:
+            if self.keyword("DISTINCT"):
+                query.distinct = True
+            elif self.keyword("TOP"):
+                query.top = int(float(self.next()[1]))
+            elif self.keyword("VALUE"):
+                query.value = True
+            else:
+                break
+
+        if self.peek() == ("punct", "*"):
+            self.next()
+        else:
+            query.select = self.select_list()
+
+        self.expect("FROM")
+        kind, self.alias = self.next()
+        if kind != "name":
+            raise UnsupportedQuery("Only FROM <alias> is supported")
+        if self.peek()[0] == "name" and self.peek()[1].upper() not in ("WHERE", "GROUP", "ORDER"):
+            raise UnsupportedQuery("Joins and subqueries are not supported")
+
+        if self.keyword("WHERE"):
+            query.where = self.conditions()
+        if self.keyword("GROUP"):
+            self.expect("BY")
+            query.group_by = [self.field_ref()]
+            while self.peek() == ("punct", ","):
+                self.next()
+                query.group_by.append(self.field_ref())
+        if self.keyword("ORDER"):
+            self.expect("BY")
+            while True:
+                name = self.field_ref()
+                direction = self.keyword("ASC", "DESC")
+                query.order_by.append((name, direction == "DESC"))
+                if self.peek() != ("punct", ","):
+                    break
+                self.next()
+
+        if self.peek() == ("punct", ";"):
+            self.next()
+        if self.peek()[0] is not None:
+            raise UnsupportedQuery(f"Unsupported clause: {self.peek()[1]}")
+        if query.value and (query.select is None or len(query.select) != 1):
+            raise UnsupportedQuery("SELECT VALUE takes exactly one expression")
+        return query
+
+    def select_list(self):
+        items = [self.select_item()]
+        while self.peek() == ("punct", ","):
+            self.next()
+            items.append(self.select_item())
+        return items
+
+    def select_item(self):
+        kind, text = self.peek()
+        if kind == "name" and text.upper() in AGGREGATE_FUNCTIONS and self.peek(1) == ("punct", "("):
+            self.next()
+            self.next()
+            expr = Aggregate(text.upper(), *self.aggregate_argument())
+            self.expect(")")
+        else:
+            expr = self.field_ref()
+        alias = None
+        if self.keyword("AS"):
+            alias = self.next()[1]
+        elif self.peek()[0] == "name" and self.peek()[1].upper() != "FROM":
+            alias = self.next()[1]
+        return SelectItem(expr, alias)
+
+    def aggregate_argument(self):
+        kind, text = self.peek()
+        if (kind == "number" and text == "1") or (kind, text) == ("punct", "*"):
+            self.next()
+            return None, None
+        return self.numeric_field()
+
+    def numeric_field(self):
+        """
+        A field, optionally wrapped in StringToNumber() (values are compared as numbers either way).
+
+        Returns:
+            Tuple of (field name, wrapping function name or None)
+        """
+        kind, text = self.peek()
+        if kind == "name" and text.lower() == "stringtonumber":
+            self.next()
+            self.expect("(")
+            name = self.field_ref()
+            self.expect(")")
+            return name, "StringToNumber"
+        return self.field_ref(), None
+
+    def field_ref(self):
+        kind, text = self.next()
+        if kind != "name" or text != self.alias:
+            raise UnsupportedQuery(f"Expected a field of {self.alias}, found {text}")
+        parts = []
+        while self.peek() in (("punct", "."), ("punct", "[")):
+            if self.next()[1] == ".":
+                parts.append(self.next()[1])
+            else:
+                kind, name = self.next()
+                if kind != "string":
+                    raise UnsupportedQuery("Only string property indexers are supported")
+                parts.append(name)
+                self.expect("]")
+        if not parts:
+            raise UnsupportedQuery("Whole-document expressions are not supported")
+        return ".".join(parts)
+
+    def literal(self):
+        kind, text = self.next()
+        if kind == "string":
+            return text
+        if kind == "number":
+            return float(text) if "." in text else int(text)
+        if kind == "name" and text.lower() in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[text.lower()]
+        raise UnsupportedQuery(f"Expected a literal, found {text}")
+
+    def conditions(self):
+        conditions = [self.condition()]
+        while self.keyword("AND"):
+            conditions.append(self.condition())
+        if self.keyword("OR"):
+            raise UnsupportedQuery("OR is not supported")
+        return conditions
+
+    def condition(self):
+        kind, text = self.peek()
+        if kind == "name" and (text == self.alias or text.lower() == "stringtonumber"):
+            name, function = self.numeric_field()
+            if self.keyword("IN"):
+                self.expect("(")
+                values = [self.literal()]
+                while self.peek() == ("punct", ","):
+                    self.next()
+                    values.append(self.literal())
+                self.expect(")")
+                return Condition(name, "IN", tuple(values), function)
+            kind, op = self.next()
+            if kind != "op":
+                raise UnsupportedQuery(f"Unsupported condition operator: {op}")
+            return Condition(name, "!=" if op == "<>" else op, self.literal(), function)
+
+        # Literal on the left: flip the comparison
+        value = self.literal()
+        kind, op = self.next()
+        if kind != "op":
+            raise UnsupportedQuery(f"Unsupported condition operator: {op}")
+        flipped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "<>": "!="}.get(op, op)
+        name, function = self.numeric_field()
+        return Condition(name, flipped, value, function)
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _field_sql(name):
+    parts = []
+    for part in name.split("."):
+        parts.append(f".{part}" if _IDENTIFIER.match(part) else f'["{part}"]')
+    return "c" + "".join(parts)
+
+
+def _literal_sql(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+    return repr(value)
+
+
+def _operand_sql(name, function):
+    return f"{function}({_field_sql(name)})" if function else _field_sql(name)
+
+
+def to_sql(query):
+    """
+    Render a ParsedQuery as Cosmos DB SQL over the alias c.
+
+    Clauses come out in the order the Cosmos grammar requires:
+    SELECT [DISTINCT] [TOP n] [VALUE] ..., so rewriting the parsed form (for
+    example lowering TOP) cannot produce SQL that Cosmos rejects.
+    """
+    select = ["SELECT"]
+    if query.distinct:
+        select.append("DISTINCT")
+    if query.top is not None:
+        select.append(f"TOP {int(query.top)}")
+    if query.value:
+        select.append("VALUE")
+
+    if query.select is None:
+        select.append("*")
+    else:
+        items = []
+        for item in query.select:
+            if isinstance(item.expr, Aggregate):
+                argument = _operand_sql(item.expr.field, item.expr.function) if item.expr.field else "1"
+                expr = f"{item.expr.func}({argument})"
+            else:
+                expr = _field_sql(item.expr)
+            items.append(f"{expr} AS {item.alias}" if item.alias else expr)
+        select.append(", ".join(items))
+
+    sql = " ".join(select) + " FROM c"
+    if query.where:
+        conditions = []
+        for condition in query.where:
+            operand = _operand_sql(condition.field, condition.function)
+            if condition.op == "IN":
+                values = ", ".join(_literal_sql(value) for value in condition.value)
+                conditions.append(f"{operand} IN ({values})")
+            else:
+                conditions.append(f"{operand} {condition.op} {_literal_sql(condition.value)}")
+        sql += " WHERE " + " AND ".join(conditions)
+    if query.group_by:
+        sql += " GROUP BY " + ", ".join(_field_sql(name) for name in query.group_by)
+    if query.order_by:
+        sql += " ORDER BY " + ", ".join(
+            f"{_field_sql(name)} {'DESC' if descending else 'ASC'}" for name, descending in query.order_by
+        )
+    return sql
+
+
+def parse_query(sql):
+    """
+    Parse a Cosmos DB SQL query into a ParsedQuery.
+
+    Raises:
+        UnsupportedQuery: If the query is outside the supported subset
+    """
+    try:
+        return _Parser(sql).parse()
+    except UnsupportedQuery:
+        raise
+    except (ValueError, TypeError, IndexError) as e:
+        raise UnsupportedQuery(str(e)) from e
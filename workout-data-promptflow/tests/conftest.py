@@ -0,0 +1,61 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# The flow's modules are top-level scripts, imported the way flow.dag.yaml loads them
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+EXERCISES = [("Pushups", "Strength"), ("Squats", "Strength"), ("Bench Press", "Strength"), ("Rowing", "Cardio")]
+
+
+@pytest.fixture
+def workouts():
+    """Workout documents shaped like csv_to_jsonl output; cardio rows carry no Weight."""
+    rng = random.Random(7)
+    documents = []
+    for number in range(200):
+        exercise, ex_type = rng.choice(EXERCISES)
+        document = {
+            "id": str(number),
+            "Exercise": exercise,
+            "ExType": ex_type,
+            "ExDate": f"2025-0{rng.randint(1, 3)}-{rng.randint(10, 28)}",
+            "Set": rng.randint(1, 4),
+            "Reps": rng.randint(5, 25),
+        }
+        if ex_type == "Strength":
+            document["Weight"] = rng.choice([0, 20, 42.5, 60, 80.5])
+        documents.append(document)
+    return documents
+
+
+def _aggregate(func, values):
+    # Like Cosmos, COUNT and SUM of nothing are 0 while AVG/MIN/MAX are undefined
+    if func == "COUNT":
+        return len(values)
+    if func == "SUM":
+        return sum(values)
+    if not values:
+        return None
+    if func == "AVG":
+        return sum(values) / len(values)
+    return min(values) if func == "MIN" else max(values)
+
+
+@pytest.fixture
+def plain_scan():
+    """Reference answer for an aggregate query, computed row by row over the documents."""
+    def scan(documents, func, field=None, where=lambda document: True, group_by=None):
+        groups = {}
+        for document in documents:
+            if where(document):
+                groups.setdefault(document[group_by] if group_by else None, []).append(document)
+        if group_by is None:
+            groups.setdefault(None, [])
+        return {
+            key: _aggregate(func, rows if field is None else [row[field] for row in rows if field in row])
+            for key, rows in groups.items()
+        }
+    return scan
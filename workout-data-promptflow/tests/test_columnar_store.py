@@ -0,0 +1,77 @@
+import pytest
+
+from columnar_store import ColumnarStore
+from sql_parser import UnsupportedQuery
+
+CASES = [
+    ("SELECT VALUE COUNT(1) FROM c", "COUNT", None, lambda d: True),
+    ("SELECT VALUE COUNT(c.Weight) FROM c", "COUNT", "Weight", lambda d: True),
+    ("SELECT VALUE SUM(c.Reps) FROM c WHERE c.Exercise = 'Pushups'",
+     "SUM", "Reps", lambda d: d["Exercise"] == "Pushups"),
+    ("SELECT VALUE AVG(c.Weight) FROM c WHERE c.ExDate >= '2025-02-01'",
+     "AVG", "Weight", lambda d: d["ExDate"] >= "2025-02-01"),
+    ("SELECT VALUE MAX(c.Weight) FROM c WHERE c.Reps > 20", "MAX", "Weight", lambda d: d["Reps"] > 20),
+    ("SELECT VALUE MIN(c.Reps) FROM c WHERE c.ExType = 'Cardio' AND c.Set <= 2",
+     "MIN", "Reps", lambda d: d["ExType"] == "Cardio" and d["Set"] <= 2),
+]
+
+
+@pytest.mark.parametrize("sql, func, field, where", CASES)
+def test_value_aggregates_match_a_plain_scan(workouts, plain_scan, sql, func, field, where):
+    expected = plain_scan(workouts, func, field, where)[None]
+
+    assert ColumnarStore(workouts).execute(sql) == [pytest.approx(expected)]
+
+
+@pytest.mark.parametrize("func", ["COUNT", "SUM", "AVG", "MIN", "MAX"])
+def test_grouped_aggregates_match_a_plain_scan(workouts, plain_scan, func):
+    argument = "1" if func == "COUNT" else "c.Weight"
+    sql = f"SELECT c.Exercise, {func}({argument}) AS result FROM c GROUP BY c.Exercise"
+    expected = plain_scan(workouts, func, None if func == "COUNT" else "Weight", group_by="Exercise")
+
+    results = ColumnarStore(workouts).execute(sql)
+
+    assert {row["Exercise"]: row.get("result") for row in results} == {
+        key: pytest.approx(value) if value is not None else None for key, value in expected.items()
+    }
+
+
+def test_min_and_max_of_text_fields_compare_strings(workouts):
+    store = ColumnarStore(workouts)
+    dates = [d["ExDate"] for d in workouts]
+
+    assert store.execute("SELECT VALUE MAX(c.ExDate) FROM c") == [max(dates)]
+    assert store.execute("SELECT MAX(c.ExDate) AS d FROM c") == [{"d": max(dates)}]
+    assert store.execute("SELECT VALUE MIN(c.ExDate) FROM c WHERE c.Exercise = 'Rowing'") == [
+        min(d["ExDate"] for d in workouts if d["Exercise"] == "Rowing")
+    ]
+
+
+def test_sum_of_text_needs_string_to_number():
+    store = ColumnarStore([{"Reps": "12"}, {"Reps": "8"}, {"Reps": "n/a"}])
+
+    assert store.execute("SELECT VALUE SUM(StringToNumber(c.Reps)) FROM c") == [20]
+    with pytest.raises(UnsupportedQuery):
+        store.execute("SELECT VALUE SUM(c.Reps) FROM c")
+
+
+def test_aggregate_over_no_matching_rows(workouts):
+    store = ColumnarStore(workouts)
+
+    assert store.execute("SELECT VALUE COUNT(1) FROM c WHERE c.Exercise = 'Deadlift'") == [0]
+    assert store.execute("SELECT VALUE AVG(c.Reps) FROM c WHERE c.Exercise = 'Deadlift'") == []
+
+
+def test_ordered_projection_with_top(workouts):
+    results = ColumnarStore(workouts).execute(
+        "SELECT TOP 5 c.ExDate, c.Reps FROM c WHERE c.Exercise = 'Squats' ORDER BY c.Reps DESC"
+    )
+
+    squats = sorted((d for d in workouts if d["Exercise"] == "Squats"), key=lambda d: -d["Reps"])
+    assert results == [{"ExDate": d["ExDate"], "Reps": d["Reps"]} for d in squats[:5]]
+
+
+def test_distinct_values(workouts):
+    results = ColumnarStore(workouts).execute("SELECT DISTINCT VALUE c.ExType FROM c")
+
+    assert sorted(results) == ["Cardio", "Strength"]
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from csv_to_jsonl import convert_row, csv_to_jsonl, parse_date
+
+CSV = (
+    "Exercise,ExType,ExDate,Set,Reps,Weight\n"
+    "Pushups,Strength,1/2/2025,1,20,\n"
+    "Pushups,Strength,1/2/2025,1,20,\n"
+    "Squats,Strength,2025-01-03,1,10.0,60.5\n"
+)
+
+
+@pytest.mark.parametrize("value", ["2025-01-02", "1/2/2025", "01/02/25", "02-Jan-2025", "1/2/2025 7:30:00 AM"])
+def test_parse_date_formats(value):
+    assert parse_date(value) == "2025-01-02"
+
+
+def test_convert_row_types_values_and_keeps_bad_text():
+    record, failures = convert_row({" Exercise ": "Pushups", "Reps": "12.0", "Weight": "", "Set": "two"})
+
+    assert record == {"Exercise": "Pushups", "Reps": 12, "Weight": None, "Set": "two"}
+    assert failures == 1
+
+
+def test_repeated_rows_get_stable_ids(tmp_path):
+    csv_path = tmp_path / "workouts.csv"
+    csv_path.write_text(CSV)
+    first, second = tmp_path / "first.jsonl", tmp_path / "second.jsonl"
+
+    csv_to_jsonl(csv_path, first, workers=1)
+    csv_to_jsonl(csv_path, second, workers=1)
+
+    documents = [json.loads(line) for line in first.read_text().splitlines()]
+    assert [d["id"] for d in documents[:2]] == [documents[0]["id"], f"{documents[0]['id']}-1"]
+    assert documents[2] == {"id": documents[2]["id"], "Exercise": "Squats", "ExType": "Strength",
+                            "ExDate": "2025-01-03", "Set": 1, "Reps": 10, "Weight": 60.5}
+    assert first.read_text() == second.read_text()
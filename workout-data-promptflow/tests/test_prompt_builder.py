@@ -0,0 +1,49 @@
+from prompt_builder import PromptBuilder, aggregate_rows, dedup_rows
+from result_format import count_tokens
+
+SYSTEM_PROMPT = "You analyse workout data."
+INSTRUCTIONS = ["Answer the question using the data above."]
+
+
+def test_dedup_drops_identity_fields_and_counts_repeats():
+    rows = [
+        {"id": "1", "Exercise": "Pushups", "Reps": 20},
+        {"id": "2", "Exercise": "Pushups", "Reps": 20},
+        {"id": "3", "Exercise": "Squats", "Reps": 10},
+    ]
+
+    assert dedup_rows(rows) == ([
+        {"Exercise": "Pushups", "Reps": 20, "count": 2},
+        {"Exercise": "Squats", "Reps": 10, "count": 1},
+    ], True)
+
+
+def test_aggregate_rows_totals_per_exercise(workouts):
+    aggregated = {row["Exercise"]: row for row in aggregate_rows(workouts)}
+
+    pushups = [d for d in workouts if d["Exercise"] == "Pushups"]
+    assert aggregated["Pushups"]["rows"] == len(pushups)
+    assert aggregated["Pushups"]["Reps_total"] == sum(d["Reps"] for d in pushups)
+    assert aggregated["Pushups"]["first"] == min(d["ExDate"] for d in pushups)
+    assert "Weight_total" not in aggregated["Rowing"]
+
+
+def test_prompt_stays_within_budget(workouts):
+    sql_data = {"status": "success", "count": len(workouts), "results": workouts}
+
+    messages, usage = PromptBuilder(budget=800).build(
+        SYSTEM_PROMPT, "How many reps per exercise?", sql_data, None, INSTRUCTIONS
+    )
+
+    assert usage["total_tokens"] <= 800
+    assert usage["sections"]["sql"]["strategy"] in ("aggregate", "sample")
+    assert sum(count_tokens(message["content"]) for message in messages) == usage["total_tokens"]
+
+
+def test_small_results_are_sent_in_full():
+    sql_data = {"status": "success", "count": 1, "results": [{"Exercise": "Pushups", "Reps": 20}]}
+
+    messages, usage = PromptBuilder(budget=800).build(SYSTEM_PROMPT, "Pushups?", sql_data, None, INSTRUCTIONS)
+
+    assert usage["sections"]["sql"]["strategy"] == "full"
+    assert "Pushups,20" in messages[-1]["content"]
@@ -0,0 +1,43 @@
+import sys
+import types
+
+import result_format
+from result_format import count_tokens, decode_rows, encode_rows, render_for_prompt, render_table
+
+
+def test_columnar_encoding_round_trips(workouts):
+    encoded = encode_rows(workouts, encoding="columnar")
+
+    assert encoded["columns"][:3] == ["id", "Exercise", "ExType"]
+    assert decode_rows(encoded) == workouts
+
+
+def test_scalar_results_are_not_encoded():
+    assert encode_rows([1200], encoding="columnar") == [1200]
+    assert decode_rows([1200]) == [1200]
+
+
+def test_render_table_writes_each_key_once():
+    rows = [{"Exercise": "Pushups", "Reps": 20, "Weight": 0.0}, {"Exercise": "Squats", "Reps": 10}]
+
+    assert render_table(rows) == "Exercise,Reps,Weight\nPushups,20,0\nSquats,10,"
+
+
+def test_large_results_are_summarised_within_budget(workouts):
+    text, summarised = render_for_prompt(workouts, max_tokens=300)
+
+    assert summarised
+    assert text.startswith(f"Summary of all {len(workouts)} rows:")
+    assert count_tokens(text) <= 300
+
+
+def test_token_counts_fall_back_when_the_encoding_cannot_load(monkeypatch):
+    def get_encoding(name):
+        raise OSError("could not download o200k_base.tiktoken")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    monkeypatch.setattr(result_format, "_encoding", None)
+    monkeypatch.setattr(result_format, "_encoding_loaded", False)
+
+    assert count_tokens("x" * 40) == 11
+    assert result_format.prompt_savings([{"Reps": 20}], "Reps\n20")["tokenizer"] == "estimate"
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import rollup_store
+from columnar_store import ColumnarStore
+from rollup_store import RollupStore
+
+DOCUMENTS = [
+    {"id": "1", "Exercise": "Pushups", "ExType": "Strength", "ExDate": "2025-01-02", "Set": 1, "Reps": 20, "Weight": 0},
+    {"id": "2", "Exercise": "Pushups", "ExType": "Strength", "ExDate": "2025-01-02", "Set": 2, "Reps": 15, "Weight": 0},
+    {"id": "3", "Exercise": "Squats", "ExType": "Strength", "ExDate": "2025-01-03", "Set": 1, "Reps": 10, "Weight": 60.5},
+]
+
+
+def test_fast_path_requires_complete_marker(tmp_path, monkeypatch):
+    path = tmp_path / "rollups.db"
+    monkeypatch.setattr(rollup_store, "DEFAULT_ROLLUP_PATH", str(path))
+    monkeypatch.setattr(rollup_store, "_rollup_store", None)
+
+    # Documents applied by the loader alone may not cover the container
+    store = RollupStore(path)
+    store.apply(DOCUMENTS[:1])
+    assert rollup_store.get_rollup_store() is None
+
+    jsonl = tmp_path / "workouts.jsonl"
+    jsonl.write_text("\n".join(json.dumps(document) for document in DOCUMENTS))
+    assert store.rebuild_from_jsonl(jsonl) == 3
+    assert rollup_store.get_rollup_store() is not None
+
+    store.mark_incomplete()
+    assert rollup_store.get_rollup_store() is None
+    store.close()
+    rollup_store._rollup_store.close()
+
+
+@pytest.mark.parametrize("sql, func, field, where", [
+    ("SELECT VALUE COUNT(1) FROM c", "COUNT", None, lambda d: True),
+    ("SELECT VALUE COUNT(c.Weight) FROM c WHERE c.ExType = 'Strength'",
+     "COUNT", "Weight", lambda d: d["ExType"] == "Strength"),
+    ("SELECT VALUE SUM(StringToNumber(c.Reps)) FROM c WHERE c.Exercise = 'Pushups'",
+     "SUM", "Reps", lambda d: d["Exercise"] == "Pushups"),
+    ("SELECT VALUE AVG(c.Weight) FROM c WHERE c.ExDate >= '2025-02-01' AND c.ExDate < '2025-03-01'",
+     "AVG", "Weight", lambda d: "2025-02-01" <= d["ExDate"] < "2025-03-01"),
+    ("SELECT VALUE MIN(c.Reps) FROM c WHERE c.Exercise IN ('Squats', 'Rowing')",
+     "MIN", "Reps", lambda d: d["Exercise"] in ("Squats", "Rowing")),
+    ("SELECT VALUE MAX(c.Set) FROM c WHERE c.Exercise != 'Pushups'", "MAX", "Set", lambda d: d["Exercise"] != "Pushups"),
+])
+def test_answer_matches_a_plain_scan(tmp_path, workouts, plain_scan, sql, func, field, where):
+    store = RollupStore(tmp_path / "rollups.db")
+    store.apply(workouts)
+
+    expected = plain_scan(workouts, func, field, where)[None]
+    assert store.answer(sql) == [pytest.approx(expected)]
+    assert store.answer(sql) == ColumnarStore(workouts).execute(sql)
+    store.close()
+
+
+@pytest.mark.parametrize("func", ["COUNT", "SUM", "AVG", "MIN", "MAX"])
+def test_grouped_answer_matches_a_plain_scan(tmp_path, workouts, plain_scan, func):
+    argument = "1" if func == "COUNT" else "c.Weight"
+    sql = f"SELECT c.Exercise, {func}({argument}) AS result FROM c WHERE c.ExDate < '2025-03-01' GROUP BY c.Exercise"
+    store = RollupStore(tmp_path / "rollups.db")
+    store.apply(workouts)
+
+    expected = plain_scan(workouts, func, None if func == "COUNT" else "Weight",
+                          lambda d: d["ExDate"] < "2025-03-01", group_by="Exercise")
+    results = store.answer(sql)
+
+    assert {row["Exercise"]: row.get("result") for row in results} == {
+        key: pytest.approx(value) if value is not None else None for key, value in expected.items()
+    }
+    store.close()
+
+
+def test_answer_after_removing_documents(tmp_path, workouts, plain_scan):
+    store = RollupStore(tmp_path / "rollups.db")
+    store.apply(workouts)
+    store.remove([document["id"] for document in workouts[:50]])
+
+    expected = plain_scan(workouts[50:], "SUM", "Reps")[None]
+    assert store.answer("SELECT VALUE SUM(c.Reps) FROM c") == [expected]
+    store.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM c",
+    "SELECT VALUE SUM(c.Reps) FROM c WHERE c.Weight > 50",
+    "SELECT c.Set, COUNT(1) FROM c GROUP BY c.Set",
+    "SELECT c.Exercise, COUNT(1) FROM c GROUP BY c.Exercise ORDER BY c.Exercise",
+])
+def test_queries_outside_the_rollup_grain_are_rejected(tmp_path, sql):
+    store = RollupStore(tmp_path / "rollups.db")
+
+    with pytest.raises(rollup_store.UnsupportedQuery):
+        store.answer(sql)
+    store.close()
@@ -0,0 +1,27 @@
+from search_manifest import SearchManifest, content_hash
+
+
+def test_hash_ignores_embedding_but_tracks_deployment():
+    document = {"id": "1", "exercise": "Pushups", "reps": 20}
+
+    assert content_hash({**document, "Embedding": [0.1]}) == content_hash(document)
+    assert content_hash(document, "text-embedding-3-small") != content_hash(document, "ada-002")
+
+
+def test_unchanged_and_stale_documents_across_runs(tmp_path):
+    path = str(tmp_path / "manifest.db")
+    first = SearchManifest(path)
+    first.record_uploaded({"1": "a", "2": "b", "3": "c"})
+    first.close()
+
+    second = SearchManifest(path)
+    assert second.is_unchanged("1", "a")
+    assert not second.is_unchanged("2", "changed")
+    assert not second.is_unchanged("4", "d")
+    second.mark_seen("1")
+    second.record_uploaded({"2": "changed"})
+
+    assert second.stale_ids() == ["3"]
+    second.remove(["3"])
+    assert second.stale_ids() == []
+    second.close()
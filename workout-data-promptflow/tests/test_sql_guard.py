@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+pytest.importorskip("promptflow")
+
+from sql_guard import CostLedger, rewrite_query  # noqa: E402
+from sql_parser import parse_query  # noqa: E402
+
+
+def rewrite(sql, max_rows=100):
+    return rewrite_query(sql, parse_query(sql), max_rows=max_rows)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM c WHERE c.Exercise = 'Pushups'",
+     "SELECT TOP 100 * FROM c WHERE c.Exercise = 'Pushups'"),
+    ("SELECT DISTINCT c.Exercise FROM c",
+     "SELECT DISTINCT TOP 100 c.Exercise FROM c"),
+    ("SELECT DISTINCT VALUE c.Exercise FROM c ORDER BY c.Exercise",
+     "SELECT DISTINCT TOP 100 VALUE c.Exercise FROM c ORDER BY c.Exercise ASC"),
+    ("SELECT VALUE c.Reps FROM c WHERE StringToNumber(c.Weight) > 100",
+     "SELECT TOP 100 VALUE c.Reps FROM c WHERE StringToNumber(c.Weight) > 100"),
+    ("select top 500 c.ExDate, c.Reps from c",
+     "SELECT TOP 100 c.ExDate, c.Reps FROM c"),
+])
+def test_top_is_placed_where_cosmos_expects_it(sql, expected):
+    rewritten, rewrites = rewrite(sql)
+
+    assert rewritten == expected
+    assert len(rewrites) == 1
+    assert parse_query(rewritten).top == 100
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT TOP 10 * FROM c",
+    "SELECT VALUE COUNT(1) FROM c WHERE c.ExType = 'Strength'",
+    "SELECT c.Exercise, SUM(StringToNumber(c.Reps)) AS reps FROM c GROUP BY c.Exercise",
+])
+def test_bounded_and_aggregate_queries_are_unchanged(sql):
+    assert rewrite(sql) == (sql, [])
+
+
+def test_select_star_is_not_rewritten_to_a_field_list():
+    rewritten, _ = rewrite("SELECT * FROM c")
+
+    assert rewritten == "SELECT TOP 100 * FROM c"
+
+
+def test_ledger_rotates_at_size_limit(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    ledger = CostLedger(path=str(path), max_bytes=300)
+    report = {"query_id": "q", "sql": "SELECT * FROM c", "predicted_ru": 3.0, "raw_predicted_ru": 3.0}
+
+    for _ in range(10):
+        ledger.record(report, 2.5)
+
+    assert path.stat().st_size < 300 + 200
+    assert (tmp_path / "ledger.jsonl.1").exists()
+    assert json.loads(path.read_text().splitlines()[-1])["actual_ru"] == 2.5
@@ -0,0 +1,71 @@
+import pytest
+
+from sql_parser import Aggregate, Condition, UnsupportedQuery, parse_query, to_sql
+
+
+def test_value_aggregate_over_numeric_text():
+    query = parse_query("SELECT VALUE SUM(StringToNumber(c.Reps)) FROM c WHERE c.Exercise = 'Pushups'")
+
+    assert query.value
+    assert query.aggregates == [Aggregate("SUM", "Reps", "StringToNumber")]
+    assert query.where == [Condition("Exercise", "=", "Pushups")]
+
+
+def test_count_with_date_range():
+    query = parse_query(
+        "SELECT VALUE COUNT(1) FROM c WHERE c.ExDate >= '2025-01-01' AND c.ExDate <= '2025-01-31'"
+    )
+
+    assert query.aggregates == [Aggregate("COUNT")]
+    assert [(condition.op, condition.value) for condition in query.where] == [
+        (">=", "2025-01-01"), ("<=", "2025-01-31"),
+    ]
+
+
+def test_grouped_aggregates_are_named_like_cosmos():
+    query = parse_query("SELECT c.Exercise, COUNT(1), MAX(c.Weight) AS heaviest FROM c GROUP BY c.Exercise")
+
+    assert query.group_by == ["Exercise"]
+    assert query.output_names() == ["Exercise", "$1", "heaviest"]
+
+
+def test_select_star_with_top_and_order():
+    query = parse_query("SELECT TOP 20 * FROM c WHERE c.ExType IN ('Strength', 'Cardio') ORDER BY c.ExDate DESC")
+
+    assert query.select is None
+    assert query.top == 20
+    assert query.where == [Condition("ExType", "IN", ("Strength", "Cardio"))]
+    assert query.order_by == [("ExDate", True)]
+
+
+def test_field_projection_with_numeric_filter():
+    query = parse_query("SELECT c.ExDate, c.Reps FROM c WHERE StringToNumber(c.Weight) > 50")
+
+    assert query.fields == ["Weight", "ExDate", "Reps"]
+    assert query.where == [Condition("Weight", ">", 50, "StringToNumber")]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT VALUE SUM(StringToNumber(c.Reps)) FROM c",
+    "SELECT VALUE COUNT(1) FROM c WHERE c.Exercise = 'Pushups'",
+    "SELECT DISTINCT VALUE c.Exercise FROM c",
+    "SELECT TOP 10 c.ExDate, c.Reps FROM c WHERE c.Weight >= 42.5 ORDER BY c.ExDate DESC",
+    "SELECT c.Exercise, AVG(c.Reps) AS reps FROM c WHERE c.ExType != 'Cardio' GROUP BY c.Exercise",
+    "SELECT * FROM c WHERE c.Exercise IN ('Pushups', 'Squats') ORDER BY c.ExDate ASC",
+])
+def test_to_sql_round_trips(sql):
+    query = parse_query(sql)
+
+    assert to_sql(query) == sql
+    assert parse_query(to_sql(query)) == query
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM c WHERE c.Exercise = 'Pushups' OR c.Exercise = 'Squats'",
+    "SELECT * FROM c JOIN s IN c.Sets",
+    "SELECT VALUE COUNT(1) FROM (SELECT * FROM c)",
+    "DELETE FROM c",
+])
+def test_queries_outside_the_subset_are_rejected(sql):
+    with pytest.raises(UnsupportedQuery):
+        parse_query(sql)